@@ -2,18 +2,33 @@
 # SPDX-License-Identifier: Apache 2.0
 
 import argparse
-import logging
+import os
+import re
+import shutil
 import sys
+from datetime import datetime
 from importlib.metadata import PackageNotFoundError, version
 from pathlib import Path
 from typing import Dict, List, Union
 
 import pandas as pd
-import tqdm
 
+from superbom.utils import githubcache, negativecache
+from superbom.utils.filelock import part_path
+from superbom.utils.githubcache import GitHubCache
 from superbom.utils.logger import AppLogger
+from superbom.utils.negativecache import NegativeCache
+from superbom.utils.packageindexes.conda.condacache import CondaCache
 from superbom.utils.packageindexes.conda.condadependencies import CondaPackageUtil
+from superbom.utils.packageindexes.conda.condaindex import CondaIndex
+from superbom.utils.packageindexes.pypi.installedenv import InstalledEnvironment
 from superbom.utils.packageindexes.pypi.pipdependencies import PyPIPackageUtil
+from superbom.utils.packageindexes.pypi.pypicache import PyPICache
+from superbom.utils.packageindexes.pypi.pypisnapshot import (
+    PyPISnapshot,
+    read_dump,
+    write_snapshot,
+)
 from superbom.utils.parsers import (
     extract_toml_dependencies,
     parse_conda_env,
@@ -71,29 +86,6 @@ def save_results(results: Dict[str, pd.DataFrame], output_path: str, format: str
                 logger.info(f"License Info: {result}\n{df}")
 
 
-def process_items(items, process_method, *args, **kwargs) -> set:
-    """
-    Process items using the specified method.
-
-    Args:
-        items (list): List of items to process.
-        process_method (callable): Method to process each item.
-        *args: Additional arguments to pass to the process method.
-        **kwargs: Additional keyword arguments to pass to the process method.
-    """
-
-    results = []
-    for item in tqdm.tqdm(
-        items, desc="Processing items", unit="item", disable=logger.level > logging.INFO
-    ):
-        try:
-            results.append(process_method(item, *args, **kwargs))
-        except Exception as e:
-            logger.error(f"Error processing item {item}: {e}")
-
-    return results
-
-
 def generatebom(args: argparse.ArgumentParser):
     """
     Generates a Bill of Materials (BOM) from environment files.
@@ -103,6 +95,17 @@ def generatebom(args: argparse.ArgumentParser):
             - path (str): Path to the directory or file containing environment files.
             - verbose (bool): Flag to enable verbose logging.
             - platform (str, optional): Platform for which to retrieve package information.
+            - refresh (bool): Force a full re-download of the conda and PyPI caches.
+            - max_age (float): Seconds before a conda cache entry or unpinned PyPI metadata is revalidated.
+            - jobs (int): Number of conda channel/platform entries and PyPI packages fetched in parallel.
+            - channel_alias (str): Base URL or directory that conda channel names are resolved against.
+            - channel_url (list): ``(channel, url)`` pairs overriding the base URL of single channels.
+            - negative_ttl (float, optional): Seconds lookups that found nothing are trusted;
+              None uses the default of each kind.
+            - from_env (str, optional): Installed environment whose package metadata is used before
+              PyPI; ``""`` for the current interpreter. Without a path the BOM lists this environment.
+            - max_cache_size (int, optional): Disk budget of the conda cache in bytes.
+            - max_memory (bool): Load one conda index at a time and evict it once used.
             - output (str, optional): Path to save the output file.
             - format (str, optional): Format of the output file (e.g., 'table', 'json').
             - version: Display the version of the package.
@@ -120,7 +123,8 @@ def generatebom(args: argparse.ArgumentParser):
         2. Parses each environment file and retrieves package information.
         3. Conda environment files:
             - Parses channels, conda packages, and pip packages.
-            - Retrieves package information from Conda and Pip.
+            - Fetches the repodata for every channel/platform of all files in parallel.
+            - Resolves all conda packages in one pass and retrieves package information from Pip.
         4. Pip requirements files:
             - Parses pip packages.
             - Retrieves package information from Pip.
@@ -135,14 +139,45 @@ def generatebom(args: argparse.ArgumentParser):
     if args.verbose:
         logger.setLevel("DEBUG")
 
-    env_files = filter_by_extensions(args.path, ["yml", "yaml", "txt", "toml"])
-
-    packageutil = CondaPackageUtil()
-    pipdependencies = PyPIPackageUtil()
-
-    for index, env_file in enumerate(env_files):
-        output_data = []
+    # Without a path the BOM lists the installed environment itself
+    env_files = (
+        filter_by_extensions(args.path, ["yml", "yaml", "txt", "toml"]) if args.path else []
+    )
+    environment = (
+        InstalledEnvironment(args.from_env or None) if args.from_env is not None else None
+    )
 
+    packageutil = CondaPackageUtil(
+        CondaCache(
+            max_age=args.max_age,
+            refresh=args.refresh,
+            channel_alias=args.channel_alias,
+            channel_urls=dict(args.channel_url or []),
+            max_size=args.max_cache_size,
+            # Indexes are evicted after each pass, so there is nothing worth memoizing
+            memo_size=0 if args.max_memory else CondaIndex.DEFAULT_MEMO_SIZE,
+        )
+    )
+    pypi_cache = PyPICache(max_age=args.max_age, refresh=args.refresh)
+    pipdependencies = PyPIPackageUtil(
+        pypi_cache,
+        environment=environment,
+        snapshot=PyPISnapshot.open_default(),
+    )
+    # Packages missing from PyPI and GitHub are not looked up again for a while
+    ttls = None
+    if args.negative_ttl is not None:
+        ttls = dict.fromkeys(NegativeCache.DEFAULT_TTLS, args.negative_ttl)
+    negative_cache = NegativeCache(ttls=ttls, refresh=args.refresh)
+    # GitHub search and license results are served locally and refreshed in the background
+    github_cache = GitHubCache(refresh=args.refresh)
+
+    if args.platform:
+        packageutil._cache.platforms = args.platform
+
+    # Parse every environment file first so all conda channels are known up front
+    parsed_files = []
+    for env_file in env_files:
         if env_file.suffix.lower() in [".yml", ".yaml"] and env_file.stem == "environment":
             logger.info(f"Processing conda env file: {env_file}")
             channels, conda_packages, pip_packages = parse_conda_env(env_file)
@@ -156,9 +191,6 @@ def generatebom(args: argparse.ArgumentParser):
                 logger.warning(f"No pip packages found in {env_file}. Skipping.")
                 continue
 
-            if args.platform:
-                packageutil._cache.platforms.append(args.platform)
-
             if channels:
                 for channel in channels:
                     packageutil._cache.add_channel(channel)
@@ -167,16 +199,12 @@ def generatebom(args: argparse.ArgumentParser):
                 logger.warning("No channels specified in environment file. Using defaults.")
                 packageutil._cache.add_channel(packageutil._cache.DEFAULT_CHANNELS)
 
-            conda_data = process_items(conda_packages, packageutil.retrieve_conda_package_info)
-            output_data.extend(conda_data)
-            conda_pip_data = process_items(pip_packages, pipdependencies.get_pip_package_data)
-            output_data.extend(conda_pip_data)
+            parsed_files.append((env_file, conda_packages, pip_packages))
 
         elif env_file.suffix.lower() == ".txt" and env_file.stem == "requirements":
             logger.info(f"Processing pip requirements file: {env_file}")
             pip_packages = parse_requirements(env_file)
-            pip_data = process_items(pip_packages, pipdependencies.get_pip_package_data)
-            output_data.extend(pip_data)
+            parsed_files.append((env_file, [], pip_packages))
 
         elif env_file.suffix.lower() == ".toml" and env_file.stem == "pyproject":
             logger.info(f"Processing pyproject file: {env_file}")
@@ -184,15 +212,42 @@ def generatebom(args: argparse.ArgumentParser):
             pip_packages = parse_poetry_toml(env_file)
             if not pip_packages:
                 pip_packages = extract_toml_dependencies(env_file)
-            pip_data = process_items(pip_packages, pipdependencies.get_pip_package_data)
-            output_data.extend(pip_data)
+            parsed_files.append((env_file, [], pip_packages))
 
-        if output_data:
-            df = pd.DataFrame(output_data)
-            # use the parent directory name as the sheet name
-            sheet_name = env_file.parent.name if env_file.parent.name else "default"
+    if environment is not None and not args.path:
+        logger.info(f"Processing installed environment: {environment.name}")
+        parsed_files.append((Path(environment.name, "environment"), [], environment.packages()))
 
-            results[sheet_name] = df
+    # Fetch every channel/platform the conda packages need in parallel
+    conda_packages = [package for _, packages, _ in parsed_files for package in packages]
+    if conda_packages:
+        packageutil._cache.prefetch(packageutil.channel_platforms(conda_packages), args.jobs)
+
+    with negativecache.using(negative_cache), githubcache.using(github_cache):
+        try:
+            for env_file, conda_packages, pip_packages in parsed_files:
+                output_data = []
+
+                if conda_packages:
+                    # Resolve the whole environment in one pass; unparseable specs come back as None
+                    conda_data = packageutil.resolve_many(conda_packages, evict=args.max_memory)
+                    output_data.extend(data for data in conda_data if data is not None)
+
+                pip_data = pipdependencies.get_pip_packages_data(pip_packages, args.jobs)
+                output_data.extend(data for data in pip_data if data is not None)
+
+                if output_data:
+                    df = pd.DataFrame(output_data)
+                    # use the parent directory name as the sheet name
+                    sheet_name = env_file.parent.name if env_file.parent.name else "default"
+
+                    results[sheet_name] = df
+        finally:
+            # Background refreshes still record their misses, so both caches stay in use until they finish
+            github_cache.wait()
+            github_cache.close()
+            negative_cache.close()
+            pypi_cache.close()
 
     # Save results
     # output_path = args.output if args.output else 'bom.xlsx'
@@ -200,6 +255,202 @@ def generatebom(args: argparse.ArgumentParser):
     save_results(results, args.output, args.format)
 
 
+def channel_url(value: str):
+    """Parse a ``CHANNEL=URL`` command line value."""
+    channel, sep, url = value.partition("=")
+    if not sep or not channel or not url:
+        raise argparse.ArgumentTypeError(f"Expected CHANNEL=URL, got '{value}'")
+    return channel, url
+
+
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def size(value: str) -> int:
+    """Parse a size in bytes with an optional K, M, G or T suffix, e.g. ``500M``."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", value, re.IGNORECASE)
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid size '{value}', expected e.g. 500M or 2G")
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[unit.upper()])
+
+
+def format_size(num_bytes: int) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TiB"
+
+
+def add_channel_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--channel-alias",
+        type=str,
+        default=CondaCache.CHANNEL_ALIAS,
+        help="Base URL, file:// URL or directory that conda channel names are resolved against. "
+        f"Default: {CondaCache.CHANNEL_ALIAS}",
+    )
+
+    parser.add_argument(
+        "--channel-url",
+        type=channel_url,
+        action="append",
+        metavar="CHANNEL=URL",
+        help="Base URL, file:// URL or directory of a single conda channel, e.g. a local mirror. "
+        "Can be given multiple times",
+    )
+
+
+def cache_command(argv):
+    """
+    Inspect and maintain the conda cache (``superbom cache stats|warm|prune|clear``).
+
+    Args:
+        argv (list): Command-line arguments following ``cache``.
+    """
+    parser = argparse.ArgumentParser(prog="superbom cache", description="Manage the conda cache")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose logging")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("stats", help="Show the cache entries, their size and last use")
+
+    warm = commands.add_parser(
+        "warm", help="Download or revalidate conda repodata ahead of a scan"
+    )
+    warm.add_argument(
+        "-c",
+        "--channel",
+        action="append",
+        help=f"Channel to warm, can be given multiple times. Default: {', '.join(CondaCache.DEFAULT_CHANNELS)}",
+    )
+    warm.add_argument(
+        "-p",
+        "--platform",
+        action="append",
+        help=f"Platform to warm, can be given multiple times. Default: {', '.join(CondaCache.DEFAULT_PLATFORMS)}",
+    )
+    warm.add_argument("--refresh", action="store_true", help="Download every entry again")
+    warm.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=CondaCache.DEFAULT_WORKERS,
+        help=f"Number of parallel downloads. Default: {CondaCache.DEFAULT_WORKERS}",
+    )
+    add_channel_arguments(warm)
+
+    prune = commands.add_parser(
+        "prune", help="Evict least recently used entries over a disk budget"
+    )
+    prune.add_argument("--max-size", type=size, required=True, help="Disk budget, e.g. 500M or 2G")
+
+    commands.add_parser("clear", help="Remove every cache entry")
+
+    args = parser.parse_args(argv)
+
+    if args.verbose:
+        logger.setLevel("DEBUG")
+
+    if args.command == "warm":
+        cache = CondaCache(
+            refresh=args.refresh,
+            channel_alias=args.channel_alias,
+            channel_urls=dict(args.channel_url or []),
+        )
+        channels = args.channel or cache.channels
+        platforms = args.platform or cache.platforms
+        failed = cache.prefetch([(c, p) for c in channels for p in platforms], args.jobs)
+        for channel, platform in failed:
+            logger.error(f"Failed to warm {channel}/{platform}")
+        return 1 if failed else 0
+
+    cache = CondaCache()
+
+    if args.command == "stats":
+        entries = cache.entries()
+        for entry in reversed(entries):
+            last_used = datetime.fromtimestamp(entry["last_used"]).strftime("%Y-%m-%d %H:%M")
+            print(
+                f"{entry['name']:<40} {entry['format'] or '-':<7} "
+                f"{format_size(entry['size']):>10}  {last_used}"
+            )
+        total = sum(entry["size"] for entry in entries)
+        print(f"{len(entries)} entries, {format_size(total)} in {cache.cache_dir}")
+
+    elif args.command == "prune":
+        evicted = cache.prune(args.max_size)
+        print(f"Evicted {len(evicted)} entries")
+
+    elif args.command == "clear":
+        removed = cache.clear()
+        print(f"Removed {len(removed)} entries from {cache.cache_dir}")
+
+    return 0
+
+
+def snapshot_command(argv):
+    """
+    Build and install offline PyPI license snapshots (``superbom snapshot build|import``).
+
+    Args:
+        argv (list): Command-line arguments following ``snapshot``.
+    """
+    parser = argparse.ArgumentParser(
+        prog="superbom snapshot", description="Manage the offline PyPI license snapshot"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose logging")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser(
+        "build", help="Build a snapshot from the PyPI cache or metadata dumps"
+    )
+    build.add_argument("-o", "--output", required=True, help="Snapshot file to write")
+    build.add_argument(
+        "--dump",
+        action="append",
+        help="JSON lines file with one PyPI JSON API document per line, can be given multiple times",
+    )
+    build.add_argument(
+        "--from-cache",
+        action="store_true",
+        help="Include the PyPI metadata cache (the default when no --dump is given)",
+    )
+
+    install = commands.add_parser("import", help="Install a snapshot to be used by every scan")
+    install.add_argument("snapshot", help="Snapshot file built by 'superbom snapshot build'")
+
+    args = parser.parse_args(argv)
+
+    if args.verbose:
+        logger.setLevel("DEBUG")
+
+    if args.command == "build":
+        sources = [read_dump(dump) for dump in args.dump or []]
+        if args.from_cache or not args.dump:
+            cache = PyPICache()
+            sources.insert(0, cache.items())
+        count = write_snapshot(args.output, (info for source in sources for info in source))
+        print(f"Wrote {count} releases to {args.output}")
+
+    elif args.command == "import":
+        try:
+            with PyPISnapshot(args.snapshot) as snapshot:
+                count = len(snapshot)
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot import {args.snapshot}: {e}")
+            return 1
+
+        path = PyPISnapshot.default_path()
+        os.makedirs(path.parent, exist_ok=True)
+        tmp = part_path(path)
+        shutil.copyfile(args.snapshot, tmp)
+        os.replace(tmp, path)
+        print(f"Imported {count} entries to {path}")
+
+    return 0
+
+
 class RequiredOutputFormat(argparse.Action):
     def __call__(self, parser, namespace, values, option_string=None):
         setattr(namespace, self.dest, values)
@@ -207,6 +458,16 @@ class RequiredOutputFormat(argparse.Action):
 
 
 def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # "superbom cache ..." manages the conda cache instead of generating a BOM
+    if argv and argv[0] == "cache":
+        return cache_command(argv[1:])
+
+    # "superbom snapshot ..." builds and installs offline PyPI license snapshots
+    if argv and argv[0] == "snapshot":
+        return snapshot_command(argv[1:])
 
     # Create top-level parser
     parser = argparse.ArgumentParser(description="Generate a Bill of Materials (BOM)")
@@ -215,9 +476,22 @@ def main(argv=None):
     parser.add_argument(
         "path",
         type=str,
+        nargs="?",
         help="Path to environment file or directory to search. (if directory, will search for .yml, .yaml, .txt, .toml files)",
     )
 
+    parser.add_argument(
+        "--from-env",
+        type=str,
+        nargs="?",
+        const="",
+        default=None,
+        metavar="VENV",
+        help="Read Python package metadata from the distributions installed in a virtualenv or conda "
+        "environment (the current interpreter if VENV is omitted); only packages that are not "
+        "installed are looked up on PyPI. Without a path, the BOM lists the environment itself",
+    )
+
     # Output commands
     parser.add_argument("-o", "--output", type=str, default=sys.stdout, help="Path to output file")
 
@@ -240,6 +514,54 @@ def main(argv=None):
         default=None,
     )
 
+    # Cache commands
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignore cached conda repodata and PyPI metadata and download it again",
+    )
+
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        default=CondaCache.DEFAULT_MAX_AGE,
+        help="Seconds before cached conda repodata and unpinned PyPI metadata are revalidated. "
+        f"Default: {CondaCache.DEFAULT_MAX_AGE}",
+    )
+
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=CondaCache.DEFAULT_WORKERS,
+        help=f"Number of parallel downloads. Default: {CondaCache.DEFAULT_WORKERS}",
+    )
+
+    parser.add_argument(
+        "--negative-ttl",
+        type=float,
+        default=None,
+        help="Seconds a package missing from PyPI, a name without a GitHub repository or a "
+        "repository without a license is not looked up again. Default: 7 days, 1 day for licenses",
+    )
+
+    parser.add_argument(
+        "--max-cache-size",
+        type=size,
+        default=None,
+        help="Disk budget of the conda cache, e.g. 2G. Least recently used entries are evicted "
+        "beyond it. Default: unbounded",
+    )
+
+    parser.add_argument(
+        "--max-memory",
+        action="store_true",
+        help="Bound memory use: load one conda channel/platform index at a time and "
+        "evict it once every package has been matched against it",
+    )
+
+    add_channel_arguments(parser)
+
     # Verbosity command
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose logging")
 
@@ -253,13 +575,16 @@ def main(argv=None):
     )
 
     args = parser.parse_args(argv)
-    
+
+    if args.path is None and args.from_env is None:
+        parser.error("a path or --from-env is required")
+
     # Validate excel format requires output file
     if args.format == "excel" and args.output == sys.stdout:
         parser.error("Output (-o/--output) must be specified when format is 'excel'")
-    
+
     generatebom(args)
 
 
 if __name__ == "__main__":  # pragma: no cover
-    main()
+    sys.exit(main())
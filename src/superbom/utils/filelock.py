@@ -0,0 +1,93 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import os
+import threading
+import time
+from typing import Optional
+
+from superbom.utils.logger import AppLogger
+
+logger = AppLogger().get_logger()
+
+
+def part_path(path) -> str:
+    """
+    Return a temporary sibling of ``path`` that is unique to this process and thread.
+
+    Files are written to the temporary path and then moved over ``path`` with
+    ``os.replace``, which is atomic, so readers never see a partial file.
+    """
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+
+
+class FileLock:
+    """
+    An exclusive lock shared by every process and thread using the same lock file.
+
+    The lock file is created with ``O_CREAT | O_EXCL``, so only one holder can
+    create it, and it is removed on release. A lock file older than ``stale``
+    seconds is assumed to be left behind by a process that died and is broken.
+
+    Example:
+        with FileLock("/path/to/entry.lock"):
+            ...
+    """
+
+    # Seconds after which an existing lock file is considered abandoned
+    DEFAULT_STALE = 30 * 60
+
+    # Seconds between attempts to take a held lock
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, path, stale: float = DEFAULT_STALE, timeout: Optional[float] = None):
+        self.path = str(path)
+        self.stale = stale
+        # None waits until the lock is released or becomes stale
+        self.timeout = timeout
+        # Whether acquire() had to wait for another holder
+        self.waited = False
+
+    def acquire(self):
+        start = time.monotonic()
+        self.waited = False
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                pass
+            else:
+                with os.fdopen(fd, "w") as f:
+                    f.write(str(os.getpid()))
+                return self
+
+            self.waited = True
+            try:
+                age = time.time() - os.stat(self.path).st_mtime
+            except FileNotFoundError:
+                # Released between our attempt and the check, try again right away
+                continue
+
+            if age > self.stale:
+                logger.warning(f"Breaking stale lock {self.path} ({age:.0f}s old)")
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+                continue
+
+            if self.timeout is not None and time.monotonic() - start > self.timeout:
+                raise TimeoutError(f"Timed out waiting for lock {self.path}")
+            time.sleep(self.POLL_INTERVAL)
+
+    def release(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
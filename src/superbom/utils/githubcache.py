@@ -0,0 +1,187 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+from superbom.utils.logger import AppLogger
+from superbom.utils.sqlitestore import SQLiteStore, cache_root
+
+logger = AppLogger().get_logger()
+
+# Package name -> repository URL chosen by the GitHub search
+REPOSITORY = "repository"
+# "owner/repo" -> SPDX id of the repository license
+LICENSE = "license"
+
+# Returned by a fetch when GitHub answered 304, i.e. the stored value still holds
+NOT_MODIFIED = object()
+
+_CREATE_ENTRIES = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    etag TEXT,
+    PRIMARY KEY (kind, key)
+)
+"""
+
+
+class GitHubCache(SQLiteStore):
+    """
+    Persistent cache of GitHub search and license results.
+
+    Package names map to the repository URL the search chose and repositories
+    map to their SPDX id, each kind with its own TTL. Lookups are always served
+    locally when an entry exists; an entry past its TTL is returned as is and
+    refreshed on a background thread, so scans never wait for GitHub for names
+    they have seen before. Lookups that found nothing are kept by the negative
+    cache (``superbom.utils.negativecache``).
+
+    The ETag of the response is stored with each value and sent back when the
+    entry is revalidated, so an unchanged answer costs a 304, which does not
+    count against the rate limit.
+
+    The entries are stored in ``<cache_dir>/github/github.sqlite``.
+    """
+
+    # Seconds before an entry is refreshed
+    DEFAULT_TTLS = {
+        # Search results almost never change and are the most rate limited
+        REPOSITORY: 30 * 24 * 60 * 60,
+        LICENSE: 7 * 24 * 60 * 60,
+    }
+
+    def __init__(self, cache_dir=None, ttls: Optional[Dict[str, float]] = None, refresh=False):
+        super().__init__(cache_root(cache_dir) / "github" / "github.sqlite", _CREATE_ENTRIES)
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        # refresh ignores entries fetched before this run
+        self._not_before = time.time() if refresh else 0
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._pending = set()
+        self._worker: Optional[threading.Thread] = None
+
+    def _read(self, kind: str, key: str) -> Optional[Tuple[str, float]]:
+        row = self._fetchone(
+            "SELECT value, fetched_at FROM entries WHERE kind = ? AND key = ?", (kind, key)
+        )
+        if row is None or row[1] < self._not_before:
+            return None
+        return row
+
+    def put(self, kind: str, key: str, value: str, etag: Optional[str] = None):
+        self._execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+            (kind, key, value, time.time(), etag),
+        )
+
+    def delete(self, kind: str, key: str):
+        self._execute("DELETE FROM entries WHERE kind = ? AND key = ?", (kind, key))
+
+    def is_fresh(self, kind: str, key: str) -> bool:
+        row = self._read(kind, key)
+        return row is not None and time.time() - row[1] < self.ttls[kind]
+
+    def get(self, kind: str, key: str, fetch: Callable[[str, Optional[str]], tuple]):
+        """
+        Return a cached value, refreshing it in the background once it is past its TTL.
+
+        Args:
+            kind (str): ``REPOSITORY`` or ``LICENSE``.
+            key (str): Package name or ``owner/repo``.
+            fetch (callable): Called with ``key`` and the stored ETag, looks ``key``
+                up on GitHub and returns whether the answer is definite, the value
+                (None when nothing was found, ``NOT_MODIFIED`` on a 304) and its ETag.
+
+        Returns:
+            tuple: Whether the cache had an entry, and its value.
+        """
+        row = self._read(kind, key)
+        if row is None:
+            return False, None
+        value, fetched_at = row
+        if time.time() - fetched_at >= self.ttls[kind]:
+            self._schedule(kind, key, fetch)
+        return True, value
+
+    def revalidate(self, kind: str, key: str, fetch) -> Tuple[bool, Optional[str]]:
+        """
+        Look ``key`` up on GitHub with ``fetch`` and store the answer.
+
+        The ETag of a stored entry is sent even when ``refresh`` ignores the
+        entry, since a 304 still proves its value current.
+
+        Returns:
+            tuple: Whether the answer is definite, and the value.
+        """
+        row = self._fetchone(
+            "SELECT value, etag FROM entries WHERE kind = ? AND key = ?", (kind, key)
+        )
+        stored, etag = row if row else (None, None)
+
+        definite, value, new_etag = fetch(key, etag)
+        if value is NOT_MODIFIED:
+            if row is None:
+                # Deleted meanwhile, so there is nothing left to keep
+                return False, None
+            self.put(kind, key, stored, etag)
+            return True, stored
+        if value is not None:
+            self.put(kind, key, value, new_etag)
+        elif definite:
+            # Gone; the negative cache remembers it from now on
+            self.delete(kind, key)
+        return definite, value
+
+    def _schedule(self, kind: str, key: str, fetch):
+        with self._lock:
+            if (kind, key) in self._pending:
+                return
+            self._pending.add((kind, key))
+            if self._worker is None:
+                # A daemon thread, so refreshes still running at exit are retried next run
+                self._worker = threading.Thread(target=self._refresh_worker, daemon=True)
+                self._worker.start()
+        self._queue.put((kind, key, fetch))
+
+    def _refresh_worker(self):
+        while True:
+            kind, key, fetch = self._queue.get()
+            try:
+                self.revalidate(kind, key, fetch)
+            except Exception as e:
+                logger.debug(f"Background refresh of {kind} {key} failed: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard((kind, key))
+                self._queue.task_done()
+
+    def wait(self):
+        """Wait for the background refreshes scheduled so far."""
+        self._queue.join()
+
+
+# The cache consulted by the GitHub lookups; None disables it
+_cache: Optional[GitHubCache] = None
+
+
+def current() -> Optional[GitHubCache]:
+    return _cache
+
+
+@contextmanager
+def using(cache: Optional[GitHubCache]):
+    """Use ``cache`` for the GitHub lookups made inside the ``with`` block."""
+    global _cache
+    previous = _cache
+    _cache = cache
+    try:
+        yield cache
+    finally:
+        _cache = previous
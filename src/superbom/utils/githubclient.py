@@ -0,0 +1,244 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from superbom.utils import httpclient
+from superbom.utils.logger import AppLogger
+
+logger = AppLogger().get_logger()
+
+API_URL = "https://api.github.com"
+
+# Environment variables a token is read from, in order
+TOKEN_VARIABLES = ("GITHUB_TOKEN", "GH_TOKEN")
+
+_client: Optional["GitHubClient"] = None
+_client_lock = threading.Lock()
+
+
+def _int_header(headers, name: str) -> Optional[int]:
+    value = headers.get(name)
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+class GitHubClient:
+    """
+    GitHub REST and GraphQL API client that stays within the rate limits.
+
+    Requests are authenticated with a token from ``GITHUB_TOKEN`` or
+    ``GH_TOKEN`` when one is set (5000 core and 30 search requests per hour
+    instead of 60 and 10). The remaining quota of each resource is tracked
+    from the ``X-RateLimit-*`` headers and reserved before every call; once it
+    is used up, calls wait for the reset instead of failing. Responses are
+    revalidated with their ETag, and 304s do not count against the quota.
+
+    Example:
+        status, data = GitHubClient().get_json("/repos/IntelLabs/SuperBOM/license")
+        status, data = GitHubClient().graphql("query { viewer { login } }")
+    """
+
+    # Attempts per call when GitHub answers with a rate limit error
+    MAX_ATTEMPTS = 3
+
+    # Responses kept for conditional requests
+    MAX_ETAGS = 4096
+
+    def __init__(
+        self, token: Optional[str] = None, max_wait: Optional[float] = None, api_url: str = API_URL
+    ):
+        self.api_url = api_url.rstrip("/")
+        if token is None:
+            token = next((os.environ[v] for v in TOKEN_VARIABLES if os.environ.get(v)), None)
+        self.token = token
+        # Longest wait for a quota reset in seconds; None waits as long as it takes
+        self.max_wait = max_wait
+
+        self.headers = {
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+        }
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+
+        # resource -> (remaining, reset epoch seconds)
+        self._quotas: Dict[str, Tuple[int, int]] = {}
+        # url -> (etag, json)
+        self._etags: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def resource(url: str) -> str:
+        if url.endswith("/graphql"):
+            return "graphql"
+        return "search" if "/search/" in url else "core"
+
+    def remaining(self, resource: str) -> Optional[int]:
+        """Return the requests left for a resource, or None if unknown."""
+        with self._lock:
+            quota = self._quotas.get(resource)
+        if quota is None or quota[1] <= time.time():
+            return None
+        return quota[0]
+
+    def _reserve(self, resource: str) -> bool:
+        """Take one request from the quota, waiting for the reset if it is used up."""
+        while True:
+            with self._lock:
+                now = time.time()
+                quota = self._quotas.get(resource)
+                if quota is None:
+                    return True
+                remaining, reset = quota
+                if reset <= now:
+                    # A new window, the next response tells the new quota
+                    del self._quotas[resource]
+                    return True
+                if remaining > 0:
+                    self._quotas[resource] = (remaining - 1, reset)
+                    return True
+                wait = reset - now + 1
+
+            if self.max_wait is not None and wait > self.max_wait:
+                logger.error(f"GitHub {resource} rate limit exhausted until {time.ctime(reset)}")
+                return False
+            logger.warning(
+                f"GitHub {resource} rate limit reached, waiting {wait:.0f}s for the reset"
+            )
+            time.sleep(wait)
+
+    def _update(self, resource: str, headers):
+        remaining = _int_header(headers, "X-RateLimit-Remaining")
+        reset = _int_header(headers, "X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        name = headers.get("X-RateLimit-Resource")
+        with self._lock:
+            self._quotas[name if isinstance(name, str) else resource] = (remaining, reset)
+
+    def _rate_limited(self, response) -> bool:
+        """Return whether a 403/429 is a rate limit, after waiting out a secondary limit."""
+        if _int_header(response.headers, "X-RateLimit-Remaining") == 0:
+            # The quota is now known to be empty, so the next reservation waits
+            return True
+        retry_after = _int_header(response.headers, "Retry-After")
+        if retry_after is not None:
+            logger.warning(f"GitHub secondary rate limit reached, waiting {retry_after}s")
+            time.sleep(retry_after)
+            return True
+        return False
+
+    def get_json(self, url: str) -> Tuple[int, Optional[dict]]:
+        """
+        Send a GET request to the GitHub API.
+
+        Args:
+            url (str): API URL, or a path such as ``/repos/{owner}/{repo}/license``.
+
+        Returns:
+            tuple: The status code and the decoded body (None unless the status is 200).
+            A 304 for a cached response is returned as 200 with the cached body.
+        """
+        return self._request(url)
+
+    def get_json_conditional(
+        self, url: str, etag: Optional[str] = None
+    ) -> Tuple[int, Optional[dict], Optional[str]]:
+        """
+        Send a GET request revalidating a response the caller cached itself.
+
+        Args:
+            url (str): API URL, or a path such as ``/repos/{owner}/{repo}/license``.
+            etag (str, optional): ETag of the cached response, sent as ``If-None-Match``.
+
+        Returns:
+            tuple: The status code, the decoded body (None unless the status is 200)
+            and the ETag of the response. An unchanged response is a 304 without a body.
+        """
+        return self._send(url, etag=etag)
+
+    def graphql(self, query: str) -> Tuple[int, Optional[dict]]:
+        """
+        Run a GraphQL query. The GraphQL API requires a token.
+
+        Returns:
+            tuple: The status code and the decoded body, with its ``data`` and ``errors``.
+        """
+        return self._request("/graphql", {"query": query})
+
+    def _request(self, url: str, payload: Optional[dict] = None) -> Tuple[int, Optional[dict]]:
+        if not url.startswith("http"):
+            url = f"{self.api_url}{url}"
+
+        cached = None
+        if payload is None:
+            with self._lock:
+                cached = self._etags.get(url)
+        status_code, data, etag = self._send(url, payload, cached[0] if cached else None)
+
+        if status_code == 304 and cached:
+            with self._lock:
+                self._etags.move_to_end(url)
+            return 200, cached[1]
+
+        if status_code == 200 and payload is None and etag:
+            with self._lock:
+                self._etags[url] = (etag, data)
+                self._etags.move_to_end(url)
+                while len(self._etags) > self.MAX_ETAGS:
+                    self._etags.popitem(last=False)
+        return status_code, data
+
+    def _send(
+        self, url: str, payload: Optional[dict] = None, etag: Optional[str] = None
+    ) -> Tuple[int, Optional[dict], Optional[str]]:
+        if not url.startswith("http"):
+            url = f"{self.api_url}{url}"
+        resource = self.resource(url)
+
+        status_code = None
+        for _ in range(self.MAX_ATTEMPTS):
+            if not self._reserve(resource):
+                return 429, None, None
+
+            headers = dict(self.headers)
+            if payload is None:
+                if etag:
+                    headers["If-None-Match"] = etag
+                response = httpclient.get(url, headers=headers)
+            else:
+                response = httpclient.post(url, headers=headers, json=payload)
+            self._update(resource, response.headers)
+            status_code = response.status_code
+
+            if status_code in (403, 429) and self._rate_limited(response):
+                continue
+
+            if status_code != 200:
+                return status_code, None, None
+
+            etag = response.headers.get("ETag")
+            return status_code, response.json(), etag if isinstance(etag, str) else None
+
+        logger.error(f"GitHub rate limit still exceeded after {self.MAX_ATTEMPTS} attempts: {url}")
+        return status_code, None, None
+
+
+def client() -> GitHubClient:
+    """Return the GitHub client shared by every lookup in the process."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GitHubClient()
+                if not _client.token:
+                    logger.debug(
+                        f"No GitHub token in {' or '.join(TOKEN_VARIABLES)}, using the unauthenticated rate limits"
+                    )
+    return _client
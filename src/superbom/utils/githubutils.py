@@ -1,49 +1,203 @@
 # Copyright (C) 2024 Intel Corporation
 # SPDX-License-Identifier: Apache 2.0
 
+import json
+from typing import Dict, Iterable, Optional, Tuple
+
 import requests
 
+from superbom.utils import githubcache, githubclient, negativecache
 from superbom.utils.licenseutils import checklicense
+from superbom.utils.logger import AppLogger
+
+logger = AppLogger().get_logger()
+
+# Repositories per GraphQL query
+BATCH_SIZE = 50
 
+# "owner/repo" -> SPDX id (None when the repository or its license does not exist),
+# filled by prefetch_licenses
+_licenses: Dict[str, Optional[str]] = {}
 
-def get_license(source): # pragma: no cover
+
+def get_license(source):  # pragma: no cover
     if "github.com" not in source:
         source = _search(source)
     return _lookuplicense(source)
 
 
+def find_repository(name: str) -> Optional[str]:
+    """Return the URL of the GitHub repository named ``name``, or None if there is none."""
+    return _search(name)
+
+
 def _search(repo_name):
     # TODO: Hacky way to search for a repo. Need to improve this.
     # For now, always skip if the repo_name is 'python'
     if repo_name == "python":
         return None
 
-    url = f"https://api.github.com/search/repositories?q={repo_name}+in:name"
-    response = requests.get(url)
-    if response.status_code == 200:
-        repos = response.json()["items"]
+    return _cached(githubcache.REPOSITORY, repo_name, _search_remote)
+
+
+def _search_remote(repo_name, etag=None) -> Tuple[bool, Optional[str], Optional[str]]:
+    url = f"/search/repositories?q={repo_name}+in:name"
+    status_code, data, etag = githubclient.client().get_json_conditional(url, etag)
+    if status_code == 304:
+        return True, githubcache.NOT_MODIFIED, etag
+    if status_code == 200:
+        repos = data["items"]
 
         for repo in repos:
             if repo["name"] == repo_name:
-                return repo["html_url"]
+                return True, repo["html_url"], etag
 
-    return None
+        negativecache.record_missing(negativecache.NO_GITHUB_REPO, repo_name)
+        return True, None, etag
 
+    return False, None, None
 
-def _lookuplicense(source_url: str):
 
+def _repository(source_url) -> Optional[Tuple[str, str]]:
     try:
         owner, repo = source_url.split("github.com/")[1].split("/")
     except Exception:
+        return None
+    return owner, repo
+
+
+def _lookuplicense(source_url: str):
+
+    repository = _repository(source_url)
+    if repository is None:
         return False, None
 
-    url = f"https://api.github.com/repos/{owner}/{repo}/license"
-    response = requests.get(url)
-    if response.status_code == 200:
-        tmp = response.json()
+    key = "/".join(repository).lower()
+    if key in _licenses:
+        license = _licenses[key]
+    else:
+        license = _cached(githubcache.LICENSE, key, _license_remote)
+
+    return checklicense(license) if license else (False, None)
+
+
+def _license_remote(key: str, etag=None) -> Tuple[bool, Optional[str], Optional[str]]:
+    status_code, tmp, etag = githubclient.client().get_json_conditional(
+        f"/repos/{key}/license", etag
+    )
+    if status_code == 304:
+        return True, githubcache.NOT_MODIFIED, etag
+    if status_code == 200 and tmp.get("license"):
+        return True, tmp["license"]["spdx_id"], etag
+
+    # Rate limits and server errors are not a definite answer
+    if status_code in (200, 404):
+        negativecache.record_missing(negativecache.NO_LICENSE, key)
+        return True, None, None
+
+    return False, None, None
+
+
+# Kind of negative cache entry for each kind of GitHub cache entry
+_MISSES = {
+    githubcache.REPOSITORY: negativecache.NO_GITHUB_REPO,
+    githubcache.LICENSE: negativecache.NO_LICENSE,
+}
+
+
+def _cached(kind: str, key: str, fetch) -> Optional[str]:
+    """Look ``key`` up in the GitHub cache, then the negative cache, then on GitHub."""
+    cache = githubcache.current()
+    if cache is not None:
+        found, value = cache.get(kind, key, fetch)
+        if found:
+            return value
+
+    if negativecache.is_missing(_MISSES[kind], key):
+        return None
+
+    if cache is not None:
+        return cache.revalidate(kind, key, fetch)[1]
+    return fetch(key, None)[1]
+
+
+def prefetch_licenses(source_urls: Iterable[str]) -> int:
+    """
+    Look up the licenses of many GitHub repositories in batched GraphQL queries.
+
+    Up to ``BATCH_SIZE`` repositories are resolved per request, and later
+    ``get_license`` calls for them are answered from memory. GraphQL needs a
+    token; without one, or for repositories a batch could not resolve, the
+    lookups fall back to one REST call each.
+
+    Args:
+        source_urls (Iterable[str]): GitHub repository URLs.
+
+    Returns:
+        int: Number of repositories resolved.
+    """
+    client = githubclient.client()
+    if not client.token:
+        logger.debug("No GitHub token, licenses are looked up one repository at a time")
+        return 0
+
+    cache = githubcache.current()
+    pending = {}
+    for source_url in source_urls:
+        repository = _repository(source_url) if source_url else None
+        if repository is None:
+            continue
+        key = "/".join(repository).lower()
+        if key in _licenses or negativecache.is_missing(negativecache.NO_LICENSE, key):
+            continue
+        if cache is not None and cache.is_fresh(githubcache.LICENSE, key):
+            continue
+        pending.setdefault(key, repository)
+
+    resolved = 0
+    repositories = list(pending.items())
+    for start in range(0, len(repositories), BATCH_SIZE):
+        resolved += _query_licenses(client, repositories[start : start + BATCH_SIZE])
+    return resolved
+
+
+def _query_licenses(client, repositories) -> int:
+    aliases = {f"r{i}": key for i, (key, _) in enumerate(repositories)}
+    fields = " ".join(
+        f"r{i}: repository(owner: {json.dumps(owner)}, name: {json.dumps(repo)}) {{ licenseInfo {{ spdxId }} }}"
+        for i, (_, (owner, repo)) in enumerate(repositories)
+    )
+    try:
+        status_code, body = client.graphql(f"query {{ {fields} }}")
+    except requests.RequestException as e:
+        # The repositories are looked up one at a time instead
+        logger.debug(f"GraphQL license lookup failed: {e}")
+        return 0
+    if status_code != 200 or not body:
+        logger.debug(f"GraphQL license lookup failed: {status_code}")
+        return 0
 
-        if tmp.get("license"):
-            license = tmp["license"]["spdx_id"]
-            return checklicense(license)
+    data = body.get("data") or {}
+    not_found = {
+        error["path"][0]
+        for error in body.get("errors") or []
+        if error.get("type") == "NOT_FOUND" and error.get("path")
+    }
 
-    return False, None
+    resolved = 0
+    for alias, key in aliases.items():
+        repository = data.get(alias)
+        if repository is None and alias not in not_found:
+            # Not a definite answer, e.g. rate limited or timed out
+            continue
+        spdx_id = ((repository or {}).get("licenseInfo") or {}).get("spdxId")
+        _licenses[key] = spdx_id
+        cache = githubcache.current()
+        if spdx_id is None:
+            negativecache.record_missing(negativecache.NO_LICENSE, key)
+            if cache is not None:
+                cache.delete(githubcache.LICENSE, key)
+        elif cache is not None:
+            cache.put(githubcache.LICENSE, key, spdx_id)
+        resolved += 1
+    return resolved
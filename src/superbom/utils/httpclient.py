@@ -0,0 +1,95 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import threading
+from importlib.metadata import PackageNotFoundError, version
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts in seconds, so a hung socket cannot stall a scan
+DEFAULT_TIMEOUT = (10, 60)
+
+# Responses that are retried; Retry-After is honored for 429 and 503
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 5
+
+# Retries wait BACKOFF_FACTOR * 2 ** (retry - 1) seconds plus up to BACKOFF_JITTER
+# seconds of random jitter, capped at BACKOFF_MAX
+BACKOFF_FACTOR = 0.5
+BACKOFF_JITTER = 0.5
+BACKOFF_MAX = 60
+
+# Connections kept alive per host
+POOL_SIZE = 32
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _user_agent() -> str:
+    try:
+        return f"superbom/{version('superbom')}"
+    except PackageNotFoundError:  # pragma: no cover
+        return "superbom"
+
+
+def create_session() -> requests.Session:
+    """
+    Create a session with pooled keep-alive connections and retries.
+
+    Connection errors and 429/5xx responses are retried with jittered
+    exponential backoff, waiting for ``Retry-After`` when the server sends it.
+    Once the retries are used up the last response is returned, so callers
+    keep checking ``status_code`` as usual.
+    """
+    retry = Retry(
+        total=MAX_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        backoff_factor=BACKOFF_FACTOR,
+        backoff_jitter=BACKOFF_JITTER,
+        backoff_max=BACKOFF_MAX,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = _user_agent()
+    return session
+
+
+def session() -> requests.Session:
+    """Return the session shared by every client in the process."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """
+    Send a GET request through the shared session.
+
+    Takes the same arguments as ``requests.get``; ``timeout`` defaults to
+    ``DEFAULT_TIMEOUT``.
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return session().get(url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    """
+    Send a POST request through the shared session.
+
+    Takes the same arguments as ``requests.post``; ``timeout`` defaults to
+    ``DEFAULT_TIMEOUT``. POST requests are not retried on 429/5xx responses.
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return session().post(url, **kwargs)
@@ -1,22 +1,57 @@
 # Copyright (C) 2024 Intel Corporation
 # SPDX-License-Identifier: Apache 2.0
 
+import functools
+import threading
+from typing import Optional
+
 from flame.license_db import FossLicenses
 
+# Distinct license strings remembered; a BOM rarely has more than a few dozen
+MAX_CACHED_LICENSES = 4096
 
-def checklicense(license) -> tuple[bool, str]:
+_foss_licenses: Optional[FossLicenses] = None
+_lock = threading.Lock()
+
+
+def _license_db() -> FossLicenses:
+    """Return the license database shared by every lookup in the process."""
+    global _foss_licenses
+    if _foss_licenses is None:
+        with _lock:
+            if _foss_licenses is None:
+                _foss_licenses = FossLicenses()
+    return _foss_licenses
+
+
+@functools.lru_cache(maxsize=MAX_CACHED_LICENSES)
+def _checklicense(license) -> tuple[bool, str]:
 
     # connonicalize the license
 
-    fl = FossLicenses()
+    fl = _license_db()
     try:
-        cleaned_license = fl.license_complete(license)
+        # FossLicenses keeps its own caches, so lookups are not run concurrently
+        with _lock:
+            cleaned_license = fl.license_complete(license)
 
-        expression = fl.expression_compatibility_as(
-            cleaned_license["spdxid"] if cleaned_license else license
-        )
+            expression = fl.expression_compatibility_as(
+                cleaned_license["spdxid"] if cleaned_license else license
+            )
 
         return expression["compat_support"]["supported"], expression["compat_license"]
 
     except Exception:
         return False, license
+
+
+def checklicense(license) -> tuple[bool, str]:
+    try:
+        return _checklicense(license)
+    except TypeError:
+        # Unhashable license data can not be looked up
+        return False, license
+
+
+checklicense.cache_clear = _checklicense.cache_clear
+checklicense.cache_info = _checklicense.cache_info
@@ -0,0 +1,108 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from superbom.utils.logger import AppLogger
+from superbom.utils.sqlitestore import SQLiteStore, cache_root
+
+logger = AppLogger().get_logger()
+
+# Kinds of lookups whose misses are remembered
+NOT_ON_PYPI = "pypi"
+NO_GITHUB_REPO = "github-repo"
+NO_LICENSE = "github-license"
+
+_CREATE_MISSES = """
+CREATE TABLE IF NOT EXISTS misses (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+)
+"""
+
+
+class NegativeCache(SQLiteStore):
+    """
+    Persistent record of lookups that found nothing.
+
+    Package names that are not on PyPI, names without a GitHub repository and
+    repositories without a license are remembered for a TTL per kind, so
+    internal or private packages do not pay for the slow fallbacks on every
+    scan. Misses are kept in memory for the process and in a SQLite database in
+    ``<cache_dir>/negative/misses.sqlite`` across runs.
+
+    Only definite answers (a 404, a search without a match, a repository
+    without a license) are recorded; rate limits and server errors are not.
+    """
+
+    # Seconds a miss of each kind is trusted
+    DEFAULT_TTLS = {
+        NOT_ON_PYPI: 7 * 24 * 60 * 60,
+        NO_GITHUB_REPO: 7 * 24 * 60 * 60,
+        # Repositories gain licenses more often than packages appear
+        NO_LICENSE: 24 * 60 * 60,
+    }
+
+    def __init__(self, cache_dir=None, ttls: Optional[Dict[str, float]] = None, refresh=False):
+        super().__init__(cache_root(cache_dir) / "negative" / "misses.sqlite", _CREATE_MISSES)
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        # refresh ignores misses recorded before this run
+        self._not_before = time.time() if refresh else 0
+        self._memo: Dict[tuple, Optional[float]] = {}
+
+    def contains(self, kind: str, key: str) -> bool:
+        """Return whether a lookup of ``key`` recently found nothing."""
+        with self._lock:
+            if (kind, key) in self._memo:
+                recorded_at = self._memo[(kind, key)]
+            else:
+                row = self._fetchone(
+                    "SELECT recorded_at FROM misses WHERE kind = ? AND key = ?", (kind, key)
+                )
+                recorded_at = self._memo[(kind, key)] = row[0] if row else None
+
+        if recorded_at is None or recorded_at < self._not_before:
+            return False
+        return time.time() - recorded_at < self.ttls.get(kind, 0)
+
+    def add(self, kind: str, key: str):
+        """Remember that a lookup of ``key`` found nothing."""
+        now = time.time()
+        with self._lock:
+            self._memo[(kind, key)] = now
+            self._execute("INSERT OR REPLACE INTO misses VALUES (?, ?, ?)", (kind, key, now))
+        logger.debug(f"Remembering {kind} miss for {key}")
+
+
+# The cache consulted by the lookups; None disables negative caching
+_cache: Optional[NegativeCache] = None
+
+
+def configure(cache: Optional[NegativeCache]):
+    """Set the negative cache used by every lookup in the process."""
+    global _cache
+    _cache = cache
+
+
+def is_missing(kind: str, key: str) -> bool:
+    return _cache is not None and _cache.contains(kind, key)
+
+
+def record_missing(kind: str, key: str):
+    if _cache is not None:
+        _cache.add(kind, key)
+
+
+@contextmanager
+def using(cache: Optional[NegativeCache]):
+    """Use ``cache`` for the lookups made inside the ``with`` block."""
+    previous = _cache
+    configure(cache)
+    try:
+        yield cache
+    finally:
+        configure(previous)
@@ -2,18 +2,77 @@
 # SPDX-License-Identifier: Apache 2.0
 
 import bz2
+import errno
+import io
 import json
 import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urljoin, urlparse
+from urllib.request import url2pathname
 
 import requests
 from tqdm import tqdm
 
+from superbom.utils import httpclient
+from superbom.utils.filelock import FileLock, part_path
 from superbom.utils.logger import AppLogger
+from superbom.utils.packageindexes.conda.condaindex import (
+    PACKAGE_SECTIONS,
+    RECORD_FIELDS,
+    CondaIndex,
+    ShardedCondaIndex,
+    iter_repodata_records,
+    project_records,
+)
+from superbom.utils.sqlitestore import cache_root
+
+# zstandard and msgpack are optional; they enable .zst and sharded repodata
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
 
 logger = AppLogger().get_logger()
 
+_DECOMPRESS_ERRORS = (OSError, EOFError, ValueError) + (
+    (zstandard.ZstdError,) if zstandard else ()
+)
+
+
+def available_formats() -> List[str]:
+    """Repodata formats usable with the installed packages, in order of preference."""
+    formats = []
+    if zstandard is not None and msgpack is not None:
+        formats.append("shards")
+    if zstandard is not None:
+        formats.append("zst")
+    formats.append("bz2")
+    return formats
+
+
+def _decompressor(compression: str):
+    """Return an incremental decompressor exposing ``decompress()`` and ``eof``."""
+    if compression == "zst":
+        return zstandard.ZstdDecompressor().decompressobj()
+    return bz2.BZ2Decompressor()
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    # Shards are written without a content size, so decompress as a stream
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
 
 class CondaCache:
     # Conda Channels
@@ -22,12 +81,56 @@ class CondaCache:
     BANNED_CHANNELS = ["anaconda", "defaults"]
     DEFAULT_PLATFORMS = ["noarch"]
 
-    def __init__(self):
-        self._cache_dir = Path.joinpath(Path.home(), ".cbomcache")
+    # Size of each chunk read from the network while streaming repodata
+    BLOCK_SIZE = 1024 * 1024 * 3  # 3 Mebibyte
+
+    # Cached repodata younger than this (in seconds) is used without revalidation
+    DEFAULT_MAX_AGE = 24 * 60 * 60
+
+    # Number of channel/platform entries fetched in parallel by prefetch
+    DEFAULT_WORKERS = 8
+
+    # Base URL that channel names are resolved against
+    CHANNEL_ALIAS = "https://conda.anaconda.org"
+
+    def __init__(
+        self,
+        cache_dir=None,
+        max_age: Optional[float] = DEFAULT_MAX_AGE,
+        refresh=False,
+        channel_alias: str = CHANNEL_ALIAS,
+        formats: Optional[Sequence[str]] = None,
+        memo_size: Optional[int] = CondaIndex.DEFAULT_MEMO_SIZE,
+        channel_urls: Optional[Dict[str, str]] = None,
+        max_size: Optional[int] = None,
+        fields: Optional[Sequence[str]] = RECORD_FIELDS,
+    ):
+        self._cache_dir = cache_root(cache_dir)
+        # base URL (https://, file:// or a directory) that channel names are resolved against
+        self.channel_alias = channel_alias.rstrip("/")
+        # per channel base URLs that take precedence over the alias, e.g. a local mirror
+        self.channel_urls = {name: url.rstrip("/") for name, url in (channel_urls or {}).items()}
+        # repodata formats to try, most efficient first ("shards", "zst", "bz2")
+        self.formats = list(formats) if formats is not None else available_formats()
+        # decoded package names each loaded index keeps in memory (0 = none, None = all)
+        self.memo_size = memo_size
+        # record fields kept when repodata is indexed (None keeps whole records)
+        self.fields = list(fields) if fields is not None else None
+
+        # max_age of None means cached entries never expire
+        self.max_age = max_age
+        # refresh forces a full download of every entry once per process
+        self.refresh = refresh
+        # disk budget in bytes, least recently used entries are evicted beyond it (None = unbounded)
+        self.max_size = max_size
+        # entries downloaded or revalidated by this process
+        self._validated = set()
+        self._progress_lock = threading.Lock()
+        self._prune_lock = threading.Lock()
 
         self.caches = {}
-        self._platforms: List[str] = self.DEFAULT_PLATFORMS
-        self._channels: List[str] = self.DEFAULT_CHANNELS
+        self._platforms: List[str] = list(self.DEFAULT_PLATFORMS)
+        self._channels: List[str] = list(self.DEFAULT_CHANNELS)
 
     def add_cache(self, channel, platform):
         data = self.get_cached_data(channel, platform)
@@ -42,6 +145,12 @@ class CondaCache:
         self.caches[channel][platform] = data
         return self.caches[channel][platform]
 
+    def evict(self, channel, platform):
+        """Close a loaded index and drop it from memory; it is reopened on next use."""
+        index = self.caches.get(channel, {}).pop(platform, None)
+        if index is not None:
+            index.close()
+
     def get_cache(self, channel, platform):
         data = {}
         try:
@@ -84,86 +193,681 @@ class CondaCache:
 
         return self._channels
 
+    @staticmethod
+    def _channel_path(channel) -> str:
+        # Channel may have / (or be a full URL), so replace anything unsafe in a file name with _
+        return re.sub(r"[^\w.-]", "_", channel)
+
+    def _cache_file(self, channel, platform) -> str:
+        return os.path.join(self.cache_dir, f"{self._channel_path(channel)}_{platform}.sqlite")
+
+    def _repodata_file(self, channel, platform) -> str:
+        # Raw repodata is only kept on disk while it is being indexed
+        return os.path.join(self.cache_dir, f"{self._channel_path(channel)}_{platform}.json")
+
+    def _metadata_file(self, channel, platform) -> str:
+        return os.path.join(self.cache_dir, f"{self._channel_path(channel)}_{platform}.meta.json")
+
+    def _lock_file(self, channel, platform) -> str:
+        # Held while an entry is downloaded, so concurrent processes fetch it only once
+        return os.path.join(self.cache_dir, f"{self._channel_path(channel)}_{platform}.lock")
+
+    def channel_base(self, channel) -> str:
+        """
+        Return the base URL or directory of a channel.
+
+        Explicit ``channel_urls`` win, then channels that already are a URL or a
+        path (``/``, ``./``, ``../`` or ``~``), and everything else is resolved
+        against ``channel_alias``.
+        """
+        if channel in self.channel_urls:
+            return self.channel_urls[channel]
+        if "://" in channel:
+            return channel.rstrip("/")
+        if channel.startswith(("./", "../", "~")) or os.path.isabs(channel):
+            return os.path.expanduser(channel).rstrip("/")
+        return f"{self.channel_alias}/{channel}"
+
+    def channel_url(self, channel, platform) -> str:
+        return f"{self.channel_base(channel)}/{platform}/"
+
+    def local_channel_dir(self, channel) -> Optional[Path]:
+        """Return the directory of a ``file://`` or plain directory channel, or None if it is remote."""
+        base = self.channel_base(channel)
+        url = urlparse(base)
+        if url.scheme == "file":
+            return Path(url2pathname(url.path))
+        if not url.scheme or (len(url.scheme) == 1 and os.path.isabs(base)):
+            # A plain path (a single letter scheme is a Windows drive)
+            return Path(base)
+        return None
+
     def is_cached(self, channel, platform):
-        base = self.cache_dir
-        cache_file = os.path.join(base, f"{channel}_{platform}.json")
+        cache_file = self._cache_file(channel, platform)
         return os.path.exists(cache_file)
 
+    def read_metadata(self, channel, platform) -> Optional[dict]:
+        """Return the freshness metadata stored alongside a cache entry, if any."""
+        try:
+            with open(self._metadata_file(channel, platform), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_metadata(self, channel, platform, metadata: dict):
+        metadata_file = self._metadata_file(channel, platform)
+        part_file = part_path(metadata_file)
+        with open(part_file, "w") as f:
+            json.dump(metadata, f)
+        os.replace(part_file, metadata_file)
+
+    def is_fresh(self, channel, platform):
+        """
+        Check whether a cache entry can be used without contacting the channel.
+
+        An entry is fresh when it exists and was already validated by this process,
+        or when it has freshness metadata, was fetched less than ``max_age`` seconds
+        ago and no refresh has been requested. Local channels are read in place and
+        are always fresh.
+        """
+        if self.local_channel_dir(channel) is not None:
+            return True
+
+        if not self.is_cached(channel, platform):
+            return False
+
+        if (channel, platform) in self._validated:
+            return True
+
+        if self.refresh:
+            return False
+
+        metadata = self.read_metadata(channel, platform)
+        if not metadata or not self._same_fields(metadata):
+            return False
+
+        if self.max_age is None:
+            return True
+
+        return time.time() - metadata.get("fetched_at", 0) < self.max_age
+
+    def _same_fields(self, metadata: dict) -> bool:
+        # Entries indexed with another field set have to be downloaded again in full
+        if "fields" not in metadata:
+            # Written before records were projected, so they are complete
+            return self.fields is None
+        return metadata["fields"] == self.fields
+
     def get_cached_data(self, channel, platform):
         logger.debug(f"Getting cached data for {channel}/{platform}")
 
-        # Channel may have / in it, so replace with _
-        channelpath = channel.replace("/", "_")
+        local_dir = self.local_channel_dir(channel)
+        if local_dir is not None:
+            return self.open_local(channel, platform)
 
-        if not self.is_cached(channelpath, platform):
-            self.cache_data(channel, platform)
+        if not self.is_fresh(channel, platform):
+            try:
+                self.cache_data(channel, platform)
+            except OSError as e:
+                if not isinstance(e, PermissionError) and e.errno != errno.EROFS:
+                    raise
+                # A read-only cache directory can not be locked or updated, so the
+                # stale entry is served as is for the rest of the run
+                logger.warning(f"Cannot refresh conda cache for {channel}/{platform}: {e}")
+                if self.is_cached(channel, platform):
+                    self._validated.add((channel, platform))
 
-        cache_file = os.path.join(self.cache_dir, f"{channelpath}_{platform}.json")
+        cache_file = self._cache_file(channel, platform)
 
         if not os.path.exists(cache_file):
             return None
-        else:
-            with open(cache_file, "r") as f:
-                return json.load(f)
 
-    def cache_data(self, channel, platform):
-        # Channel may have / in it, so replace with _
-        channelpath = channel.replace("/", "_")
+        try:
+            return self._open_index(channel, platform)
+        except (sqlite3.DatabaseError, ValueError, TypeError) as e:
+            # Unreadable or outdated index, so rebuild it from scratch
+            logger.warning(f"Discarding conda cache for {channel}/{platform}: {e}")
+            os.remove(cache_file)
 
-        if not os.path.exists(self.cache_dir):
-            os.makedirs(self.cache_dir)
-        cache_file = os.path.join(self.cache_dir, f"{channelpath}_{platform}.json")
+        if not self.cache_data(channel, platform):
+            return None
+        return self._open_index(channel, platform)
 
-        raw_data = self.download_json(channel, platform)
+    def _open_index(self, channel, platform) -> CondaIndex:
+        cache_file = self._cache_file(channel, platform)
+        metadata = self.read_metadata(channel, platform) or {}
 
-        if not raw_data:
+        # Record the access so eviction drops the least recently used entries first.
+        # Touching the index leaves the metadata to the process holding the entry lock.
+        try:
+            os.utime(cache_file)
+        except OSError as e:
+            # e.g. a read-only cache directory
+            logger.debug(f"Failed to record use of {cache_file}: {e}")
+
+        if metadata.get("format") == "shards":
+            return ShardedCondaIndex.open(cache_file, self.fetch_shard, self.memo_size)
+        return CondaIndex.open(cache_file, self.memo_size)
+
+    def open_local(self, channel, platform) -> Optional[CondaIndex]:
+        """
+        Index the repodata of a local channel directory.
+
+        ``repodata.json`` is preferred, then ``repodata.json.zst`` and
+        ``repodata.json.bz2``. The repodata is read in place; only the package
+        index derived from it is kept in the cache directory, and it is reused
+        until the source file changes size or mtime. When the cache directory
+        is not writable the records are indexed in memory instead.
+        """
+        platform_dir = self.local_channel_dir(channel) / platform
+        openers = [("repodata.json", open)]
+        if zstandard is not None:
+            openers.append(("repodata.json.zst", zstandard.open))
+        openers.append(("repodata.json.bz2", bz2.open))
+
+        for filename, opener in openers:
+            path = platform_dir / filename
+            if not path.is_file():
+                continue
+            try:
+                return self._local_index(channel, platform, path, opener)
+            except (*_DECOMPRESS_ERRORS, sqlite3.DatabaseError) as e:
+                # Corrupt repodata fails again below and is reported there
+                logger.debug(f"Failed to cache the index of {path}, indexing it in memory: {e}")
+            try:
+                with opener(path, "rb") as raw, io.TextIOWrapper(raw, encoding="utf-8") as f:
+                    records = project_records(iter_repodata_records(f), self.fields)
+                    return CondaIndex.from_records(records, self.memo_size)
+            except _DECOMPRESS_ERRORS as e:
+                logger.error(f"Failed to read local repodata {path}: {e}")
+                return None
+
+        logger.debug(f"No repodata found in {platform_dir}")
+        return None
+
+    def _local_index(self, channel, platform, path: Path, opener) -> CondaIndex:
+        stat = path.stat()
+        source = {
+            "source": str(path.resolve()),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "fields": self.fields,
+        }
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with FileLock(self._lock_file(channel, platform)):
+            metadata = self.read_metadata(channel, platform) or {}
+            current = all(metadata.get(key) == value for key, value in source.items())
+            if not current or not self.is_cached(channel, platform):
+                logger.debug(f"Indexing local repodata {path}")
+                with opener(path, "rb") as raw, io.TextIOWrapper(raw, encoding="utf-8") as f:
+                    records = project_records(iter_repodata_records(f), self.fields)
+                    CondaIndex.build(self._cache_file(channel, platform), records).close()
+                self.write_metadata(
+                    channel,
+                    platform,
+                    {
+                        "channel": channel,
+                        "platform": platform,
+                        "format": "local",
+                        **source,
+                        "fetched_at": time.time(),
+                    },
+                )
+        return self._open_index(channel, platform)
+
+    def cache_data(self, channel, platform, progress: Optional[tqdm] = None) -> bool:
+        """
+        Download or revalidate the cache entry for a channel/platform.
+
+        When the entry already exists, a conditional GET is made with the stored
+        ETag/Last-Modified validators so an unchanged channel costs a single 304
+        round-trip. A failed revalidation leaves the existing (stale) entry in place.
+
+        Processes sharing the cache directory fetch an entry only once: the
+        download runs under a lock file, and a process that had to wait for the
+        lock uses the entry the holder just wrote instead of fetching it again.
+
+        Args:
+            progress (tqdm, optional): Shared progress bar to report download progress to.
+
+        Returns:
+            bool: True if the entry is now up to date, False otherwise.
+        """
+        if self.local_channel_dir(channel) is not None:
+            # Read in place by get_cached_data, there is nothing to download
+            return True
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        requested_at = time.time()
+        with FileLock(self._lock_file(channel, platform)) as lock:
+            metadata = self.read_metadata(channel, platform) or {}
+            fetched_meanwhile = lock.waited and metadata.get("fetched_at", 0) >= requested_at
+            if fetched_meanwhile and self.is_cached(channel, platform):
+                logger.debug(
+                    f"Cached data for {channel}/{platform} was fetched by another process"
+                )
+                self._validated.add((channel, platform))
+                ok = True
+            else:
+                ok = self._cache_data(channel, platform, progress)
+
+        if ok and self.max_size is not None:
+            self.prune()
+        return ok
+
+    def _cache_data(self, channel, platform, progress: Optional[tqdm] = None) -> bool:
+        cache_file = self._cache_file(channel, platform)
+
+        metadata = self.read_metadata(channel, platform) or {}
+        force = self.refresh and (channel, platform) not in self._validated
+        force = force or not self._same_fields(metadata)
+        self._validated.add((channel, platform))
+
+        headers = {}
+        if not force and os.path.exists(cache_file):
+            if metadata.get("etag"):
+                headers["If-None-Match"] = metadata["etag"]
+            if metadata.get("last_modified"):
+                headers["If-Modified-Since"] = metadata["last_modified"]
+
+        # Validators only apply to the file they were received for, which is tried first.
+        # Entries written before formats were recorded always came from repodata.json.bz2.
+        previous_format = metadata.get("format", "bz2" if headers else None)
+        formats = sorted(self.formats, key=lambda fmt: fmt != previous_format)
+
+        repodata_file = self._repodata_file(channel, platform)
+        validators = None
+        for fmt in formats:
+            fmt_headers = headers if fmt == previous_format else {}
+            if fmt == "shards":
+                validators = self.download_shard_index(channel, platform, cache_file, fmt_headers)
+            else:
+                validators = self.download_json(
+                    channel, platform, repodata_file, fmt_headers, progress, fmt
+                )
+            if validators is not None:
+                break
+
+        if validators is None:
             logger.debug(f"Failed to download data for {channel}/{platform}")
-            return
+            return False
 
-        with open(cache_file, "w") as f:
-            info = json.loads(raw_data)
-            json.dump(info, f, indent=4)
+        if validators.get("not_modified"):
+            logger.debug(f"Cached data for {channel}/{platform} is still current")
+        else:
+            metadata = {}
+            if fmt != "shards" and not self.index_repodata(repodata_file, cache_file):
+                logger.error(f"Failed to index data for {channel}/{platform}")
+                return False
+
+        metadata.update(
+            {
+                "channel": channel,
+                "platform": platform,
+                "format": fmt,
+                "fields": self.fields,
+                "etag": validators.get("etag") or metadata.get("etag"),
+                "last_modified": validators.get("last_modified") or metadata.get("last_modified"),
+                "fetched_at": time.time(),
+            }
+        )
+        self.write_metadata(channel, platform, metadata)
+        return True
+
+    def index_repodata(self, repodata_file, cache_file) -> bool:
+        """Build the package index at ``cache_file`` from a repodata.json file and remove it."""
+        try:
+            with open(repodata_file, "r", encoding="utf-8") as f:
+                records = project_records(iter_repodata_records(f), self.fields)
+                CondaIndex.build(cache_file, records).close()
+        except (OSError, ValueError, sqlite3.DatabaseError) as e:
+            logger.debug(f"Failed to index {repodata_file}: {e}")
+            return False
+        finally:
+            if os.path.exists(repodata_file):
+                os.remove(repodata_file)
+
+        return True
+
+    def download_shard_index(self, channel, platform, cache_file, headers=None) -> Optional[dict]:
+        """
+        Download the sharded repodata index (CEP-16) for a channel/platform.
+
+        Only the mapping of package names to shard hashes is stored in the index at
+        ``cache_file``; the shards themselves are fetched on first lookup.
+
+        Returns:
+            dict: The response validators and a ``not_modified`` flag for a 304
+            response, or None if the channel does not serve sharded repodata.
+        """
+        url = urljoin(self.channel_url(channel, platform), "repodata_shards.msgpack.zst")
+
+        response = httpclient.get(url, headers=headers or {})
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+        if response.status_code == 304:
+            return {**validators, "not_modified": True}
+
+        if response.status_code != 200:
+            logger.debug(f"No sharded repodata for {channel}/{platform}")
+            return None
+
+        try:
+            shard_index = msgpack.unpackb(_zstd_decompress(response.content))
+            shards = shard_index["shards"]
+            # shards_base_url is resolved against the shard index URL
+            shards_base_url = urljoin(url, shard_index.get("info", {}).get("shards_base_url", ""))
+            if not shards_base_url.endswith("/"):
+                shards_base_url += "/"
+
+            ShardedCondaIndex.build(cache_file, shards, shards_base_url, self.fetch_shard).close()
+        except (*_DECOMPRESS_ERRORS, KeyError, TypeError, sqlite3.DatabaseError) as e:
+            logger.debug(f"Failed to index sharded repodata for {channel}/{platform}: {e}")
+            return None
+
+        return validators
+
+    def fetch_shard(self, url) -> Optional[list]:
+        """
+        Download one repodata shard.
 
-    def download_json(self, channel, platform):
-        json_str = None
-        url = f"https://conda.anaconda.org/{channel}/{platform}/repodata.json.bz2"
+        Returns:
+            list: ``(filename, record)`` for every package in the shard, or None on failure.
+        """
+        try:
+            response = httpclient.get(url)
+            if response.status_code != 200:
+                logger.debug(f"Failed to fetch shard {url}")
+                return None
+            shard = msgpack.unpackb(_zstd_decompress(response.content))
+        except (requests.RequestException, *_DECOMPRESS_ERRORS) as e:
+            logger.debug(f"Failed to fetch shard {url}: {e}")
+            return None
+
+        records = (
+            (filename, record)
+            for section in PACKAGE_SECTIONS
+            for filename, record in (shard.get(section) or {}).items()
+        )
+        return list(project_records(records, self.fields))
+
+    def download_json(
+        self,
+        channel,
+        platform,
+        cache_file,
+        headers=None,
+        progress: Optional[tqdm] = None,
+        compression: str = "bz2",
+    ) -> Optional[dict]:
+        """
+        Stream ``repodata.json.bz2`` (or ``.zst``) for a channel/platform into ``cache_file``.
+
+        The body is decompressed chunk by chunk as it arrives and written straight to
+        disk, so peak memory is bounded by ``BLOCK_SIZE`` rather than the size of the
+        channel. The data is written to a ``.part`` file that only replaces
+        ``cache_file`` once the whole stream has been decompressed.
+
+        Args:
+            headers (dict, optional): Extra request headers, e.g. conditional GET validators.
+            progress (tqdm, optional): Shared progress bar; a bar for this download is
+                created when omitted.
+            compression (str): Either ``bz2`` or ``zst``.
+
+        Returns:
+            dict: The response validators (``etag``, ``last_modified``) and a
+            ``not_modified`` flag for a 304 response, or None on failure.
+        """
+        url = urljoin(self.channel_url(channel, platform), f"repodata.json.{compression}")
 
         # download the json with progress bar
-        response = requests.get(url, stream=True)
-        if response.status_code == 200:
-            total_size = int(response.headers.get("content-length", 0))
-            block_size = 1024 * 1024 * 3  # 3 Mebibyte
+        response = httpclient.get(url, headers=headers or {}, stream=True)
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+        if response.status_code == 304:
+            response.close()
+            return {**validators, "not_modified": True}
+
+        if response.status_code != 200:
+            logger.debug(f"Failed to fetch data for {channel}/{platform}")
+            return None
+
+        total_size = int(response.headers.get("content-length", 0))
+        if progress is None:
             t = tqdm(
                 total=total_size,
                 unit="iB",
                 unit_scale=True,
                 bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]",
             )
-
-            tmp = b""
-            for data in response.iter_content(block_size):
-                t.update(len(data))
-                tmp += data
-            t.close()
-
-            if total_size != 0 and t.n != total_size:
-                logger.error("ERROR, something went wrong")
-
-            json_str = bz2.decompress(tmp)
-
         else:
-            logger.debug(f"Failed to fetch data for {channel}/{platform}")
+            t = progress
+            with self._progress_lock:
+                t.total = (t.total or 0) + total_size
+                t.refresh()
+
+        received = 0
+        part_file = part_path(cache_file)
+        decompressor = _decompressor(compression)
+        try:
+            with open(part_file, "wb") as f:
+                for data in response.iter_content(self.BLOCK_SIZE):
+                    received += len(data)
+                    t.update(len(data))
+                    f.write(decompressor.decompress(data))
+        except requests.RequestException:
+            # The connection dropped mid-stream (RequestException is also an OSError)
+            os.remove(part_file)
+            raise
+        except _DECOMPRESS_ERRORS as e:
+            logger.error(f"Failed to decompress data for {channel}/{platform}: {e}")
+            os.remove(part_file)
+            return None
+        except BaseException:
+            os.remove(part_file)
+            raise
+        finally:
+            if progress is None:
+                t.close()
+
+        if total_size != 0 and received != total_size:
+            logger.error("ERROR, something went wrong")
+
+        if not decompressor.eof:
+            logger.error(f"Truncated data received for {channel}/{platform}")
+            os.remove(part_file)
+            return None
 
-        return json_str
+        os.replace(part_file, cache_file)
+        return validators
+
+    def prefetch(
+        self,
+        pairs: Optional[Iterable[Tuple[str, str]]] = None,
+        max_workers: int = DEFAULT_WORKERS,
+    ) -> List[Tuple[str, str]]:
+        """
+        Download or revalidate many channel/platform entries in parallel.
+
+        Args:
+            pairs (iterable, optional): ``(channel, platform)`` entries to fetch.
+                Defaults to every configured channel and platform.
+            max_workers (int): Maximum number of concurrent downloads.
+
+        Returns:
+            list: The entries that could not be fetched.
+        """
+        if pairs is None:
+            pairs = product(self.channels, self.platforms)
+
+        # Keep the first occurrence of each entry and skip the ones already fresh
+        pending = [pair for pair in dict.fromkeys(pairs) if not self.is_fresh(*pair)]
+        if not pending:
+            return []
+
+        logger.debug(f"Prefetching {len(pending)} conda cache entries")
+        progress = tqdm(
+            total=0,
+            desc=f"Fetching repodata ({len(pending)})",
+            unit="iB",
+            unit_scale=True,
+            bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]",
+        )
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                results = list(
+                    executor.map(lambda pair: self._prefetch_one(*pair, progress), pending)
+                )
+        finally:
+            progress.close()
+
+        failed = [pair for pair, ok in zip(pending, results) if not ok]
+        for channel, platform in failed:
+            logger.debug(f"Failed to prefetch data for {channel}/{platform}")
+        return failed
+
+    def _prefetch_one(self, channel, platform, progress) -> bool:
+        try:
+            return self.cache_data(channel, platform, progress=progress)
+        except requests.RequestException as e:
+            logger.warning(f"Failed to fetch data for {channel}/{platform}: {e}")
+            return False
 
     def update_cache(self):
-        for channel in self.channels:
-            for platform in self.platforms:
-                if not self.is_cached(channel, platform):
-                    logger.debug(f"Downloading data for {channel}/{platform}")
-                    self.download_json(channel, platform)
-                else:
-                    logger.debug(f"Data for {channel}/{platform} already cached")
+        self.prefetch()
+
+    # File name suffixes that make up a cache entry
+    ENTRY_SUFFIXES = (".sqlite", ".meta.json")
+
+    def entries(self) -> List[dict]:
+        """
+        Describe every entry in the cache directory, least recently used first.
+
+        Returns:
+            list: One dict per entry with its ``name``, ``channel``, ``platform``,
+            ``format``, ``size`` in bytes, ``fetched_at``, ``last_used`` and ``files``.
+        """
+        if not self.cache_dir.is_dir():
+            return []
+
+        grouped: Dict[str, List[Path]] = {}
+        for path in self.cache_dir.iterdir():
+            for suffix in self.ENTRY_SUFFIXES:
+                if path.name.endswith(suffix):
+                    grouped.setdefault(path.name[: -len(suffix)], []).append(path)
+                    break
+
+        entries = []
+        for name, files in grouped.items():
+            metadata = {}
+            try:
+                with open(self.cache_dir / f"{name}.meta.json", "r") as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+            size, modified = 0, {}
+            for path in files:
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                size += stat.st_size
+                modified[path.name] = stat.st_mtime
+
+            entries.append(
+                {
+                    "name": name,
+                    "channel": metadata.get("channel"),
+                    "platform": metadata.get("platform"),
+                    "format": metadata.get("format"),
+                    "size": size,
+                    "fetched_at": metadata.get("fetched_at"),
+                    # Opening an index touches it, so its mtime is the last use
+                    "last_used": modified.get(f"{name}.sqlite")
+                    or metadata.get("fetched_at")
+                    or max(modified.values(), default=0.0),
+                    "files": files,
+                }
+            )
+        return sorted(entries, key=lambda entry: entry["last_used"])
+
+    def _in_use(self) -> set:
+        """Names of the entries this process has loaded or is downloading."""
+        pairs = set(self._validated)
+        pairs.update(
+            (channel, platform) for channel in self.caches for platform in self.caches[channel]
+        )
+        return {f"{self._channel_path(channel)}_{platform}" for channel, platform in pairs}
+
+    @staticmethod
+    def _remove_entry(entry: dict):
+        for path in entry["files"]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def prune(self, max_size: Optional[int] = None) -> List[str]:
+        """
+        Evict the least recently used entries until the cache fits in ``max_size`` bytes.
+
+        Entries loaded or downloaded by this process, or locked by another one,
+        are never evicted.
+
+        Args:
+            max_size (int, optional): Disk budget in bytes. Defaults to ``self.max_size``.
+
+        Returns:
+            list: The names of the evicted entries.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        if max_size is None:
+            return []
+
+        with self._prune_lock:
+            entries = self.entries()
+            total = sum(entry["size"] for entry in entries)
+            in_use = self._in_use()
+
+            evicted = []
+            for entry in entries:
+                if total <= max_size:
+                    break
+                if entry["name"] in in_use or os.path.exists(
+                    self.cache_dir / f"{entry['name']}.lock"
+                ):
+                    # Loaded by this process or being written by another one
+                    continue
+                self._remove_entry(entry)
+                total -= entry["size"]
+                evicted.append(entry["name"])
+                logger.debug(f"Evicted conda cache entry {entry['name']} ({entry['size']} bytes)")
+
+        if total > max_size:
+            logger.warning(f"Conda cache uses {total} bytes, over its budget of {max_size} bytes")
+        return evicted
+
+    def clear(self) -> List[str]:
+        """Close every loaded index and remove every entry from the cache directory."""
+        for platforms in self.caches.values():
+            for index in platforms.values():
+                index.close()
+        self.caches = {}
+        self._validated.clear()
+
+        entries = self.entries()
+        for entry in entries:
+            self._remove_entry(entry)
+        return [entry["name"] for entry in entries]
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -6,21 +6,28 @@ import re
 from superbom.utils import licenseutils
 from superbom.utils.logger import AppLogger
 from superbom.utils.packageindexes.conda.condacache import CondaCache
+from superbom.utils.packageindexes.conda.condaindex import ShardedCondaIndex
 from superbom.utils.packageindexes.pypi import pypiutils
 
 logger = AppLogger().get_logger()
 
 
 class CondaPackageUtil:
-    def __init__(self):
-        self._cache = CondaCache()
+    def __init__(self, cache: CondaCache = None):
+        self._cache = cache if cache is not None else CondaCache()
 
     def parse_conda_dependency(self, dependency):
+        """
+        Split a conda dependency string into its channel, package, version and build.
+
+        Supports ``channel::name``, ``name=1.2``, ``name>=1.2,<2``,
+        ``name=1.2.3=build`` and the space separated ``name 1.2.3 build`` forms.
+        ``constraint`` holds the full conda version spec while ``version`` is the
+        bare version it refers to.
+        """
         # Regular expression to match the dependency pattern
         pattern = re.compile(
-            r"(?:(?P<channel>[^:]+)::)?(?P<package>[^=<>!]+)"
-            r"(?:(?P<version>[=<>!~*]+[^=<>!]+))?"
-            r"(?:(?P<build>=\w+))?"
+            r"\s*(?:(?P<channel>[^:]+)::)?(?P<package>[^\s=<>!~]+)\s*(?P<spec>.*?)\s*$"
         )
 
         match = pattern.match(dependency)
@@ -28,46 +35,65 @@ class CondaPackageUtil:
             raise ValueError(f"Invalid dependency format: {dependency}")
 
         components = match.groupdict()
+        spec = components.pop("spec")
+        constraint, build = spec or None, None
+
+        if spec and " " in spec:
+            # "name 1.2.3 build"
+            constraint, _, build = spec.partition(" ")
+        elif spec and spec.startswith("=") and not spec.startswith("=="):
+            # "name=1.2.3=build" pins an exact version and build
+            version, sep, build = spec[1:].partition("=")
+            constraint = version if sep else spec
+
+        components["constraint"] = constraint.strip() if constraint else None
+        components["build"] = build.strip() if build else None
 
         # Clean up the version string
-        if components.get("version"):
-            components["version"] = components["version"].strip(" =<>!~*")
+        components["version"] = None
+        if components["constraint"]:
+            components["version"] = re.split(r"[,|]", components["constraint"])[0].strip(
+                " =<>!~*."
+            )
 
         # Clean up the channel string
         if components.get("channel"):
             components["channel"] = components["channel"].strip()
 
-        # Clean up the package string
-        if components.get("package"):
-            components["package"] = components["package"].strip()
-
         return components
 
-    def lookup_package_from_cache(self, channel, platform, package, version=None):
-        data = self._cache.get_cache(channel, platform)
-
-        if not data:
+    def channel_platforms(self, packages) -> list:
+        """
+        Return every ``(channel, platform)`` that resolving ``packages`` may look at.
+
+        Packages pinned with ``channel::name`` only use their own channel, all
+        others use every configured channel.
+        """
+        pairs = {}
+        for package in packages:
+            if not package:
+                continue
+            channel = self.parse_conda_dependency(package)["channel"]
+            for c in [channel] if channel else self._cache.channels:
+                for platform in self._cache.platforms:
+                    pairs[(c, platform)] = None
+        return list(pairs)
+
+    def lookup_package_from_cache(self, channel, platform, package, version=None, build=None):
+        """
+        Find the newest package in a channel/platform matching a conda version spec.
+
+        Returns:
+            tuple: ``(filename, record)`` of the best match, or None.
+        """
+        index = self._cache.get_cache(channel, platform)
+
+        if not index:
             logger.error(f"Failed to find cache for {channel}/{platform}")
             return None
 
-        packages = {**data["packages"], **data["packages.conda"]}
-
-        try:
-            if version is None:
-                items = {k: v for k, v in packages.items() if v["name"] == package}
-            else:
-                items = {
-                    k: v
-                    for k, v in packages.items()
-                    if v["name"] == package and version in v["version"]
-                }
-
-            # sort the items by version
-            items = sorted(items.items(), key=lambda x: x[1]["version"], reverse=True)
-            package_info = items[0] if items else None
-        except KeyError:
-            pass
-        return package_info
+        matches = index.match(package, version, build)
+        return matches[0] if matches else None
 
     def _find_license(self, dictionary, license):
         for key in dictionary.keys():
@@ -75,55 +101,120 @@ class CondaPackageUtil:
                 return key, dictionary[key]
         return None, None
 
-    def retrieve_conda_package_info(self, package) -> dict:
-        package_data = {}
-
-        # make sure there's a package name
-        if not package:
-            return package_data
-
-        parsed = self.parse_conda_dependency(package)
-        found_channel = ""
-        found_platform = ""
-
-        channels = self._cache.channels
-
-        for channel in channels:
-            platforms = self._cache.platforms
-
-            for platform in platforms:
-                channel = parsed["channel"] if parsed["channel"] else channel
-                info = self.lookup_package_from_cache(
-                    channel, platform, parsed["package"], parsed["version"]
-                )
-                if not info:
-                    info = self.lookup_package_from_cache(channel, platform, parsed["package"])
-
-                if not info:
-                    info = self.lookup_package_from_cache(
-                        channel, platform, f"{parsed['package']}_{platform}"
-                    )
-
-                package_info = info[1] if info else None
-
-                if package_info:
-                    # Found the package in the platform
-                    _, license_info = self._find_license(package_info, "license")
+    def _match_index(self, index, parsed, platform):
+        """Find ``parsed`` in one index, falling back to any version and the ``name_platform`` alias."""
+        name = parsed["package"]
+        matches = index.match(name, parsed["constraint"], parsed["build"])
+        if not matches:
+            matches = index.match(name)
+        if not matches:
+            matches = index.match(f"{name}_{platform}")
+        return matches[0] if matches else None
+
+    def resolve_many(self, specs, evict: bool = False) -> list:
+        """
+        Resolve many conda dependency specs in one pass over the channel indexes.
+
+        Every spec is parsed up front. Channels are searched in order, and for each
+        platform the specs still pending are grouped by the channel they target,
+        so each channel/platform index is fetched once and matched against every
+        spec that needs it. A spec is settled in the first channel where it is
+        found, preferring a platform whose record carries license information.
+
+        Args:
+            specs (list): Conda dependency strings, e.g. ``numpy=1.26`` or ``conda-forge::scipy``.
+            evict (bool): Evict each index from memory once every pending spec has
+                been matched against it, so only one index is loaded at a time.
+
+        Returns:
+            list: The package data for every spec, in input order (``{}`` for empty
+            specs and None for specs that cannot be parsed or fail to resolve).
+        """
+        parsed = []
+        for spec in specs:
+            try:
+                parsed.append(self.parse_conda_dependency(spec) if spec else {})
+            except ValueError as e:
+                logger.error(f"Error processing item {spec}: {e}")
+                parsed.append(None)
+
+        found = {}
+        pending = [i for i, p in enumerate(parsed) if p]
+
+        for channel in self._cache.channels:
+            if not pending:
+                break
 
-                    if license_info:
-                        break
-                    else:
-                        continue
+            # spec index -> (record, channel, platform) found in this channel, if any
+            current = dict.fromkeys(pending)
+            licensed = set()
+            for platform in self._cache.platforms:
+                by_target = {}
+                for i in pending:
+                    if i not in licensed:
+                        by_target.setdefault(parsed[i]["channel"] or channel, []).append(i)
+
+                for target, indices in by_target.items():
+                    try:
+                        index = self._cache.get_cache(target, platform)
+                    except Exception as e:
+                        # e.g. a download the prefetch already reported; the index is treated as missing
+                        logger.error(f"Failed to fetch cache for {target}/{platform}: {e}")
+                        index = None
+                    if not index:
+                        logger.error(f"Failed to find cache for {target}/{platform}")
+                    elif isinstance(index, ShardedCondaIndex):
+                        # Fetch the shards of every pending spec in one parallel batch
+                        # rather than one request per spec from match()
+                        try:
+                            index.prefetch([parsed[i]["package"] for i in indices])
+                        except Exception as e:
+                            logger.error(f"Failed to prefetch shards for {target}/{platform}: {e}")
+
+                    for i in indices:
+                        try:
+                            info = self._match_index(index, parsed[i], platform) if index else None
+                        except Exception as e:
+                            logger.error(f"Error processing item {specs[i]}: {e}")
+                            info = None
+                        if not info:
+                            # Keep a match from an earlier platform
+                            continue
+                        current[i] = (info[1], target, platform)
+                        if self._find_license(info[1], "license")[1]:
+                            licensed.add(i)
+
+                    if evict:
+                        self._cache.evict(target, platform)
+
+            remaining = []
+            for i in pending:
+                if current[i]:
+                    found[i] = current[i]
+                elif not parsed[i]["channel"]:
+                    # Specs pinned to a channel would only repeat the same lookups
+                    remaining.append(i)
+            pending = remaining
+
+        results = []
+        for i, p in enumerate(parsed):
+            try:
+                results.append(self._package_data(p, *found.get(i, ({}, "", ""))) if p else p)
+            except Exception as e:
+                logger.error(f"Error processing item {specs[i]}: {e}")
+                results.append(None)
+        return results
 
-            if package_info:
-                # Found the package in the channel
-                found_channel = channel
-                found_platform = platform
-                break
+    def retrieve_conda_package_info(self, package) -> dict:
+        if not package:
+            return {}
+        # Raise on invalid specs, like the per-package lookup always did
+        self.parse_conda_dependency(package)
+        return self.resolve_many([package])[0]
 
+    def _package_data(self, parsed, package_info, found_channel, found_platform) -> dict:
         if not package_info:
             logger.debug(f"Failed to find package: {parsed['package']} in all channels")
-            package_info = {}
 
         name = package_info.get("name", parsed["package"])
         version = package_info.get("version", parsed["version"])
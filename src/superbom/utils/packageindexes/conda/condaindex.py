@@ -0,0 +1,508 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import json
+import os
+import sqlite3
+import sys
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from json.decoder import scanstring
+from pathlib import Path
+from typing import (
+    IO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from superbom.utils.filelock import part_path
+from superbom.utils.packageindexes.conda.condaversion import (
+    VersionOrder,
+    parse_version_spec,
+)
+
+# Sections of repodata.json that hold package records keyed by filename
+PACKAGE_SECTIONS = ("packages", "packages.conda")
+
+# Record fields a BOM needs; build_number is kept because lookups sort by it
+RECORD_FIELDS = ("name", "version", "build", "build_number", "license", "license_family")
+
+
+def project_records(
+    records: Iterable[Tuple[str, dict]], fields: Optional[Sequence[str]]
+) -> Iterator[Tuple[str, dict]]:
+    """Keep only ``fields`` (in that order) of every record, or everything when ``fields`` is None."""
+    if fields is None:
+        yield from records
+        return
+    for filename, record in records:
+        yield filename, {field: record[field] for field in fields if field in record}
+
+
+class _JSONStream:
+    """Minimal incremental reader over a text stream of JSON."""
+
+    def __init__(self, fileobj: IO[str], chunk_size: int):
+        self._file = fileobj
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of repodata")
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' in repodata at offset {self._pos}")
+        self._pos += 1
+
+    def string(self) -> str:
+        self.expect('"')
+        while True:
+            try:
+                value, end = scanstring(self._buf, self._pos)
+                self._pos = end
+                return value
+            except json.JSONDecodeError:
+                # Keep the opening quote consumed; scanstring starts after it
+                if not self._fill():
+                    raise
+
+    def value(self, decoder=json.JSONDecoder()):
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self._buf, self._pos)
+                # A value that runs up to the end of the buffer may be a partial number
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def members(self) -> Iterator[str]:
+        """Iterate over the keys of an object, leaving the stream at each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.string()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self._pos += 1
+                continue
+            self.expect("}")
+            return
+
+
+def iter_repodata_records(
+    fileobj: IO[str], chunk_size: int = 1024 * 1024
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Yield ``(filename, record)`` for every package in a repodata.json stream.
+
+    Records from both ``packages`` and ``packages.conda`` are yielded. Only one
+    record is decoded at a time, so memory use does not depend on the size of
+    the channel.
+    """
+    stream = _JSONStream(fileobj, chunk_size)
+    for section in stream.members():
+        if section in PACKAGE_SECTIONS and stream.peek() == "{":
+            for filename in stream.members():
+                yield filename, stream.value()
+        else:
+            stream.value()
+
+
+_CREATE_PACKAGES = (
+    "CREATE TABLE packages (name TEXT NOT NULL, filename TEXT NOT NULL, record BLOB NOT NULL)"
+)
+_CREATE_PACKAGES_INDEX = "CREATE INDEX packages_name ON packages (name)"
+_INSERT_PACKAGE = "INSERT INTO packages (name, filename, record) VALUES (?, ?, ?)"
+
+
+def _json_default(value):
+    # Sharded repodata stores hashes as raw bytes
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# zlib level used for stored records; records are small, so higher levels gain little
+_RECORD_COMPRESSION = 6
+
+
+def _package_rows(records: Iterable[Tuple[str, dict]]) -> Iterator[Tuple[str, str, bytes]]:
+    for filename, record in records:
+        data = json.dumps(record, separators=(",", ":"), default=_json_default)
+        yield record.get("name", ""), filename, zlib.compress(data.encode(), _RECORD_COMPRESSION)
+
+
+def _intern_strings(record: dict) -> dict:
+    # Names, licenses and field names repeat across records, so share one copy of each
+    return {
+        sys.intern(key): sys.intern(value) if isinstance(value, str) else value
+        for key, value in record.items()
+    }
+
+
+def _decode_record(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data), object_hook=_intern_strings)
+
+
+class CondaIndex:
+    """
+    Package records for one channel/platform, stored in SQLite and keyed by name.
+
+    Lookups only read and decode the rows for the requested package name, so
+    opening an index is cheap regardless of how large the channel is. The
+    decoded records for a name are sorted once by conda version order and kept
+    together with their precomputed version keys, so repeated lookups of the
+    same name cost a dictionary access and version constraints are resolved
+    by binary search.
+
+    On-disk indexes are memory-mapped, so an open index costs little more than
+    its file descriptor: pages are shared through the OS page cache between
+    processes reading the same file and only the decoded records of recently
+    looked up names are held in memory (``memo_size``; 0 decodes on every lookup).
+    """
+
+    # 2: records are stored as zlib compressed JSON
+    SCHEMA_VERSION = 2
+
+    # Bytes of the database file SQLite maps into memory instead of reading into its page cache
+    MMAP_SIZE = 1024 * 1024 * 1024  # 1 Gibibyte
+
+    # Number of names whose decoded records are kept, least recently used are dropped first
+    DEFAULT_MEMO_SIZE = 1024
+
+    def __init__(
+        self, connection: sqlite3.Connection, memo_size: Optional[int] = DEFAULT_MEMO_SIZE
+    ):
+        self._connection = connection
+        # None keeps every decoded name for the lifetime of the index
+        self.memo_size = memo_size
+        # name -> (ascending version keys, ascending records, newest-first records)
+        self._by_name: "OrderedDict[str, Tuple[List[VersionOrder], tuple, tuple]]" = OrderedDict()
+
+    @classmethod
+    def _connect(cls, path, readonly=True) -> sqlite3.Connection:
+        uri = Path(path).resolve().as_uri()
+        connection = sqlite3.connect(f"{uri}?mode=ro" if readonly else uri, uri=True)
+
+        (version,) = connection.execute("PRAGMA user_version").fetchone()
+        if version != cls.SCHEMA_VERSION:
+            connection.close()
+            raise ValueError(f"Unsupported conda index schema version {version} in {path}")
+
+        connection.execute(f"PRAGMA mmap_size = {cls.MMAP_SIZE}")
+        return connection
+
+    @classmethod
+    def open(cls, path, memo_size: Optional[int] = DEFAULT_MEMO_SIZE) -> "CondaIndex":
+        return cls(cls._connect(path), memo_size)
+
+    @classmethod
+    def _create(cls, connection: sqlite3.Connection, records: Iterable[Tuple[str, dict]]):
+        connection.execute(_CREATE_PACKAGES)
+        with connection:
+            connection.executemany(_INSERT_PACKAGE, _package_rows(records))
+        # Build the index after loading, which is much faster than maintaining it per row
+        connection.execute(_CREATE_PACKAGES_INDEX)
+        connection.execute(f"PRAGMA user_version = {cls.SCHEMA_VERSION}")
+        connection.commit()
+
+    @staticmethod
+    def _write(path, create: Callable[[sqlite3.Connection], None]):
+        """Run ``create`` on a new database that only replaces ``path`` once it succeeds."""
+        part_file = part_path(path)
+        if os.path.exists(part_file):
+            os.remove(part_file)
+
+        connection = sqlite3.connect(part_file)
+        try:
+            connection.execute("PRAGMA journal_mode = OFF")
+            connection.execute("PRAGMA synchronous = OFF")
+            create(connection)
+        except BaseException:
+            connection.close()
+            os.remove(part_file)
+            raise
+        connection.close()
+
+        os.replace(part_file, path)
+
+    @classmethod
+    def build(cls, path, records: Iterable[Tuple[str, dict]]) -> "CondaIndex":
+        """
+        Write ``records`` to a new index at ``path`` and open it.
+
+        The index is written to a ``.part`` file and only replaces ``path`` once it
+        is complete.
+        """
+        cls._write(path, lambda connection: cls._create(connection, records))
+        return cls.open(path)
+
+    @classmethod
+    def from_records(
+        cls, records: Iterable[Tuple[str, dict]], memo_size: Optional[int] = DEFAULT_MEMO_SIZE
+    ) -> "CondaIndex":
+        """Build an in-memory index from ``(filename, record)`` pairs."""
+        connection = sqlite3.connect(":memory:")
+        cls._create(connection, records)
+        return cls(connection, memo_size)
+
+    @classmethod
+    def from_repodata(
+        cls, repodata: dict, memo_size: Optional[int] = DEFAULT_MEMO_SIZE
+    ) -> "CondaIndex":
+        """Build an in-memory index from already decoded repodata."""
+        records = (
+            (filename, record)
+            for section in PACKAGE_SECTIONS
+            for filename, record in (repodata.get(section) or {}).items()
+        )
+        return cls.from_records(records, memo_size)
+
+    def _records(self, name: str) -> Tuple[List[VersionOrder], tuple, tuple]:
+        entry = self._by_name.get(name)
+        if entry is not None:
+            self._by_name.move_to_end(name)
+        else:
+            rows = self._connection.execute(
+                "SELECT filename, record FROM packages WHERE name = ?", (name,)
+            )
+            keyed = sorted(
+                (
+                    (
+                        VersionOrder(record.get("version", "")),
+                        record.get("build_number", 0),
+                        filename,
+                        record,
+                    )
+                    for filename, record in (
+                        (filename, _decode_record(record)) for filename, record in rows
+                    )
+                ),
+                key=lambda x: x[:3],
+            )
+            items = tuple((filename, record) for _, _, filename, record in keyed)
+            entry = ([key for key, _, _, _ in keyed], items, items[::-1])
+            self._remember(name, entry)
+        return entry
+
+    def _remember(self, name: str, entry):
+        if self.memo_size == 0:
+            return
+        self._by_name[name] = entry
+        if self.memo_size is not None and len(self._by_name) > self.memo_size:
+            self._by_name.popitem(last=False)
+
+    def lookup(self, name: str) -> Tuple[Tuple[str, dict], ...]:
+        """
+        Return ``(filename, record)`` for every package called ``name``.
+
+        Records are sorted newest version (then build number) first. The result
+        is shared between callers and must not be modified.
+        """
+        return self._records(name)[2]
+
+    def match(
+        self, name: str, version: Optional[str] = None, build: Optional[str] = None
+    ) -> List[Tuple[str, dict]]:
+        """
+        Return the records called ``name`` that satisfy a conda version spec and build glob.
+
+        Args:
+            name (str): Package name.
+            version (str, optional): Conda version spec, e.g. ``1.2.*`` or ``>=1.2,<2``.
+            build (str, optional): Build string, may contain ``*`` wildcards.
+
+        Returns:
+            list: ``(filename, record)`` pairs, newest version first.
+        """
+        keys, items, newest = self._records(name)
+
+        if version:
+            candidates = [items[i] for i in reversed(parse_version_spec(version).select(keys))]
+        else:
+            candidates = newest
+
+        if build:
+            return [item for item in candidates if fnmatchcase(item[1].get("build", ""), build)]
+        return list(candidates)
+
+    def close(self):
+        self._by_name.clear()
+        self._connection.close()
+
+
+class ShardedCondaIndex(CondaIndex):
+    """
+    Index for a channel that serves sharded repodata (CEP-16).
+
+    Only the shard index (package name -> shard hash) is downloaded up front.
+    The shard holding a package's records is fetched the first time that name
+    is looked up and stored in the index, so a scan only downloads the shards
+    for the packages it actually needs.
+    """
+
+    def __init__(
+        self,
+        connection: sqlite3.Connection,
+        fetch_shard: Callable[[str], Optional[list]],
+        memo_size: Optional[int] = CondaIndex.DEFAULT_MEMO_SIZE,
+    ):
+        super().__init__(connection, memo_size)
+        self._fetch_shard = fetch_shard
+        (self._shards_base_url,) = connection.execute(
+            "SELECT value FROM info WHERE key = 'shards_base_url'"
+        ).fetchone()
+
+    @classmethod
+    def open(
+        cls,
+        path,
+        fetch_shard: Callable[[str], Optional[list]],
+        memo_size: Optional[int] = CondaIndex.DEFAULT_MEMO_SIZE,
+    ) -> "ShardedCondaIndex":
+        return cls(cls._connect(path, readonly=False), fetch_shard, memo_size)
+
+    @classmethod
+    def build(
+        cls,
+        path,
+        shards: Dict[str, bytes],
+        shards_base_url: str,
+        fetch_shard: Callable[[str], Optional[list]],
+    ) -> "ShardedCondaIndex":
+        """
+        Write a new shard index to ``path`` and open it.
+
+        Records of shards that were already fetched into a previous index at
+        ``path`` are kept when their hash did not change.
+        """
+
+        def create(connection: sqlite3.Connection):
+            connection.execute(_CREATE_PACKAGES)
+            connection.execute(_CREATE_PACKAGES_INDEX)
+            connection.execute(
+                "CREATE TABLE shards (name TEXT PRIMARY KEY, sha256 BLOB NOT NULL, fetched INTEGER NOT NULL)"
+            )
+            connection.execute("CREATE TABLE info (key TEXT PRIMARY KEY, value TEXT)")
+            with connection:
+                connection.execute(
+                    "INSERT INTO info (key, value) VALUES ('shards_base_url', ?)",
+                    (shards_base_url,),
+                )
+                connection.executemany(
+                    "INSERT INTO shards (name, sha256, fetched) VALUES (?, ?, 0)", shards.items()
+                )
+
+            if os.path.exists(path):
+                cls._carry_over(connection, path)
+
+            connection.execute(f"PRAGMA user_version = {cls.SCHEMA_VERSION}")
+            connection.commit()
+
+        cls._write(path, create)
+        return cls.open(path, fetch_shard)
+
+    @staticmethod
+    def _carry_over(connection: sqlite3.Connection, previous):
+        try:
+            connection.execute("ATTACH DATABASE ? AS previous", (str(previous),))
+        except sqlite3.DatabaseError:
+            return
+        try:
+            (version,) = connection.execute("PRAGMA previous.user_version").fetchone()
+            if version != ShardedCondaIndex.SCHEMA_VERSION:
+                # Records in an older layout cannot be copied as they are
+                return
+            with connection:
+                connection.execute(
+                    "CREATE TEMP TABLE unchanged AS SELECT s.name FROM shards s "
+                    "JOIN previous.shards p ON p.name = s.name AND p.sha256 = s.sha256 "
+                    "WHERE p.fetched = 1"
+                )
+                connection.execute(
+                    "INSERT INTO packages SELECT * FROM previous.packages "
+                    "WHERE name IN (SELECT name FROM unchanged)"
+                )
+                connection.execute(
+                    "UPDATE shards SET fetched = 1 WHERE name IN (SELECT name FROM unchanged)"
+                )
+        except sqlite3.DatabaseError:
+            # Not a sharded index, so there is nothing to keep
+            pass
+        finally:
+            connection.execute("DROP TABLE IF EXISTS temp.unchanged")
+            connection.commit()
+            connection.execute("DETACH DATABASE previous")
+
+    def _records(self, name: str):
+        if name not in self._by_name:
+            self.prefetch([name])
+        return super()._records(name)
+
+    def prefetch(self, names: Iterable[str], max_workers: int = 8):
+        """Fetch the shards for ``names`` that are not stored yet, in parallel."""
+        names = list(dict.fromkeys(names))
+        pending = []
+        # Stay well below SQLite's limit on the number of bound parameters
+        for start in range(0, len(names), 500):
+            chunk = names[start : start + 500]
+            pending.extend(
+                self._connection.execute(
+                    "SELECT name, sha256 FROM shards WHERE fetched = 0 AND name IN "
+                    f"({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+            )
+        if not pending:
+            return
+
+        urls = [
+            f"{self._shards_base_url}{bytes(sha256).hex()}.msgpack.zst" for _, sha256 in pending
+        ]
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+            results = list(executor.map(self._fetch_shard, urls))
+
+        with self._connection:
+            for (name, _), records in zip(pending, results):
+                if records is None:
+                    # Leave the shard unfetched so a later run retries it
+                    continue
+                self._connection.executemany(_INSERT_PACKAGE, _package_rows(records))
+                self._connection.execute("UPDATE shards SET fetched = 1 WHERE name = ?", (name,))
@@ -0,0 +1,289 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import re
+from bisect import bisect_left, bisect_right
+from functools import lru_cache, total_ordering
+from itertools import zip_longest
+from typing import List, Sequence, Tuple
+
+# Splits a version component into runs of digits, stars and everything else
+_VERSION_SPLIT = re.compile(r"([0-9]+|[*]+|[^0-9*]+)")
+_CLAUSE = re.compile(r"^\s*(==|!=|<=|>=|~=|<|>|=)?\s*(\S*)\s*$")
+
+# Sort 'dev' before every other pre-release tag and 'post' after every number
+_DEV = "DEV"
+_POST = float("inf")
+
+
+def _parse_component(component: str) -> list:
+    parts = []
+    for part in _VERSION_SPLIT.findall(component):
+        if part.isdigit():
+            parts.append(int(part))
+        elif part == "post":
+            parts.append(_POST)
+        elif part == "dev":
+            parts.append(_DEV)
+        else:
+            parts.append(part)
+
+    # Every component starts with a number so that '1.a' sorts below '1.0'
+    # and '1.post1' equals '1.0post1'; 'post' and 'dev' are not numbers here
+    if not parts or type(parts[0]) is not int:
+        parts.insert(0, 0)
+    return parts
+
+
+def _cmp_parts(p1, p2) -> int:
+    if p1 == p2:
+        return 0
+    if isinstance(p1, str):
+        if not isinstance(p2, str):
+            # Strings (pre-releases) sort below numbers
+            return -1
+        return -1 if p1 < p2 else 1
+    if isinstance(p2, str):
+        return 1
+    return -1 if p1 < p2 else 1
+
+
+def _cmp_components(t1: Sequence[list], t2: Sequence[list]) -> int:
+    # Missing components and parts compare as zero, so '1.0' == '1.0.0'
+    for c1, c2 in zip_longest(t1, t2, fillvalue=[0]):
+        for p1, p2 in zip_longest(c1, c2, fillvalue=0):
+            result = _cmp_parts(p1, p2)
+            if result:
+                return result
+    return 0
+
+
+def _normalize(components: List[list]) -> tuple:
+    normalized = []
+    for component in components:
+        parts = list(component)
+        while parts and parts[-1] == 0:
+            parts.pop()
+        normalized.append(tuple(parts))
+    while normalized and not normalized[-1]:
+        normalized.pop()
+    return tuple(normalized)
+
+
+@total_ordering
+class VersionOrder:
+    """
+    A conda package version that compares the way conda orders versions.
+
+    Versions are split into dot-separated components made of numbers and
+    strings, with strings sorting below numbers ('1.0rc1' < '1.0'), 'dev'
+    sorting below any other string, 'post' above any number and an optional
+    'N!' epoch and '+local' suffix.
+    """
+
+    __slots__ = ("source", "version", "local", "_hash")
+
+    def __init__(self, source: str):
+        self.source = source
+        version = (source or "").strip().lower()
+
+        epoch, _, version = version.rpartition("!")
+        epoch = int(epoch) if epoch.isdigit() else 0
+
+        version, _, local = version.partition("+")
+
+        # Dashes are treated like underscores unless underscores are used too
+        if "-" in version and "_" not in version:
+            version = version.replace("-", "_")
+        if version.endswith("_"):
+            # A trailing underscore stays part of the last component, so that
+            # openssl-like '1.0.1_' sorts as a pre-release of '1.0.1', as in conda
+            version = version[:-1].replace("_", ".") + "_"
+        else:
+            version = version.replace("_", ".")
+
+        self.version = [[epoch]] + [_parse_component(c) for c in version.split(".")]
+        self.local = (
+            [_parse_component(c) for c in local.replace("_", ".").split(".")] if local else []
+        )
+        self._hash = None
+
+    def _cmp(self, other: "VersionOrder") -> int:
+        return _cmp_components(self.version, other.version) or _cmp_components(
+            self.local, other.local
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, VersionOrder):
+            return NotImplemented
+        return self._cmp(other) == 0
+
+    def __lt__(self, other):
+        if not isinstance(other, VersionOrder):
+            return NotImplemented
+        return self._cmp(other) < 0
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((_normalize(self.version), _normalize(self.local)))
+        return self._hash
+
+    def __repr__(self):
+        return f"VersionOrder({self.source!r})"
+
+    def startswith(self, prefix: "VersionOrder") -> bool:
+        """Check whether this version matches ``prefix.*``."""
+        if prefix.local:
+            if _cmp_components(self.version, prefix.version):
+                return False
+            t1, t2 = self.local, prefix.local
+        else:
+            t1, t2 = self.version, prefix.version
+
+        last = len(t2) - 1
+        if _cmp_components(t1[:last], t2[:last]):
+            return False
+
+        # Only the parts given in the last prefix component have to match
+        c1 = t1[last] if len(t1) > last else [0]
+        c2 = t2[last]
+        for index, p2 in enumerate(c2):
+            p1 = c1[index] if len(c1) > index else 0
+            if isinstance(p2, str) and index == len(c2) - 1:
+                return isinstance(p1, str) and p1.startswith(p2)
+            if _cmp_parts(p1, p2):
+                return False
+        return True
+
+
+class _Clause:
+    """A single version constraint such as ``>=1.2`` or ``1.2.*``."""
+
+    __slots__ = ("operator", "version")
+
+    def __init__(self, operator: str, version: str):
+        self.operator = operator
+        self.version = VersionOrder(version) if version else None
+
+    def match(self, version: VersionOrder) -> bool:
+        op, target = self.operator, self.version
+        if op == "*":
+            return True
+        if op == "prefix":
+            return version.startswith(target)
+        if op == "!prefix":
+            return not version.startswith(target)
+        if op == "==":
+            return version == target
+        if op == "!=":
+            return version != target
+        if op == ">=":
+            return version >= target
+        if op == ">":
+            return version > target
+        if op == "<=":
+            return version <= target
+        return version < target
+
+    def bounds(self, keys: Sequence[VersionOrder]) -> Tuple[int, int]:
+        """Return the slice of the ascending ``keys`` that can match this clause."""
+        op, target = self.operator, self.version
+        if op == "==":
+            return bisect_left(keys, target), bisect_right(keys, target)
+        if op == ">=":
+            return bisect_left(keys, target), len(keys)
+        if op == ">":
+            return bisect_right(keys, target), len(keys)
+        if op == "<=":
+            return 0, bisect_right(keys, target)
+        if op == "<":
+            return 0, bisect_left(keys, target)
+        if op == "prefix":
+            # Versions matching a prefix form one contiguous run in sorted order
+            start = bisect_left(keys, True, key=lambda k: k > target or k.startswith(target))
+            stop = bisect_left(
+                keys, True, lo=start, key=lambda k: k > target and not k.startswith(target)
+            )
+            return start, stop
+        return 0, len(keys)
+
+
+def _parse_clause(text: str) -> _Clause:
+    match = _CLAUSE.match(text)
+    operator, version = match.groups() if match else (None, text.strip())
+
+    if version in ("", "*"):
+        return _Clause("*", "")
+
+    wildcard = version.endswith("*")
+    version = version.rstrip("*").rstrip(".")
+
+    if operator == "~=":
+        # ~=1.4.2 means >=1.4.2 and 1.4.*
+        prefix = version.rpartition(".")[0] or version
+        return _Conjunction([_Clause(">=", version), _Clause("prefix", prefix)])
+    if operator == "=" or (operator in (None, "==") and wildcard):
+        return _Clause("prefix", version)
+    if operator == "!=" and wildcard:
+        return _Clause("!prefix", version)
+    return _Clause(operator or "==", version)
+
+
+class _Conjunction:
+    __slots__ = ("clauses",)
+
+    def __init__(self, clauses):
+        self.clauses = clauses
+
+    def match(self, version: VersionOrder) -> bool:
+        return all(clause.match(version) for clause in self.clauses)
+
+    def bounds(self, keys: Sequence[VersionOrder]) -> Tuple[int, int]:
+        start, stop = 0, len(keys)
+        for clause in self.clauses:
+            lo, hi = clause.bounds(keys)
+            start, stop = max(start, lo), min(stop, hi)
+        return start, stop
+
+
+class VersionSpec:
+    """
+    A conda version constraint, e.g. ``1.2.*``, ``=1.2``, ``>=1.2,<2`` or ``1.2|1.4``.
+
+    ``,`` binds tighter than ``|``. A bare version means an exact match and a
+    single ``=`` means a prefix match, as in conda's ``name=version`` syntax.
+    """
+
+    __slots__ = ("spec", "_alternatives")
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        self._alternatives = [
+            _Conjunction([_parse_clause(clause) for clause in alternative.split(",")])
+            for alternative in spec.split("|")
+        ]
+
+    def match(self, version: VersionOrder) -> bool:
+        return any(alternative.match(version) for alternative in self._alternatives)
+
+    def select(self, keys: Sequence[VersionOrder]) -> List[int]:
+        """
+        Return the indices of the ascending ``keys`` that satisfy the spec.
+
+        Range operators are resolved by binary search, so only the candidates
+        inside the matching range are tested individually.
+        """
+        selected = set()
+        for alternative in self._alternatives:
+            start, stop = alternative.bounds(keys)
+            selected.update(i for i in range(start, stop) if alternative.match(keys[i]))
+        return sorted(selected)
+
+    def __repr__(self):
+        return f"VersionSpec({self.spec!r})"
+
+
+@lru_cache(maxsize=1024)
+def parse_version_spec(spec: str) -> VersionSpec:
+    """Return a (cached) :class:`VersionSpec` for ``spec``."""
+    return VersionSpec(spec)
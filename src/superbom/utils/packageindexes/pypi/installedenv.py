@@ -0,0 +1,122 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import sys
+import threading
+from importlib.metadata import distributions
+from pathlib import Path
+from typing import Optional
+
+from packaging.specifiers import InvalidSpecifier
+
+from superbom.utils.logger import AppLogger
+from superbom.utils.packageindexes.pypi.pypicache import normalize_name
+from superbom.utils.parsers import Dependency
+
+logger = AppLogger().get_logger()
+
+
+def site_packages(path) -> list:
+    """
+    Return the directories distributions are installed into for an environment.
+
+    Args:
+        path: Root of a virtualenv or conda environment, or a site-packages
+            directory. None uses the current interpreter.
+
+    Returns:
+        list: Directories to search, in the order the interpreter would.
+    """
+    if path is None:
+        return list(sys.path)
+
+    path = Path(path).expanduser()
+    found = [
+        *sorted(path.glob("lib/python*/site-packages")),
+        *sorted(path.glob("lib64/python*/site-packages")),
+        *path.glob("Lib/site-packages"),
+    ]
+    # A site-packages directory given directly
+    return [str(directory) for directory in found] or [str(path)]
+
+
+def distribution_info(metadata) -> dict:
+    """
+    Convert core metadata of an installed distribution to the shape of the
+    ``info`` object of the PyPI JSON API, so ``pypiutils.get_license`` can use it.
+    """
+    project_urls = {}
+    for entry in metadata.get_all("Project-URL") or []:
+        label, _, url = entry.partition(",")
+        if url.strip():
+            project_urls[label.strip()] = url.strip()
+    if metadata.get("Home-page") and "Homepage" not in project_urls:
+        project_urls["Homepage"] = metadata["Home-page"]
+
+    return {
+        "name": metadata["Name"],
+        "version": metadata["Version"],
+        "license_expression": metadata.get("License-Expression"),
+        "license": metadata.get("License"),
+        "classifiers": metadata.get_all("Classifier") or [],
+        "project_urls": project_urls,
+    }
+
+
+class InstalledEnvironment:
+    """
+    Python package metadata read from the distributions installed in an
+    environment, without any network access.
+
+    Example:
+        environment = InstalledEnvironment("/path/to/venv")
+        environment.get("requests")
+    """
+
+    def __init__(self, path=None):
+        # None reads the environment of the current interpreter
+        self.path = path
+        self._metadata: Optional[dict] = None
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return Path(self.path).name if self.path else Path(sys.prefix).name
+
+    def _load(self) -> dict:
+        # Lookups run from several threads, the distributions are read only once
+        with self._lock:
+            if self._metadata is None:
+                metadata = {}
+                for distribution in distributions(path=site_packages(self.path)):
+                    core = distribution.metadata
+                    # Broken installs without a name or version are skipped
+                    if not core.get("Name") or not core.get("Version"):
+                        continue
+                    info = distribution_info(core)
+                    # Like the interpreter, the first distribution on the path wins
+                    metadata.setdefault(normalize_name(info["name"]), info)
+                logger.debug(f"Found {len(metadata)} installed distributions in {self.name}")
+                self._metadata = metadata
+            return self._metadata
+
+    def get(self, name: str) -> Optional[dict]:
+        """Return the metadata of an installed distribution, or None if it is not installed."""
+        return self._load().get(normalize_name(name))
+
+    def packages(self) -> list:
+        """Return every installed distribution as a dependency pinned to its installed version."""
+        return [self._pinned(info) for _, info in sorted(self._load().items())]
+
+    @staticmethod
+    def _pinned(info) -> Dependency:
+        try:
+            return Dependency.create_dependency(info["name"], f"=={info['version']}")
+        except InvalidSpecifier:
+            pass
+        # Not PEP 440 compliant (e.g. 1.2.3-SNAPSHOT), so compare it as a plain string
+        logger.warning(f"Installed {info['name']} has a non-standard version {info['version']}")
+        try:
+            return Dependency.create_dependency(info["name"], f"==={info['version']}")
+        except InvalidSpecifier:
+            return Dependency.create_dependency(info["name"])
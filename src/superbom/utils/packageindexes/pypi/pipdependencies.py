@@ -1,29 +1,125 @@
 # Copyright (C) 2024 Intel Corporation
 # SPDX-License-Identifier: Apache 2.0
 
-import requests
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from packaging.specifiers import SpecifierSet
+from packaging.version import InvalidVersion
+from tqdm import tqdm
 
 import superbom.utils.packageindexes.pypi.pypiutils as pypiutils
-from superbom.utils import githubutils
+from superbom.utils import githubutils, httpclient, negativecache
 from superbom.utils.logger import AppLogger
+from superbom.utils.packageindexes.pypi.installedenv import InstalledEnvironment
+from superbom.utils.packageindexes.pypi.pypicache import PyPICache, normalize_name
+from superbom.utils.packageindexes.pypi.pypisnapshot import PyPISnapshot
 
 
 class PyPIPackageUtil:
-    def __init__(self):
+    # Number of packages resolved concurrently by get_pip_packages_data
+    DEFAULT_JOBS = 8
+
+    def __init__(
+        self,
+        cache: Optional[PyPICache] = None,
+        environment: Optional[InstalledEnvironment] = None,
+        snapshot: Optional[PyPISnapshot] = None,
+    ):
         self.logger = AppLogger().get_logger()
+        # Without a cache every lookup goes to PyPI
+        self._cache = cache
+        # Installed distributions are used before anything is looked up on PyPI
+        self._environment = environment
+        # Then releases in the offline snapshot
+        self._snapshot = snapshot
+        # (metadata, source, GitHub repository) looked up ahead by get_pip_packages_data
+        self._resolved = {}
+
+    @staticmethod
+    def _key(package) -> tuple:
+        return package.name, str(getattr(package, "constraint", ""))
+
+    def _resolve_metadata(self, package) -> tuple:
+        """Return the metadata of a package and where it came from."""
+        if self._environment is not None:
+            metadata = self._environment.get(package.name)
+            if metadata and self._satisfies(metadata["version"], package):
+                return metadata, "installed"
+        return self._getpypimetadata(package), "pypi"
+
+    @staticmethod
+    def _satisfies(version, package) -> bool:
+        """Whether an installed version meets the constraint of ``package``."""
+        constraint = getattr(package, "constraint", None)
+        if not isinstance(constraint, SpecifierSet) or not constraint:
+            return True
+        try:
+            # An installed pre-release still counts when it is in range
+            return constraint.contains(version, prereleases=True)
+        except InvalidVersion:
+            return False
+
+    def _prefetch(self, package) -> Optional[str]:
+        """Look up the metadata of a package and return the GitHub repository its license needs."""
+        if package.name == "python":
+            return None
+        metadata, source = self._resolve_metadata(package)
+        if metadata:
+            repository = pypiutils.github_source(metadata)
+        else:
+            repository = githubutils.find_repository(package.name)
+        self._resolved[self._key(package)] = (metadata, source, repository)
+        return repository
 
     def _getpypimetadata(self, package):
         package_data = None
 
-        # Download package metadata from pypi
-        url = f"https://pypi.org/pypi/{package.name}/json"
+        constraint = getattr(package, "constraint", None)
+        if self._snapshot is not None:
+            package_data = self._snapshot.resolve(package.name, constraint)
+            if package_data:
+                return package_data
+
+        if negativecache.is_missing(negativecache.NOT_ON_PYPI, normalize_name(package.name)):
+            return None
+
+        # Metadata of the release that satisfies the constraint, which is much
+        # smaller than the project level JSON with its full releases map
+        version = pypiutils.pinned_version(constraint)
+        if not version:
+            version = pypiutils.best_version(self._getpypiversions(package.name), constraint)
+        if version:
+            package_data = self._fetchpypimetadata(package.name, version)
+
+        # Fall back to the latest release when no release could be resolved
+        return package_data or self._fetchpypimetadata(package.name)
+
+    def _getpypiversions(self, name):
+        if self._cache is not None:
+            return self._cache.versions(name)
 
-        response = requests.get(url)
+        response = httpclient.get(
+            PyPICache.simple_url(name), headers={"Accept": PyPICache.SIMPLE_ACCEPT}
+        )
         if response.status_code == 200:
-            tmp = response.json()
-            package_data = tmp["info"]
+            return response.json().get("versions")
+        if response.status_code == 404:
+            negativecache.record_missing(negativecache.NOT_ON_PYPI, normalize_name(name))
+        return None
 
-        return package_data
+    def _fetchpypimetadata(self, name, version=None):
+        if self._cache is not None:
+            return self._cache.get(name, version)
+
+        # Download package metadata from pypi
+        response = httpclient.get(PyPICache.url(name, version))
+        if response.status_code == 200:
+            return response.json()["info"]
+        if response.status_code == 404 and not version:
+            negativecache.record_missing(negativecache.NOT_ON_PYPI, normalize_name(name))
+        return None
 
     def get_pip_package_data(self, package) -> dict:
         package_data = {}
@@ -32,13 +128,16 @@ class PyPIPackageUtil:
         if package.name == "python":
             return package_data
 
-        metadata = self._getpypimetadata(package)
+        resolved = self._resolved.pop(self._key(package), None)
+        if resolved:
+            metadata, source, repository = resolved
+        else:
+            (metadata, source), repository = self._resolve_metadata(package), None
 
         if metadata:
             name = metadata.get("name", "N/A")
             version = metadata.get("version", "N/A")
             validated, license = pypiutils.get_license(metadata)
-            source = "pypi"
 
             package_data = {
                 "Package": name,
@@ -54,7 +153,7 @@ class PyPIPackageUtil:
         else:
             # try to get license from github
             self.logger.warning(f"Package: {package.name} not found on PyPI")
-            validated, license = githubutils.get_license(package.name)
+            validated, license = githubutils.get_license(repository or package.name)
             version = "N/A"
             source = "github"
             package_data = {
@@ -66,3 +165,63 @@ class PyPIPackageUtil:
             }
 
         return package_data
+
+    def get_pip_packages_data(self, packages, jobs: int = DEFAULT_JOBS) -> list:
+        """
+        Resolve many packages concurrently.
+
+        Lookups run on a pool of ``jobs`` threads so the blocking HTTP calls
+        overlap. The metadata
+        of every package is looked up first, so the licenses of all the GitHub
+        repositories they point to can be fetched in a few batched requests.
+
+        Args:
+            packages (list): Packages to resolve.
+            jobs (int): Maximum number of concurrent lookups.
+
+        Returns:
+            list: The package data for every package, in input order (None for
+            packages whose lookup failed).
+        """
+        packages = list(packages)
+        if not packages:
+            return []
+        jobs = max(1, jobs)
+
+        try:
+            # Failures are logged again when the package data is built
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                # Failures are logged again when the package data is built
+                repositories = self._resolve_all(
+                    executor, packages, self._prefetch, "Fetching metadata", logging.DEBUG
+                )
+                githubutils.prefetch_licenses(
+                    repository for repository in repositories if repository
+                )
+                return self._resolve_all(executor, packages, self.get_pip_package_data)
+        finally:
+            self._resolved.clear()
+
+    def _resolve_all(
+        self, executor, packages, func, desc="Processing items", error_level=logging.ERROR
+    ) -> list:
+        progress = tqdm(
+            total=len(packages),
+            desc=desc,
+            unit="item",
+            disable=self.logger.level > logging.INFO,
+        )
+
+        def resolve(package):
+            try:
+                return func(package)
+            except Exception as e:
+                self.logger.log(error_level, f"Error processing item {package}: {e}")
+                return None
+            finally:
+                progress.update(1)
+
+        try:
+            return list(executor.map(resolve, packages))
+        finally:
+            progress.close()
@@ -0,0 +1,184 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import json
+import re
+import time
+import zlib
+from typing import Optional
+
+from superbom.utils import httpclient, negativecache
+from superbom.utils.logger import AppLogger
+from superbom.utils.sqlitestore import SQLiteStore, cache_root
+
+logger = AppLogger().get_logger()
+
+_CREATE_METADATA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    info BLOB NOT NULL,
+    PRIMARY KEY (name, version)
+)
+"""
+
+# The release list of a project is stored as a metadata row with this version
+_VERSIONS = "/versions"
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a project name as PyPI does (PEP 503)."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class PyPICache(SQLiteStore):
+    """
+    Persistent store of PyPI project metadata (the ``info`` of the JSON API).
+
+    Entries are keyed by normalized project name and version. Metadata of an
+    exact release (``/pypi/{name}/{version}/json``) never changes once
+    published and is reused indefinitely. Project level metadata
+    (``/pypi/{name}/json``, i.e. the latest release) is reused for ``max_age``
+    seconds and then revalidated with its ETag/Last-Modified, so an unchanged
+    project costs a single 304 round-trip. The release list of each project,
+    used to pick the release that satisfies a constraint, is revalidated the
+    same way.
+
+    The store is a SQLite database in ``<cache_dir>/pypi/metadata.sqlite``,
+    next to the conda cache, and can be shared by threads and processes.
+    """
+
+    PYPI_URL = "https://pypi.org/pypi"
+    SIMPLE_URL = "https://pypi.org/simple"
+    SIMPLE_ACCEPT = "application/vnd.pypi.simple.v1+json"
+
+    # Project level metadata younger than this (in seconds) is used without revalidation
+    DEFAULT_MAX_AGE = 24 * 60 * 60
+
+    def __init__(self, cache_dir=None, max_age: Optional[float] = DEFAULT_MAX_AGE, refresh=False):
+        super().__init__(cache_root(cache_dir) / "pypi" / "metadata.sqlite", _CREATE_METADATA)
+        # max_age of None means project level metadata never expires
+        self.max_age = max_age
+        # refresh revalidates every entry once per process, pinned releases included
+        self.refresh = refresh
+        self._refreshed = set()
+
+    def _read(self, name: str, version: str) -> Optional[tuple]:
+        return self._fetchone(
+            "SELECT etag, last_modified, fetched_at, info FROM metadata WHERE name = ? AND version = ?",
+            (name, version),
+        )
+
+    def _write(self, name: str, version: str, etag, last_modified, value):
+        data = zlib.compress(json.dumps(value, separators=(",", ":")).encode())
+        self._execute(
+            "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?)",
+            (name, version, etag, last_modified, time.time(), data),
+        )
+
+    def _touch(self, name: str, version: str):
+        self._execute(
+            "UPDATE metadata SET fetched_at = ? WHERE name = ? AND version = ?",
+            (time.time(), name, version),
+        )
+
+    @classmethod
+    def url(cls, name: str, version: Optional[str] = None) -> str:
+        if version:
+            return f"{cls.PYPI_URL}/{name}/{version}/json"
+        return f"{cls.PYPI_URL}/{name}/json"
+
+    @classmethod
+    def simple_url(cls, name: str) -> str:
+        return f"{cls.SIMPLE_URL}/{normalize_name(name)}/"
+
+    def get(self, name: str, version: Optional[str] = None) -> Optional[dict]:
+        """
+        Return the metadata of a project, or of one of its releases.
+
+        Args:
+            name (str): Project name.
+            version (str, optional): Exact release; the latest release when omitted.
+
+        Returns:
+            dict: The ``info`` object of the PyPI JSON API, or None if it is not available.
+        """
+        return self._lookup(
+            name,
+            version or "",
+            self.url(name, version),
+            {},
+            lambda response: response.json()["info"],
+            immutable=bool(version),
+        )
+
+    def versions(self, name: str) -> Optional[list]:
+        """
+        Return every version published for a project.
+
+        The list comes from the Simple JSON API (PEP 691/700), which is much
+        smaller than the project level JSON, and is revalidated like unpinned
+        metadata.
+
+        Returns:
+            list: Version strings, or None if the project is not available.
+        """
+        return self._lookup(
+            name,
+            _VERSIONS,
+            self.simple_url(name),
+            {"Accept": self.SIMPLE_ACCEPT},
+            lambda response: response.json()["versions"],
+            immutable=False,
+        )
+
+    def _lookup(self, name: str, version: str, url: str, headers: dict, extract, immutable: bool):
+        key = (normalize_name(name), version)
+        row = self._read(*key)
+
+        force = self.refresh and key not in self._refreshed
+        if force:
+            self._refreshed.add(key)
+
+        if row and not force:
+            etag, last_modified, fetched_at, data = row
+            if immutable or self.max_age is None or time.time() - fetched_at < self.max_age:
+                return json.loads(zlib.decompress(data))
+
+            headers = dict(headers)
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        response = httpclient.get(url, headers=headers)
+
+        if response.status_code == 304 and row:
+            self._touch(*key)
+            return json.loads(zlib.decompress(row[3]))
+
+        if response.status_code == 200:
+            data = extract(response)
+            self._write(
+                *key,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                data,
+            )
+            return data
+
+        if response.status_code == 404 and version in ("", _VERSIONS):
+            negativecache.record_missing(negativecache.NOT_ON_PYPI, key[0])
+
+        logger.debug(f"Failed to fetch {url}: {response.status_code}")
+        # Serve stale data rather than nothing when PyPI cannot be reached
+        return json.loads(zlib.decompress(row[3])) if row else None
+
+    def items(self):
+        """Yield the metadata of every cached release and project."""
+        rows = self._fetchall("SELECT info FROM metadata WHERE version != ?", (_VERSIONS,))
+        for (data,) in rows:
+            yield json.loads(zlib.decompress(data))
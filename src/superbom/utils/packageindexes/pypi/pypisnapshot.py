@@ -0,0 +1,248 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import json
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from packaging.specifiers import SpecifierSet
+
+import superbom.utils.packageindexes.pypi.pypiutils as pypiutils
+from superbom.utils.filelock import part_path
+from superbom.utils.logger import AppLogger
+from superbom.utils.packageindexes.pypi.pypicache import normalize_name
+from superbom.utils.sqlitestore import cache_root
+
+logger = AppLogger().get_logger()
+
+# magic, format version, record count, index offset, creation time
+_HEADER = struct.Struct("<8sIIQd")
+# key offset, key length, data offset, data length
+_ENTRY = struct.Struct("<QIQI")
+
+# Fields of the PyPI ``info`` object that pypiutils.get_license reads
+SNAPSHOT_FIELDS = (
+    "name",
+    "version",
+    "license_expression",
+    "license",
+    "classifiers",
+    "project_urls",
+)
+
+
+def _key(name: str, version: str) -> bytes:
+    # NUL sorts before every other character, so all versions of a name are contiguous
+    return f"{normalize_name(name)}\0{version}".encode()
+
+
+def snapshot_info(info: dict) -> dict:
+    """Keep only the license related parts of a PyPI ``info`` object."""
+    return {
+        "name": info.get("name"),
+        "version": info.get("version"),
+        "license_expression": info.get("license_expression"),
+        "license": info.get("license"),
+        "classifiers": [c for c in info.get("classifiers") or [] if "License" in c],
+        "project_urls": {
+            label: url
+            for label, url in (info.get("project_urls") or {}).items()
+            if pypiutils._normalize_label(label) in pypiutils.sourcename_map
+        },
+    }
+
+
+def read_dump(path) -> Iterable[dict]:
+    """
+    Read a metadata dump: one PyPI JSON API document (or its ``info`` object) per line.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                document = json.loads(line)
+                yield document.get("info", document)
+
+
+def write_snapshot(path, infos: Iterable[dict]) -> int:
+    """
+    Write a snapshot of PyPI metadata.
+
+    The file holds the records, followed by an index of ``name\\0version``
+    keys sorted bytewise, so lookups are a binary search over a memory-mapped
+    file. Each name also gets a ``name\\0`` key for its latest release.
+
+    Args:
+        path: File to write; it is replaced atomically.
+        infos (Iterable[dict]): PyPI ``info`` objects; later duplicates win.
+
+    Returns:
+        int: Number of releases in the snapshot.
+    """
+    releases = {}
+    for info in infos:
+        if info and info.get("name") and info.get("version"):
+            releases[(normalize_name(info["name"]), info["version"])] = snapshot_info(info)
+
+    by_name = {}
+    for name, version in releases:
+        by_name.setdefault(name, []).append(version)
+
+    records = bytearray()
+    entries = []
+    for (name, version), info in releases.items():
+        data = json.dumps(info, separators=(",", ":")).encode()
+        entries.append((_key(name, version), _HEADER.size + len(records), len(data)))
+        records += data
+
+    # Latest releases point at the record of that version
+    offsets = {key: (offset, length) for key, offset, length in entries}
+    for name, versions in by_name.items():
+        latest = pypiutils.best_version(versions, SpecifierSet()) or versions[-1]
+        entries.append((_key(name, ""), *offsets[_key(name, latest)]))
+    entries.sort()
+
+    keys = bytearray()
+    keys_offset = _HEADER.size + len(records)
+    index = bytearray()
+    for key, offset, length in entries:
+        index += _ENTRY.pack(keys_offset + len(keys), len(key), offset, length)
+        keys += key
+
+    path = Path(path)
+    os.makedirs(path.parent, exist_ok=True)
+    tmp = part_path(path)
+    with open(tmp, "wb") as f:
+        f.write(
+            _HEADER.pack(
+                PyPISnapshot.MAGIC,
+                PyPISnapshot.FORMAT_VERSION,
+                len(entries),
+                keys_offset + len(keys),
+                time.time(),
+            )
+        )
+        f.write(records)
+        f.write(keys)
+        f.write(index)
+    os.replace(tmp, path)
+    return len(releases)
+
+
+class PyPISnapshot:
+    """
+    Read-only snapshot of PyPI license metadata for offline scans.
+
+    Lookups binary search a memory-mapped file, so they cost O(log n) page
+    reads and opening a snapshot of any size is instant.
+
+    Example:
+        with PyPISnapshot("pypi.snapshot") as snapshot:
+            snapshot.get("requests", "2.31.0")
+    """
+
+    MAGIC = b"SBOMPYPI"
+    FORMAT_VERSION = 1
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            (
+                magic,
+                format_version,
+                self._count,
+                self._index_offset,
+                self.created,
+            ) = _HEADER.unpack_from(self._mmap, 0)
+        except struct.error:
+            magic = format_version = None
+        if magic != self.MAGIC or format_version != self.FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{self.path} is not a version {self.FORMAT_VERSION} PyPI snapshot")
+
+    @staticmethod
+    def default_path(cache_dir=None) -> Path:
+        """Return where ``superbom snapshot import`` installs the snapshot used by scans."""
+        return cache_root(cache_dir) / "pypi" / "snapshot.bin"
+
+    @classmethod
+    def open_default(cls, cache_dir=None) -> Optional["PyPISnapshot"]:
+        """Open the imported snapshot, or return None if there is none."""
+        path = cls.default_path(cache_dir)
+        if not path.exists():
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring PyPI snapshot {path}: {e}")
+            return None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, i: int) -> tuple:
+        return _ENTRY.unpack_from(self._mmap, self._index_offset + i * _ENTRY.size)
+
+    def _key_at(self, i: int) -> bytes:
+        key_offset, key_length, _, _ = self._entry(i)
+        return self._mmap[key_offset : key_offset + key_length]
+
+    def _lower_bound(self, key: bytes) -> int:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, name: str, version: Optional[str] = None) -> Optional[dict]:
+        """
+        Return the metadata of a release, or of the latest release when ``version`` is omitted.
+
+        Returns:
+            dict: A PyPI ``info`` object with the license related fields, or None.
+        """
+        key = _key(name, version or "")
+        i = self._lower_bound(key)
+        if i == self._count or self._key_at(i) != key:
+            return None
+        _, _, data_offset, data_length = self._entry(i)
+        return json.loads(self._mmap[data_offset : data_offset + data_length])
+
+    def versions(self, name: str) -> Optional[list]:
+        """Return the versions of a project in the snapshot, or None if it is not in it."""
+        prefix = _key(name, "")
+        versions = []
+        i = self._lower_bound(prefix)
+        while i < self._count:
+            key = self._key_at(i)
+            if not key.startswith(prefix):
+                break
+            if key != prefix:
+                versions.append(key[len(prefix) :].decode())
+            i += 1
+        return versions or None
+
+    def resolve(self, name: str, constraint=None) -> Optional[dict]:
+        """Return the metadata of the newest release in the snapshot that satisfies ``constraint``."""
+        version = pypiutils.pinned_version(constraint) or pypiutils.best_version(
+            self.versions(name), constraint
+        )
+        return self.get(name, version) if version else None
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
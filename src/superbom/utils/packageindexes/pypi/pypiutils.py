@@ -2,6 +2,10 @@
 # SPDX-License-Identifier: Apache 2.0
 
 import string
+from typing import Optional
+
+from packaging.specifiers import SpecifierSet
+from packaging.version import InvalidVersion, Version
 
 import superbom.utils.githubutils as githubutils
 from superbom.utils.licenseutils import checklicense
@@ -44,8 +48,7 @@ def _normalize_label(label: str) -> str:
     return label.translate(removal_map).lower()
 
 
-def _get_license_from_source(metadata):
-
+def _source_url(metadata) -> Optional[str]:
     if metadata.get("project_urls"):
         project_urls = metadata.get("project_urls")
 
@@ -53,12 +56,36 @@ def _get_license_from_source(metadata):
         for key in project_urls.keys():
             normalized_label = _normalize_label(key)
             if normalized_label in sourcename_map:
-                source_url = project_urls[key].strip("/")
-                return githubutils.get_license(source_url)
+                return project_urls[key].strip("/")
+
+    return None
+
+
+def _get_license_from_source(metadata):
+    source_url = _source_url(metadata)
+    if source_url is not None:
+        return githubutils.get_license(source_url)
 
     return None, False
 
 
+def github_source(metadata) -> Optional[str]:
+    """
+    Return the GitHub repository ``get_license`` would look the license up in.
+
+    Returns None when the metadata or classifiers already give a valid license,
+    or when the source URL is not on GitHub.
+    """
+    if not metadata:
+        return None
+    for check_func in (_get_license_from_metadata, _get_license_from_classifiers):
+        valid, _ = check_func(metadata)
+        if valid:
+            return None
+    source_url = _source_url(metadata)
+    return source_url if source_url and "github.com" in source_url else None
+
+
 def get_license(metadata):
 
     license_checks = [
@@ -80,3 +107,50 @@ def get_license(metadata):
 
     # arbitrarily return the last invalid license found
     return False, results[-1] if results else "NOASSERTION"
+
+
+def pinned_version(constraint) -> Optional[str]:
+    """
+    Return the version an exact pin (``==1.2.3`` or ``===1.2.3``) refers to.
+
+    Returns None for anything else, including wildcard pins such as ``==1.2.*``.
+    """
+    if not isinstance(constraint, SpecifierSet):
+        return None
+
+    specifiers = list(constraint)
+    if len(specifiers) != 1:
+        return None
+
+    specifier = specifiers[0]
+    if specifier.operator in ("==", "===") and "*" not in specifier.version:
+        return specifier.version
+    return None
+
+
+def best_version(versions, constraint) -> Optional[str]:
+    """
+    Return the newest of ``versions`` that satisfies ``constraint``.
+
+    Pre-releases are only chosen when the constraint asks for one or nothing
+    else matches, as pip does. Versions that are not PEP 440 compliant are
+    ignored.
+
+    Args:
+        versions (list): Version strings as published on PyPI.
+        constraint (SpecifierSet): Constraint to satisfy; anything else matches every version.
+
+    Returns:
+        str: The matching version as published, or None if no version matches.
+    """
+    specifier = constraint if isinstance(constraint, SpecifierSet) else SpecifierSet()
+
+    published = {}
+    for version in versions or []:
+        try:
+            published[Version(version)] = version
+        except InvalidVersion:
+            continue
+
+    candidates = list(specifier.filter(published))
+    return published[max(candidates)] if candidates else None
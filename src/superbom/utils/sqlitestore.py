@@ -0,0 +1,66 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+def cache_root(cache_dir=None) -> Path:
+    """Return the cache directory, ``~/.cbomcache`` unless one is given."""
+    return Path(cache_dir) if cache_dir else Path.joinpath(Path.home(), ".cbomcache")
+
+
+class SQLiteStore:
+    """
+    Base class of the SQLite databases kept in the cache directory.
+
+    The database is created with ``schema`` on first use. A single connection
+    is shared by the threads of a process and guarded by ``_lock``; WAL lets
+    concurrent scans read while another one writes.
+
+    Example:
+        class Store(SQLiteStore):
+            def __init__(self, cache_dir=None):
+                super().__init__(cache_root(cache_dir) / "store" / "store.sqlite", SCHEMA)
+    """
+
+    def __init__(self, path, schema: str):
+        self.path = Path(path)
+        self._schema = schema
+        # Reentrant, so subclasses can hold it around their own state and queries
+        self._lock = threading.RLock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(self.path.parent, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute(self._schema)
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _fetchone(self, sql: str, parameters=()) -> Optional[tuple]:
+        with self._lock:
+            return self._connect().execute(sql, parameters).fetchone()
+
+    def _fetchall(self, sql: str, parameters=()) -> list:
+        with self._lock:
+            return self._connect().execute(sql, parameters).fetchall()
+
+    def _execute(self, sql: str, parameters=()):
+        """Run a statement that writes, in its own transaction."""
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(sql, parameters)
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,27 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+
+def response(status_code, json=None, **headers):
+    """Return a mock HTTP response with a JSON body and the given headers."""
+    mock = MagicMock(status_code=status_code, headers=headers)
+    mock.json.return_value = json
+    return mock
+
+
+class CacheTestCase(unittest.TestCase):
+    """Base of the tests of the SQLite caches, kept in a temporary ``self.cache_dir``."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = tmp.name
+
+    def open_store(self, store):
+        """Close ``store`` once the test is done."""
+        self.addCleanup(store.close)
+        return store
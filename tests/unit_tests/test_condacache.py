@@ -1,49 +1,141 @@
 # Copyright (C) 2024 Intel Corporation
 # SPDX-License-Identifier: Apache 2.0
 
+import bz2
+import errno
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+import requests
+
+try:
+    import msgpack
+    import zstandard
+except ImportError:  # pragma: no cover
+    msgpack = zstandard = None
+
 from superbom.utils.packageindexes.conda.condacache import CondaCache
+from superbom.utils.packageindexes.conda.condaindex import RECORD_FIELDS, CondaIndex
+
+FIELDS = list(RECORD_FIELDS)
+
+REPODATA = {
+    "info": {"subdir": "noarch"},
+    "packages": {
+        "numpy-1.0-0.tar.bz2": {"name": "numpy", "version": "1.0", "license": "BSD-3-Clause"},
+        "scipy-1.2-0.tar.bz2": {"name": "scipy", "version": "1.2", "license": "BSD-3-Clause"},
+    },
+    "packages.conda": {
+        "numpy-1.1-0.conda": {"name": "numpy", "version": "1.1", "license": "BSD-3-Clause"},
+    },
+}
+
+
+def _write_repodata(repodata, etag=None):
+    """Build a download_json stand-in that writes ``repodata`` to the requested file."""
+
+    def download(channel, platform, cache_file, headers=None, progress=None, compression="bz2"):
+        with open(cache_file, "w") as f:
+            json.dump(repodata, f)
+        return {"etag": etag, "last_modified": None}
+
+    return download
 
 
 class TestCondaCache(unittest.TestCase):
     def setUp(self):
         self.cache = CondaCache()
 
-    @patch("superbom.utils.packageindexes.conda.condacache.requests.get")
-    @patch("bz2.decompress")
-    def test_download_json_success(self, mock_decompress, mock_get):
+    @patch("superbom.utils.httpclient.get")
+    def test_download_json_success(self, mock_get):
+        payload = bz2.compress(b'{"key": "value"}')
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.headers = {"content-length": "100"}
-        mock_response.iter_content = MagicMock(return_value=[b"data"])
+        mock_response.headers = {"content-length": str(len(payload))}
+        # Deliver the compressed body in small chunks to exercise streaming
+        mock_response.iter_content = MagicMock(
+            return_value=[payload[i : i + 7] for i in range(0, len(payload), 7)]
+        )
         mock_get.return_value = mock_response
 
-        mock_decompress.return_value = b'{"key": "value"}'
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_file = os.path.join(tmpdir, "conda-forge_noarch.json")
+            result = self.cache.download_json("conda-forge", "noarch", cache_file)
 
-        result = self.cache.download_json("conda-forge", "noarch")
-        self.assertIsNotNone(result)
+            self.assertTrue(result)
+            with open(cache_file, "rb") as f:
+                self.assertEqual(f.read(), b'{"key": "value"}')
+            self.assertEqual(os.listdir(tmpdir), ["conda-forge_noarch.json"])
 
-    @patch("superbom.utils.packageindexes.conda.condacache.requests.get")
+    @patch("superbom.utils.httpclient.get")
+    def test_download_json_truncated(self, mock_get):
+        payload = bz2.compress(b'{"key": "value"}')
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {}
+        mock_response.iter_content = MagicMock(return_value=[payload[:-4]])
+        mock_get.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_file = os.path.join(tmpdir, "conda-forge_noarch.json")
+            result = self.cache.download_json("conda-forge", "noarch", cache_file)
+
+            self.assertFalse(result)
+            self.assertEqual(os.listdir(tmpdir), [])
+
+    @patch("superbom.utils.httpclient.get")
     def test_download_json_failure(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 404
         mock_get.return_value = mock_response
 
-        result = self.cache.download_json("conda-forge", "noarch")
-        self.assertIsNone(result)
+        result = self.cache.download_json("conda-forge", "noarch", "unused.json")
+        self.assertFalse(result)
 
-    @patch("superbom.utils.packageindexes.conda.condacache.os.path.exists")
-    @patch("superbom.utils.packageindexes.conda.condacache.json.load")
-    @patch("builtins.open", new_callable=unittest.mock.mock_open, read_data='{"key": "value"}')
-    def test_get_cached_data(self, mock_open, mock_json_load, mock_path_exists):
-        mock_path_exists.return_value = True
-        mock_json_load.return_value = {"key": "value"}
+    @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.is_fresh")
+    def test_get_cached_data(self, mock_is_fresh):
+        mock_is_fresh.return_value = True
 
-        result = self.cache.get_cached_data("conda-forge", "noarch")
-        self.assertEqual(result, {"key": "value"})
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = CondaCache(cache_dir=tmpdir)
+            CondaIndex.build(
+                os.path.join(tmpdir, "conda-forge_noarch.sqlite"),
+                [("numpy-1.0-0.tar.bz2", {"name": "numpy", "version": "1.0"})],
+            ).close()
+
+            index = cache.get_cached_data("conda-forge", "noarch")
+            self.assertEqual(
+                index.lookup("numpy"),
+                (("numpy-1.0-0.tar.bz2", {"name": "numpy", "version": "1.0"}),),
+            )
+            index.close()
+
+    @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.download_json")
+    def test_get_cached_data_rebuilds_unreadable_index(self, mock_download_json):
+        mock_download_json.side_effect = _write_repodata(
+            {"packages": {"numpy-1.0-0.tar.bz2": {"name": "numpy", "version": "1.0"}}}
+        )
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = CondaCache(cache_dir=tmpdir, max_age=None, formats=["bz2"])
+            Path(tmpdir, "conda-forge_noarch.sqlite").write_text("not a database")
+            cache.write_metadata(
+                "conda-forge", "noarch", {"fetched_at": time.time(), "fields": FIELDS}
+            )
+
+            index = cache.get_cached_data("conda-forge", "noarch")
+            self.assertEqual(len(index.lookup("numpy")), 1)
+            index.close()
+            mock_download_json.assert_called_once()
 
     @patch("superbom.utils.packageindexes.conda.condacache.os.path.exists")
     @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.cache_data")
@@ -54,17 +146,167 @@ class TestCondaCache(unittest.TestCase):
         result = self.cache.get_cached_data("conda-forge", "noarch")
         self.assertIsNone(result)
 
-    @patch("superbom.utils.packageindexes.conda.condacache.os.path.exists")
-    @patch("superbom.utils.packageindexes.conda.condacache.os.makedirs")
-    @patch("builtins.open", new_callable=unittest.mock.mock_open)
     @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.download_json")
-    def test_cache_data(self, mock_download_json, mock_open, mock_makedirs, mock_path_exists):
-        mock_path_exists.side_effect = [False, False]
-        mock_download_json.return_value = b'{"key": "value"}'
+    def test_cache_data(self, mock_download_json):
+        mock_download_json.side_effect = _write_repodata(
+            {
+                "info": {"subdir": "noarch"},
+                "packages": {"numpy-1.0-0.tar.bz2": {"name": "numpy", "version": "1.0"}},
+                "packages.conda": {"numpy-1.1-0.conda": {"name": "numpy", "version": "1.1"}},
+            },
+            etag='"abc"',
+        )
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = CondaCache(cache_dir=tmpdir, formats=["bz2"])
+            self.assertTrue(cache.cache_data("conda-forge", "noarch"))
+
+            repodata_path_str = os.path.join(tmpdir, "conda-forge_noarch.json")
+            mock_download_json.assert_called_once_with(
+                "conda-forge", "noarch", repodata_path_str, {}, None, "bz2"
+            )
+            self.assertEqual(cache.read_metadata("conda-forge", "noarch")["etag"], '"abc"')
+
+            # The raw repodata is replaced by the index
+            self.assertFalse(os.path.exists(repodata_path_str))
+            index = CondaIndex.open(os.path.join(tmpdir, "conda-forge_noarch.sqlite"))
+            self.assertEqual(len(index.lookup("numpy")), 2)
+            index.close()
+
+    @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.download_json")
+    def test_cache_data_projects_fields(self, mock_download_json):
+        record = {
+            "name": "numpy",
+            "version": "1.0",
+            "build": "py_0",
+            "license": "BSD-3-Clause",
+            "depends": ["python >=3.9"],
+            "md5": "0" * 32,
+            "size": 1024,
+        }
+        mock_download_json.side_effect = _write_repodata(
+            {"packages": {"numpy-1.0-py_0.tar.bz2": record}}
+        )
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = CondaCache(cache_dir=tmpdir, formats=["bz2"])
+            index = cache.get_cache("conda-forge", "noarch")
+            self.assertEqual(
+                index.lookup("numpy")[0][1],
+                {"name": "numpy", "version": "1.0", "build": "py_0", "license": "BSD-3-Clause"},
+            )
+            self.assertEqual(cache.read_metadata("conda-forge", "noarch")["fields"], FIELDS)
+
+            # Another field set cannot reuse the entry, so it is downloaded in full
+            cache = CondaCache(cache_dir=tmpdir, formats=["bz2"], fields=None)
+            self.assertFalse(cache.is_fresh("conda-forge", "noarch"))
+            index = cache.get_cache("conda-forge", "noarch")
+            self.assertEqual(index.lookup("numpy")[0][1], record)
+            self.assertEqual(mock_download_json.call_args[0][3], {})
+
+    @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.download_json")
+    def test_cache_data_invalid_repodata(self, mock_download_json):
+        def download(
+            channel, platform, cache_file, headers=None, progress=None, compression="bz2"
+        ):
+            Path(cache_file).write_text('{"packages": {"numpy')
+            return {"etag": None, "last_modified": None}
+
+        mock_download_json.side_effect = download
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = CondaCache(cache_dir=tmpdir, formats=["bz2"])
+            self.assertFalse(cache.cache_data("conda-forge", "noarch"))
+            self.assertFalse(cache.is_cached("conda-forge", "noarch"))
+            self.assertEqual(os.listdir(tmpdir), [])
+
+    @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.download_json")
+    def test_cache_data_revalidates_with_validators(self, mock_download_json):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = CondaCache(cache_dir=tmpdir, formats=["bz2"])
+            Path(tmpdir, "conda-forge_noarch.sqlite").write_text("")
+            cache.write_metadata(
+                "conda-forge",
+                "noarch",
+                {
+                    "etag": '"abc"',
+                    "last_modified": "Wed, 01 Jan 2025 00:00:00 GMT",
+                    "fetched_at": 0,
+                    "fields": FIELDS,
+                },
+            )
+            mock_download_json.return_value = {
+                "etag": None,
+                "last_modified": None,
+                "not_modified": True,
+            }
 
-        self.cache.cache_data("conda-forge", "noarch")
-        cache_path_str = str(Path.home() / ".cbomcache" / "conda-forge_noarch.json")
-        mock_open.assert_called_once_with(cache_path_str, "w")
+            self.assertTrue(cache.cache_data("conda-forge", "noarch"))
+
+            headers = mock_download_json.call_args[0][3]
+            self.assertEqual(headers["If-None-Match"], '"abc"')
+            self.assertEqual(headers["If-Modified-Since"], "Wed, 01 Jan 2025 00:00:00 GMT")
+            # A 304 keeps the validators but restarts the freshness clock
+            metadata = cache.read_metadata("conda-forge", "noarch")
+            self.assertEqual(metadata["etag"], '"abc"')
+            self.assertGreater(metadata["fetched_at"], 0)
+            self.assertTrue(cache.is_fresh("conda-forge", "noarch"))
+
+    @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.download_json")
+    def test_cache_data_refresh_skips_validators(self, mock_download_json):
+        mock_download_json.side_effect = _write_repodata({"packages": {}})
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = CondaCache(cache_dir=tmpdir, refresh=True, formats=["bz2"])
+            Path(tmpdir, "conda-forge_noarch.sqlite").write_text("")
+            cache.write_metadata(
+                "conda-forge",
+                "noarch",
+                {"etag": '"abc"', "fetched_at": time.time(), "fields": FIELDS},
+            )
+
+            self.assertFalse(cache.is_fresh("conda-forge", "noarch"))
+            self.assertTrue(cache.cache_data("conda-forge", "noarch"))
+
+            headers = mock_download_json.call_args[0][3]
+            self.assertEqual(headers, {})
+            # Only refreshed once per process
+            self.assertTrue(cache.is_fresh("conda-forge", "noarch"))
+
+    def test_is_fresh_respects_max_age(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = CondaCache(cache_dir=tmpdir, max_age=60)
+            self.assertFalse(cache.is_fresh("conda-forge", "noarch"))
+
+            Path(tmpdir, "conda-forge_noarch.sqlite").write_text("")
+            # Legacy entries without metadata are revalidated
+            self.assertFalse(cache.is_fresh("conda-forge", "noarch"))
+
+            cache.write_metadata(
+                "conda-forge", "noarch", {"fetched_at": time.time(), "fields": FIELDS}
+            )
+            self.assertTrue(cache.is_fresh("conda-forge", "noarch"))
+
+            cache.write_metadata(
+                "conda-forge", "noarch", {"fetched_at": time.time() - 120, "fields": FIELDS}
+            )
+            self.assertFalse(cache.is_fresh("conda-forge", "noarch"))
+
+            cache.max_age = None
+            self.assertTrue(cache.is_fresh("conda-forge", "noarch"))
+
+    @patch("superbom.utils.httpclient.get")
+    def test_download_json_not_modified(self, mock_get):
+        mock_response = MagicMock()
+        mock_response.status_code = 304
+        mock_response.headers = {"ETag": '"abc"'}
+        mock_get.return_value = mock_response
+
+        result = self.cache.download_json(
+            "conda-forge", "noarch", "unused.json", {"If-None-Match": '"abc"'}
+        )
+        self.assertEqual(result, {"etag": '"abc"', "last_modified": None, "not_modified": True})
+        mock_response.iter_content.assert_not_called()
 
     @patch("superbom.utils.packageindexes.conda.condacache.os.path.exists")
     def test_is_cached(self, mock_path_exists):
@@ -78,6 +320,77 @@ class TestCondaCache(unittest.TestCase):
         result = self.cache.is_cached("conda-forge", "noarch")
         self.assertFalse(result)
 
+    @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.cache_data")
+    def test_prefetch(self, mock_cache_data):
+        mock_cache_data.side_effect = lambda channel, platform, progress=None: channel != "broken"
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = CondaCache(cache_dir=tmpdir)
+            cache.add_channel("pytorch")
+            cache.platforms = "linux-64"
+
+            failed = cache.prefetch(max_workers=2)
+
+            fetched = {call.args for call in mock_cache_data.call_args_list}
+            self.assertEqual(
+                fetched,
+                {
+                    ("conda-forge", "noarch"),
+                    ("conda-forge", "linux-64"),
+                    ("pytorch", "noarch"),
+                    ("pytorch", "linux-64"),
+                },
+            )
+            self.assertEqual(failed, [])
+
+            mock_cache_data.reset_mock()
+            failed = cache.prefetch([("broken", "noarch"), ("broken", "noarch"), ("ok", "noarch")])
+            self.assertEqual(mock_cache_data.call_count, 2)
+            self.assertEqual(failed, [("broken", "noarch")])
+
+    @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.cache_data")
+    def test_prefetch_skips_fresh_entries(self, mock_cache_data):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = CondaCache(cache_dir=tmpdir)
+            Path(tmpdir, "conda-forge_noarch.sqlite").write_text("")
+            cache.write_metadata(
+                "conda-forge", "noarch", {"fetched_at": time.time(), "fields": FIELDS}
+            )
+
+            self.assertEqual(cache.prefetch([("conda-forge", "noarch")]), [])
+            mock_cache_data.assert_not_called()
+
+    @patch("superbom.utils.httpclient.get")
+    def test_prefetch_shared_progress(self, mock_get):
+        payload = bz2.compress(json.dumps({"packages": {}}).encode())
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {"content-length": str(len(payload))}
+        mock_response.iter_content = MagicMock(side_effect=lambda size: iter([payload]))
+        mock_get.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = CondaCache(cache_dir=tmpdir, formats=["bz2"])
+            cache.platforms = "linux-64"
+            with patch("superbom.utils.packageindexes.conda.condacache.tqdm") as mock_tqdm:
+                mock_tqdm.return_value.total = 0
+                self.assertEqual(cache.prefetch(), [])
+
+            # One aggregated bar for all downloads
+            mock_tqdm.assert_called_once()
+            self.assertEqual(mock_tqdm.return_value.total, 2 * len(payload))
+            self.assertTrue(cache.is_fresh("conda-forge", "linux-64"))
+
+    def test_evict(self):
+        index = MagicMock()
+        self.cache.caches = {"conda-forge": {"noarch": index}}
+        self.cache.evict("conda-forge", "noarch")
+        index.close.assert_called_once()
+        self.assertEqual(self.cache.caches, {"conda-forge": {}})
+
+        # Evicting something that is not loaded is a no-op
+        self.cache.evict("pytorch", "noarch")
+
     def test_add_existing_channel(self):
         cache = CondaCache()
         cache.add_channel("conda-forge")
@@ -125,5 +438,435 @@ class TestCondaCache(unittest.TestCase):
         self.assertCountEqual(cache.platforms, ["noarch"])
 
 
+class TestCondaCacheConcurrency(unittest.TestCase):
+    @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.download_json")
+    def test_cache_data_single_flight(self, mock_download_json):
+        started = threading.Event()
+        write = _write_repodata(REPODATA)
+
+        def slow_download(*args, **kwargs):
+            started.set()
+            time.sleep(0.3)
+            return write(*args, **kwargs)
+
+        mock_download_json.side_effect = slow_download
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # Separate instances stand in for separate processes sharing the directory
+            first = CondaCache(cache_dir=tmpdir, formats=["bz2"])
+            second = CondaCache(cache_dir=tmpdir, formats=["bz2"])
+
+            results = {}
+            thread = threading.Thread(
+                target=lambda: results.update(first=first.cache_data("conda-forge", "noarch"))
+            )
+            thread.start()
+            started.wait(5)
+            results["second"] = second.cache_data("conda-forge", "noarch")
+            thread.join()
+
+            self.assertEqual(results, {"first": True, "second": True})
+            self.assertEqual(mock_download_json.call_count, 1)
+            self.assertTrue(second.is_fresh("conda-forge", "noarch"))
+            self.assertEqual(
+                sorted(os.listdir(tmpdir)),
+                ["conda-forge_noarch.meta.json", "conda-forge_noarch.sqlite"],
+            )
+
+    @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.download_json")
+    def test_cache_data_releases_lock_on_error(self, mock_download_json):
+        mock_download_json.side_effect = requests.ConnectionError("connection dropped")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = CondaCache(cache_dir=tmpdir, formats=["bz2"])
+            with self.assertRaises(requests.ConnectionError):
+                cache.cache_data("conda-forge", "noarch")
+            self.assertEqual(os.listdir(tmpdir), [])
+
+    @patch("superbom.utils.httpclient.get")
+    def test_download_json_removes_partial_file(self, mock_get):
+        def chunks(size):
+            yield bz2.compress(b'{"key": "value"}')[:10]
+            raise requests.exceptions.ChunkedEncodingError("connection dropped")
+
+        mock_response = MagicMock(status_code=200, headers={})
+        mock_response.iter_content = chunks
+        mock_get.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_file = os.path.join(tmpdir, "conda-forge_noarch.json")
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                CondaCache(cache_dir=tmpdir).download_json("conda-forge", "noarch", cache_file)
+            self.assertEqual(os.listdir(tmpdir), [])
+
+
+class TestCondaCacheEviction(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.cache_dir = Path(tmpdir.name)
+
+    def add_entry(self, channel, platform, size, last_used):
+        cache = CondaCache(cache_dir=self.cache_dir)
+        cache_file = cache._cache_file(channel, platform)
+        Path(cache_file).write_bytes(b"x" * size)
+        os.utime(cache_file, (last_used, last_used))
+        cache.write_metadata(
+            channel,
+            platform,
+            {
+                "channel": channel,
+                "platform": platform,
+                "format": "bz2",
+                "fetched_at": 0,
+            },
+        )
+
+    def test_entries(self):
+        self.add_entry("conda-forge", "noarch", 100, last_used=20)
+        self.add_entry("pytorch", "linux-64", 50, last_used=10)
+        # Leftovers of an interrupted download are not entries
+        (self.cache_dir / "conda-forge_win-64.sqlite.part").write_bytes(b"x")
+
+        entries = CondaCache(cache_dir=self.cache_dir).entries()
+        self.assertEqual(
+            [entry["name"] for entry in entries], ["pytorch_linux-64", "conda-forge_noarch"]
+        )
+        self.assertEqual(entries[1]["channel"], "conda-forge")
+        self.assertGreater(entries[1]["size"], 100)
+        self.assertEqual(entries[1]["last_used"], 20)
+        self.assertEqual(CondaCache(cache_dir=self.cache_dir / "missing").entries(), [])
+
+    def test_prune_evicts_least_recently_used(self):
+        self.add_entry("a", "noarch", 1000, last_used=30)
+        self.add_entry("b", "noarch", 1000, last_used=10)
+        self.add_entry("c", "noarch", 1000, last_used=20)
+
+        cache = CondaCache(cache_dir=self.cache_dir)
+        self.assertEqual(cache.prune(), [])
+        self.assertEqual(cache.prune(1500), ["b_noarch", "c_noarch"])
+        self.assertEqual(
+            sorted(os.listdir(self.cache_dir)), ["a_noarch.meta.json", "a_noarch.sqlite"]
+        )
+
+    def test_prune_keeps_entries_in_use(self):
+        self.add_entry("a", "noarch", 1000, last_used=10)
+        self.add_entry("b", "noarch", 1000, last_used=20)
+
+        cache = CondaCache(cache_dir=self.cache_dir)
+        cache._validated.add(("a", "noarch"))
+        self.assertEqual(cache.prune(0), ["b_noarch"])
+        self.assertTrue(cache.is_cached("a", "noarch"))
+
+        # Entries locked by another process are being written and are kept too
+        self.add_entry("c", "noarch", 1000, last_used=5)
+        (self.cache_dir / "c_noarch.lock").write_text("1234")
+        self.assertEqual(CondaCache(cache_dir=self.cache_dir).prune(0), ["a_noarch"])
+
+    @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.download_json")
+    def test_cache_data_enforces_budget(self, mock_download_json):
+        mock_download_json.side_effect = _write_repodata(REPODATA)
+        self.add_entry("old", "noarch", 100000, last_used=10)
+
+        cache = CondaCache(cache_dir=self.cache_dir, formats=["bz2"], max_size=50000)
+        self.assertTrue(cache.cache_data("conda-forge", "noarch"))
+        self.assertEqual([entry["name"] for entry in cache.entries()], ["conda-forge_noarch"])
+
+    @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.download_json")
+    def test_open_records_last_used(self, mock_download_json):
+        mock_download_json.side_effect = _write_repodata(REPODATA)
+        CondaCache(cache_dir=self.cache_dir, formats=["bz2"]).cache_data("conda-forge", "noarch")
+        cache = CondaCache(cache_dir=self.cache_dir, formats=["bz2"])
+        os.utime(cache._cache_file("conda-forge", "noarch"), (10, 10))
+        metadata_file = Path(cache._metadata_file("conda-forge", "noarch"))
+        metadata = metadata_file.read_bytes()
+
+        before = time.time() - 1
+        self.assertIsNotNone(cache.get_cache("conda-forge", "noarch"))
+        self.assertGreaterEqual(cache.entries()[0]["last_used"], before)
+        # The metadata belongs to whoever holds the entry lock and is left alone
+        self.assertEqual(metadata_file.read_bytes(), metadata)
+
+    @patch("superbom.utils.packageindexes.conda.condacache.os.utime", side_effect=PermissionError)
+    @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.download_json")
+    def test_open_read_only_cache(self, mock_download_json, _):
+        mock_download_json.side_effect = _write_repodata(REPODATA)
+        cache = CondaCache(cache_dir=self.cache_dir, formats=["bz2"])
+        self.assertIsNotNone(cache.get_cache("conda-forge", "noarch"))
+
+    @patch("superbom.utils.packageindexes.conda.condacache.CondaCache.download_json")
+    def test_stale_entry_in_read_only_cache(self, mock_download_json):
+        mock_download_json.side_effect = _write_repodata(REPODATA)
+        CondaCache(cache_dir=self.cache_dir, formats=["bz2"]).cache_data("conda-forge", "noarch")
+        mock_download_json.reset_mock()
+
+        for error in (PermissionError(errno.EACCES, "denied"), OSError(errno.EROFS, "read-only")):
+            with self.subTest(error=error), patch(
+                "superbom.utils.packageindexes.conda.condacache.FileLock.acquire",
+                side_effect=error,
+            ) as mock_acquire:
+                cache = CondaCache(cache_dir=self.cache_dir, formats=["bz2"], refresh=True)
+                index = cache.get_cache("conda-forge", "noarch")
+                self.assertEqual(index.lookup("numpy")[0][0], "numpy-1.1-0.conda")
+                # Served as is for the rest of the run
+                self.assertTrue(cache.is_fresh("conda-forge", "noarch"))
+                mock_acquire.assert_called_once()
+        mock_download_json.assert_not_called()
+
+    def test_clear(self):
+        self.add_entry("a", "noarch", 10, last_used=10)
+        cache = CondaCache(cache_dir=self.cache_dir)
+        index = MagicMock()
+        cache.caches = {"a": {"noarch": index}}
+
+        self.assertEqual(cache.clear(), ["a_noarch"])
+        index.close.assert_called_once()
+        self.assertEqual(cache.caches, {})
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+
+class TestCondaCacheLocalDirectory(unittest.TestCase):
+    """Channels on local storage are read in place."""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.channel = Path(tmpdir.name, "channels", "local-channel")
+        self.cache_dir = Path(tmpdir.name, "cache")
+        (self.channel / "noarch").mkdir(parents=True)
+
+    def assert_reads_in_place(self, cache, channel):
+        self.assertTrue(cache.is_fresh(channel, "noarch"))
+        self.assertEqual(cache.prefetch([(channel, "noarch")]), [])
+
+        index = cache.get_cache(channel, "noarch")
+        self.assertEqual(index.lookup("numpy")[0][0], "numpy-1.1-0.conda")
+        # Only the derived index is cached, never a copy of the repodata
+        self.assertEqual(
+            sorted(path.suffix for path in self.cache_dir.iterdir()), [".json", ".sqlite"]
+        )
+        self.assertFalse(any("repodata" in path.name for path in self.cache_dir.iterdir()))
+
+    def test_index_is_reused_until_the_repodata_changes(self):
+        repodata = self.channel / "noarch" / "repodata.json"
+        repodata.write_text(json.dumps(REPODATA))
+        CondaCache(cache_dir=self.cache_dir).get_cache(str(self.channel), "noarch")
+
+        with patch(
+            "superbom.utils.packageindexes.conda.condacache.CondaIndex.build"
+        ) as mock_build:
+            index = CondaCache(cache_dir=self.cache_dir).get_cache(str(self.channel), "noarch")
+            mock_build.assert_not_called()
+        self.assertEqual(index.lookup("numpy")[0][0], "numpy-1.1-0.conda")
+        index.close()
+
+        changed = {"packages": {"scipy-1.0-0.tar.bz2": {"name": "scipy", "version": "1.0"}}}
+        repodata.write_text(json.dumps(changed))
+        os.utime(repodata, ns=(0, 0))
+        index = CondaCache(cache_dir=self.cache_dir).get_cache(str(self.channel), "noarch")
+        self.assertFalse(index.lookup("numpy"))
+        self.assertEqual(index.lookup("scipy")[0][0], "scipy-1.0-0.tar.bz2")
+        index.close()
+
+    def test_truncated_repodata(self):
+        (self.channel / "noarch" / "repodata.json").write_text(json.dumps(REPODATA)[:40])
+        cache = CondaCache(cache_dir=self.cache_dir)
+        self.assertIsNone(cache.get_cache(str(self.channel), "noarch"))
+        self.assertFalse(cache.is_cached(str(self.channel), "noarch"))
+
+    @patch(
+        "superbom.utils.packageindexes.conda.condacache.os.makedirs", side_effect=PermissionError
+    )
+    def test_read_only_cache_indexes_in_memory(self, _):
+        (self.channel / "noarch" / "repodata.json").write_text(json.dumps(REPODATA))
+        index = CondaCache(cache_dir=self.cache_dir).get_cache(str(self.channel), "noarch")
+        self.assertEqual(index.lookup("numpy")[0][0], "numpy-1.1-0.conda")
+        self.assertFalse(self.cache_dir.exists())
+
+    def test_directory_channel(self):
+        (self.channel / "noarch" / "repodata.json").write_text(json.dumps(REPODATA))
+        cache = CondaCache(cache_dir=self.cache_dir)
+        self.assert_reads_in_place(cache, str(self.channel))
+
+    def test_file_url_channel(self):
+        (self.channel / "noarch" / "repodata.json.bz2").write_bytes(
+            bz2.compress(json.dumps(REPODATA).encode())
+        )
+        cache = CondaCache(cache_dir=self.cache_dir)
+        self.assert_reads_in_place(cache, self.channel.as_uri())
+
+    def test_file_url_alias(self):
+        (self.channel / "noarch" / "repodata.json").write_text(json.dumps(REPODATA))
+        cache = CondaCache(cache_dir=self.cache_dir, channel_alias=self.channel.parent.as_uri())
+        self.assertEqual(cache.local_channel_dir("local-channel"), self.channel)
+        self.assert_reads_in_place(cache, "local-channel")
+
+    def test_channel_url_override(self):
+        (self.channel / "noarch" / "repodata.json").write_text(json.dumps(REPODATA))
+        cache = CondaCache(
+            cache_dir=self.cache_dir, channel_urls={"conda-forge": str(self.channel)}
+        )
+        self.assertIsNone(cache.local_channel_dir("pytorch"))
+        self.assert_reads_in_place(cache, "conda-forge")
+
+    def test_missing_repodata(self):
+        cache = CondaCache(cache_dir=self.cache_dir)
+        self.assertIsNone(cache.get_cache(str(self.channel), "linux-64"))
+
+    def test_channel_base(self):
+        cache = CondaCache(
+            cache_dir=self.cache_dir, channel_urls={"mirrored": "https://mirror/mirrored/"}
+        )
+        self.assertEqual(
+            cache.channel_url("conda-forge", "noarch"),
+            "https://conda.anaconda.org/conda-forge/noarch/",
+        )
+        self.assertEqual(
+            cache.channel_url("mirrored", "noarch"), "https://mirror/mirrored/noarch/"
+        )
+        self.assertEqual(
+            cache.channel_url("https://host/ch/", "noarch"), "https://host/ch/noarch/"
+        )
+        self.assertIsNone(cache.local_channel_dir("https://host/ch"))
+        self.assertEqual(
+            cache._cache_file("https://host/ch", "noarch"),
+            os.path.join(self.cache_dir, "https___host_ch_noarch.sqlite"),
+        )
+
+
+class _ChannelHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        self.server.requests.append(self.path)
+
+
+class TestCondaCacheLocalChannel(unittest.TestCase):
+    """Exercise the real download paths against a local HTTP stand-in channel."""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.root = Path(tmpdir.name, "channels")
+        self.cache_dir = Path(tmpdir.name, "cache")
+        (self.root / "test-channel" / "noarch").mkdir(parents=True)
+
+        handler = partial(_ChannelHandler, directory=str(self.root))
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def cache(self, **kwargs):
+        alias = f"http://127.0.0.1:{self.server.server_port}"
+        return CondaCache(cache_dir=self.cache_dir, channel_alias=alias, **kwargs)
+
+    def write(self, name, data: bytes):
+        path = self.root / "test-channel" / "noarch" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    def requested(self, suffix):
+        return [path for path in self.server.requests if path.endswith(suffix)]
+
+    def test_mirror_channel_url(self):
+        self.write("repodata.json.bz2", bz2.compress(json.dumps(REPODATA).encode()))
+
+        mirror = f"http://127.0.0.1:{self.server.server_port}/test-channel"
+        cache = CondaCache(
+            cache_dir=self.cache_dir,
+            channel_alias="http://unreachable.invalid",
+            channel_urls={"conda-forge": mirror},
+            formats=["bz2"],
+        )
+        index = cache.get_cache("conda-forge", "noarch")
+        self.assertEqual(len(index.lookup("numpy")), 2)
+        self.assertEqual(self.server.requests, ["/test-channel/noarch/repodata.json.bz2"])
+
+    def test_bz2_fallback(self):
+        self.write("repodata.json.bz2", bz2.compress(json.dumps(REPODATA).encode()))
+
+        cache = self.cache()
+        self.assertTrue(cache.cache_data("test-channel", "noarch"))
+        self.assertEqual(cache.read_metadata("test-channel", "noarch")["format"], "bz2")
+
+        index = cache.get_cache("test-channel", "noarch")
+        self.assertEqual(index.lookup("numpy")[0][0], "numpy-1.1-0.conda")
+
+    @unittest.skipUnless(zstandard, "zstandard is not installed")
+    def test_zst(self):
+        self.write(
+            "repodata.json.zst", zstandard.ZstdCompressor().compress(json.dumps(REPODATA).encode())
+        )
+        self.write("repodata.json.bz2", b"not used")
+
+        cache = self.cache()
+        self.assertTrue(cache.cache_data("test-channel", "noarch"))
+        self.assertEqual(cache.read_metadata("test-channel", "noarch")["format"], "zst")
+        self.assertEqual(self.requested(".bz2"), [])
+
+        index = cache.get_cache("test-channel", "noarch")
+        self.assertEqual(len(index.lookup("numpy")), 2)
+
+        # A second run revalidates the .zst file directly and gets a 304
+        self.server.requests.clear()
+        cache = self.cache(max_age=0)
+        self.assertTrue(cache.cache_data("test-channel", "noarch"))
+        self.assertEqual(self.server.requests, ["/test-channel/noarch/repodata.json.zst"])
+
+    @unittest.skipUnless(zstandard and msgpack, "zstandard and msgpack are not installed")
+    def test_sharded(self):
+        compress = zstandard.ZstdCompressor(write_content_size=False).compress
+        shards = {}
+        for name in ("numpy", "scipy"):
+            shard = {
+                section: {
+                    filename: {**record, "sha256": bytes.fromhex("ab" * 32)}
+                    for filename, record in REPODATA[section].items()
+                    if record["name"] == name
+                }
+                for section in ("packages", "packages.conda")
+            }
+            data = compress(msgpack.packb(shard))
+            digest = hashlib.sha256(data).digest()
+            shards[name] = digest
+            self.write(f"shards/{digest.hex()}.msgpack.zst", data)
+
+        shard_index = {"version": 1, "info": {"shards_base_url": "./shards/"}, "shards": shards}
+        self.write("repodata_shards.msgpack.zst", compress(msgpack.packb(shard_index)))
+
+        # sha256 is kept to check that hashes stored as bytes come back as hex
+        cache = self.cache(fields=FIELDS + ["sha256"])
+        self.assertTrue(cache.cache_data("test-channel", "noarch"))
+        self.assertEqual(cache.read_metadata("test-channel", "noarch")["format"], "shards")
+        self.assertEqual(
+            self.requested(".msgpack.zst"), ["/test-channel/noarch/repodata_shards.msgpack.zst"]
+        )
+
+        # Only the shard for the requested package is downloaded
+        index = cache.get_cache("test-channel", "noarch")
+        numpy = index.lookup("numpy")
+        self.assertEqual(
+            [filename for filename, _ in numpy], ["numpy-1.1-0.conda", "numpy-1.0-0.tar.bz2"]
+        )
+        self.assertEqual(numpy[0][1]["sha256"], "ab" * 32)
+        self.assertEqual(
+            self.requested(f"{shards['numpy'].hex()}.msgpack.zst"),
+            [f"/test-channel/noarch/shards/{shards['numpy'].hex()}.msgpack.zst"],
+        )
+        self.assertEqual(self.requested(f"{shards['scipy'].hex()}.msgpack.zst"), [])
+        self.assertEqual(index.lookup("missing"), ())
+
+        # Fetched shards survive a rebuild of the shard index when their hash is unchanged
+        self.server.requests.clear()
+        cache = self.cache(refresh=True, fields=FIELDS + ["sha256"])
+        self.assertTrue(cache.cache_data("test-channel", "noarch"))
+        index = cache.get_cache("test-channel", "noarch")
+        self.assertEqual(len(index.lookup("numpy")), 2)
+        self.assertEqual(
+            self.server.requests, ["/test-channel/noarch/repodata_shards.msgpack.zst"]
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
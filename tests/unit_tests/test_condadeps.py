@@ -1,10 +1,18 @@
 # Copyright (C) 2024 Intel Corporation
 # SPDX-License-Identifier: Apache 2.0
 
+import json
+import sqlite3
+import tempfile
 import unittest
+from pathlib import Path
 from unittest.mock import PropertyMock, patch
 
+import requests
+
+from superbom.utils.packageindexes.conda.condacache import CondaCache
 from superbom.utils.packageindexes.conda.condadependencies import CondaPackageUtil
+from superbom.utils.packageindexes.conda.condaindex import CondaIndex, ShardedCondaIndex
 
 
 class TestCondaPackageUtil(unittest.TestCase):
@@ -18,27 +26,116 @@ class TestCondaPackageUtil(unittest.TestCase):
             "channel": "conda-forge",
             "package": "numpy",
             "version": "1.18.0",
+            "constraint": ">=1.18.0",
             "build": None,
         }
         self.assertEqual(result, expected)
 
+    def test_parse_conda_dependency_forms(self):
+        cases = {
+            "numpy": (None, None, None),
+            "numpy=1.18": ("1.18", "=1.18", None),
+            "numpy>=1.2,<2": ("1.2", ">=1.2,<2", None),
+            "numpy=1.18.0=py38_0": ("1.18.0", "1.18.0", "py38_0"),
+            "numpy 1.18.0 py38_0": ("1.18.0", "1.18.0", "py38_0"),
+            "numpy 1.18.*": ("1.18", "1.18.*", None),
+        }
+        for dependency, (version, constraint, build) in cases.items():
+            result = self.util.parse_conda_dependency(dependency)
+            self.assertEqual(result["package"], "numpy", dependency)
+            self.assertEqual(result["version"], version, dependency)
+            self.assertEqual(result["constraint"], constraint, dependency)
+            self.assertEqual(result["build"], build, dependency)
+
     @patch("superbom.utils.packageindexes.conda.condadependencies.CondaCache.get_cache")
     def test_lookup_package(self, mock_get_cache):
-        mock_get_cache.return_value = {
-            "packages": {"numpy-1.18.0": {"name": "numpy", "version": "1.18.0"}},
-            "packages.conda": {},
-        }
+        mock_get_cache.return_value = CondaIndex.from_repodata(
+            {
+                "packages": {"numpy-1.18.0": {"name": "numpy", "version": "1.18.0"}},
+                "packages.conda": {},
+            }
+        )
         result = self.util.lookup_package_from_cache("conda-forge", "noarch", "numpy", "1.18.0")
         self.assertIsNotNone(result)
         self.assertEqual(result[1]["name"], "numpy")
         self.assertEqual(result[1]["version"], "1.18.0")
 
+    @patch("superbom.utils.packageindexes.conda.condadependencies.CondaCache.get_cache")
+    def test_lookup_package_latest(self, mock_get_cache):
+        mock_get_cache.return_value = CondaIndex.from_repodata(
+            {
+                "packages": {
+                    "numpy-1.17.0": {"name": "numpy", "version": "1.17.0"},
+                    "numpy-1.18.0": {"name": "numpy", "version": "1.18.0"},
+                    "scipy-1.19.0": {"name": "scipy", "version": "1.19.0"},
+                },
+                "packages.conda": {"numpy-1.18.1": {"name": "numpy", "version": "1.18.1"}},
+            }
+        )
+        result = self.util.lookup_package_from_cache("conda-forge", "noarch", "numpy")
+        self.assertEqual(result[0], "numpy-1.18.1")
+
+        result = self.util.lookup_package_from_cache("conda-forge", "noarch", "numpy", "1.17")
+        self.assertEqual(result[0], "numpy-1.17.0")
+
+    @patch("superbom.utils.packageindexes.conda.condadependencies.CondaCache.get_cache")
+    def test_lookup_package_version_semantics(self, mock_get_cache):
+        mock_get_cache.return_value = CondaIndex.from_repodata(
+            {
+                "packages": {
+                    "cuda-9.0": {"name": "cuda", "version": "9.0", "build": "h0"},
+                    "cuda-10.0": {"name": "cuda", "version": "10.0", "build": "h0"},
+                    "cuda-11.2.0": {"name": "cuda", "version": "11.2.0", "build": "h0"},
+                    "cuda-1.2.0-h0": {"name": "cuda", "version": "1.2.0", "build": "h0"},
+                    "cuda-1.2.0-h1": {"name": "cuda", "version": "1.2.0", "build": "h1"},
+                },
+                "packages.conda": {},
+            }
+        )
+        lookup = self.util.lookup_package_from_cache
+
+        # 10.0 sorts above 9.0 and 1.2 no longer matches 11.2.0
+        self.assertEqual(lookup("conda-forge", "noarch", "cuda")[0], "cuda-11.2.0")
+        self.assertEqual(lookup("conda-forge", "noarch", "cuda", "<11")[0], "cuda-10.0")
+        self.assertEqual(lookup("conda-forge", "noarch", "cuda", "=1.2")[1]["version"], "1.2.0")
+        self.assertEqual(
+            lookup("conda-forge", "noarch", "cuda", "1.2.0", "h0")[0], "cuda-1.2.0-h0"
+        )
+        self.assertIsNone(lookup("conda-forge", "noarch", "cuda", "=1.2", "py*"))
+
     @patch("superbom.utils.packageindexes.conda.condadependencies.CondaCache.get_cache")
     def test_lookup_package_not_found(self, mock_get_cache):
-        mock_get_cache.return_value = {"packages": {}, "packages.conda": {}}
+        mock_get_cache.return_value = CondaIndex.from_repodata(
+            {"packages": {}, "packages.conda": {}}
+        )
         result = self.util.lookup_package_from_cache("conda-forge", "noarch", "numpy", "1.18.0")
         self.assertIsNone(result)
 
+    @patch(
+        "superbom.utils.packageindexes.conda.condadependencies.CondaCache.channels",
+        new_callable=PropertyMock,
+    )
+    @patch(
+        "superbom.utils.packageindexes.conda.condadependencies.CondaCache.platforms",
+        new_callable=PropertyMock,
+    )
+    def test_channel_platforms(self, mock_platforms, mock_channels):
+        mock_channels.return_value = ["conda-forge", "nvidia"]
+        mock_platforms.return_value = ["noarch", "linux-64"]
+
+        result = self.util.channel_platforms(["numpy", "pytorch::pytorch=2.1", "scipy", ""])
+        self.assertEqual(
+            result,
+            [
+                ("conda-forge", "noarch"),
+                ("conda-forge", "linux-64"),
+                ("nvidia", "noarch"),
+                ("nvidia", "linux-64"),
+                ("pytorch", "noarch"),
+                ("pytorch", "linux-64"),
+            ],
+        )
+
     def test_find_license(self):
         dictionary = {"license": "MIT"}
         key, value = self.util._find_license(dictionary, "license")
@@ -60,12 +157,14 @@ class TestCondaPackageUtil(unittest.TestCase):
 
         mock_channels.return_value = ["conda-forge"]
         mock_platforms.return_value = ["noarch"]
-        mock_get_cache.return_value = {
-            "packages": {
-                "test-package": {"name": "test-package", "version": "1.0.0", "license": "MIT"},
-            },
-            "packages.conda": {},
-        }
+        mock_get_cache.return_value = CondaIndex.from_repodata(
+            {
+                "packages": {
+                    "test-package": {"name": "test-package", "version": "1.0.0", "license": "MIT"},
+                },
+                "packages.conda": {},
+            }
+        )
 
         dep = "conda-forge::test-package=1.0.0"
         result = self.util.retrieve_conda_package_info(dep)
@@ -93,10 +192,12 @@ class TestCondaPackageUtil(unittest.TestCase):
     ):
         mock_channels.return_value = ["conda-forge"]
         mock_platforms.return_value = ["noarch"]
-        mock_get_cache.return_value = {
-            "packages": {"test-package": {"name": "test-package", "version": "1.0.0"}},
-            "packages.conda": {},
-        }
+        mock_get_cache.return_value = CondaIndex.from_repodata(
+            {
+                "packages": {"test-package": {"name": "test-package", "version": "1.0.0"}},
+                "packages.conda": {},
+            }
+        )
 
         dep = "conda-forge::test-package=1.0.0"
         result = self.util.retrieve_conda_package_info(dep)
@@ -138,6 +239,233 @@ class TestCondaPackageUtil(unittest.TestCase):
 
         self.assertEqual(result, expected)
 
+    @patch("superbom.utils.packageindexes.conda.condadependencies.CondaCache.get_cache")
+    @patch(
+        "superbom.utils.packageindexes.conda.condadependencies.CondaCache.channels",
+        new_callable=PropertyMock,
+    )
+    @patch(
+        "superbom.utils.packageindexes.conda.condadependencies.CondaCache.platforms",
+        new_callable=PropertyMock,
+    )
+    def test_resolve_many(self, mock_platforms, mock_channels, mock_get_cache):
+        mock_channels.return_value = ["conda-forge", "pytorch"]
+        mock_platforms.return_value = ["noarch", "linux-64"]
+        indexes = {
+            ("conda-forge", "noarch"): CondaIndex.from_repodata(
+                {
+                    "packages": {
+                        "numpy-1.0-0.tar.bz2": {"name": "numpy", "version": "1.0"},
+                        "scipy-1.5-0.tar.bz2": {"name": "scipy", "version": "1.5"},
+                    }
+                }
+            ),
+            ("conda-forge", "linux-64"): CondaIndex.from_repodata(
+                {
+                    "packages": {
+                        "numpy-1.0-0.tar.bz2": {
+                            "name": "numpy",
+                            "version": "1.0",
+                            "license": "Custom",
+                        }
+                    }
+                }
+            ),
+            ("pytorch", "noarch"): CondaIndex.from_repodata({"packages": {}}),
+            ("pytorch", "linux-64"): CondaIndex.from_repodata(
+                {
+                    "packages": {
+                        "torch-2.0-0.tar.bz2": {
+                            "name": "torch",
+                            "version": "2.0",
+                            "license": "Custom",
+                        }
+                    }
+                }
+            ),
+        }
+        mock_get_cache.side_effect = lambda channel, platform: indexes[(channel, platform)]
+
+        with patch(
+            "superbom.utils.packageindexes.conda.condadependencies.licenseutils.checklicense",
+            return_value=(True, "Custom"),
+        ):
+            results = self.util.resolve_many(
+                ["torch", "", "numpy", "==bad", "pytorch::torch", "scipy>=1.0"]
+            )
+
+        self.assertEqual(len(results), 6)
+        self.assertEqual(results[0]["Source"], "pytorch:linux-64")
+        self.assertEqual(results[1], {})
+        # Found without a license on noarch, so the licensed linux-64 record wins
+        self.assertEqual(results[2]["Source"], "conda-forge:linux-64")
+        self.assertEqual(results[2]["License"], "Custom")
+        self.assertIsNone(results[3])
+        self.assertEqual(results[4]["Source"], "pytorch:linux-64")
+        # Found on noarch without a license and missing on linux-64 keeps the noarch record
+        self.assertEqual(results[5]["Source"], "conda-forge:noarch")
+        self.assertEqual(results[5]["Version"], "1.5")
+
+        # Each channel/platform index is fetched once per channel pass, not once per package
+        self.assertEqual(mock_get_cache.call_count, 6)
+
+    @patch("superbom.utils.packageindexes.conda.condadependencies.CondaCache.get_cache")
+    @patch(
+        "superbom.utils.packageindexes.conda.condadependencies.CondaCache.channels",
+        new_callable=PropertyMock,
+    )
+    @patch(
+        "superbom.utils.packageindexes.conda.condadependencies.CondaCache.platforms",
+        new_callable=PropertyMock,
+    )
+    def test_resolve_many_unreachable_channel(self, mock_platforms, mock_channels, mock_get_cache):
+        mock_channels.return_value = ["offline", "conda-forge"]
+        mock_platforms.return_value = ["noarch"]
+        index = CondaIndex.from_repodata(
+            {"packages": {"numpy-1.0-0.tar.bz2": {"name": "numpy", "version": "1.0"}}}
+        )
+
+        def get_cache(channel, platform):
+            if channel == "offline":
+                raise requests.ConnectionError("offline")
+            return index
+
+        mock_get_cache.side_effect = get_cache
+
+        results = self.util.resolve_many(["numpy", "offline::scipy"])
+
+        self.assertEqual(results[0]["Source"], "conda-forge:noarch")
+        self.assertEqual(results[1]["Source"], ":")
+
+    @patch("superbom.utils.packageindexes.conda.condadependencies.CondaCache.get_cache")
+    @patch(
+        "superbom.utils.packageindexes.conda.condadependencies.CondaCache.channels",
+        new_callable=PropertyMock,
+    )
+    @patch(
+        "superbom.utils.packageindexes.conda.condadependencies.CondaCache.platforms",
+        new_callable=PropertyMock,
+    )
+    def test_resolve_many_isolates_failing_specs(
+        self, mock_platforms, mock_channels, mock_get_cache
+    ):
+        mock_channels.return_value = ["conda-forge"]
+        mock_platforms.return_value = ["noarch"]
+        index = CondaIndex.from_repodata(
+            {
+                "packages": {
+                    "numpy-1.0-0.tar.bz2": {"name": "numpy", "version": "1.0"},
+                    "scipy-1.5-0.tar.bz2": {"name": "scipy", "version": "1.5"},
+                }
+            }
+        )
+        match = index.match
+
+        def failing_match(name, *args):
+            if name == "broken":
+                raise sqlite3.OperationalError("database is locked")
+            return match(name, *args)
+
+        mock_get_cache.return_value = index
+        package_data = self.util._package_data
+
+        def failing_package_data(parsed, *args):
+            if parsed["package"] == "scipy":
+                raise PermissionError("denied")
+            return package_data(parsed, *args)
+
+        with patch.object(index, "match", side_effect=failing_match), patch.object(
+            self.util, "_package_data", side_effect=failing_package_data
+        ):
+            results = self.util.resolve_many(["broken", "scipy", "numpy"])
+
+        self.assertEqual(results[0]["Source"], ":")
+        self.assertIsNone(results[1])
+        self.assertEqual(results[2]["Source"], "conda-forge:noarch")
+
+    @patch("superbom.utils.packageindexes.conda.condadependencies.CondaCache.get_cache")
+    @patch(
+        "superbom.utils.packageindexes.conda.condadependencies.CondaCache.channels",
+        new_callable=PropertyMock,
+    )
+    @patch(
+        "superbom.utils.packageindexes.conda.condadependencies.CondaCache.platforms",
+        new_callable=PropertyMock,
+    )
+    def test_resolve_many_prefetches_shards(self, mock_platforms, mock_channels, mock_get_cache):
+        mock_channels.return_value = ["conda-forge"]
+        mock_platforms.return_value = ["noarch"]
+        names = ["numpy", "scipy", "torch"]
+
+        def fetch_shard(url):
+            name = names[int(url.rsplit("/", 1)[1].split(".")[0], 16) - 1]
+            return [(f"{name}-1.0-0.tar.bz2", {"name": name, "version": "1.0"})]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            index = ShardedCondaIndex.build(
+                Path(tmpdir, "index.sqlite"),
+                {name: bytes([i + 1]) for i, name in enumerate(names)},
+                "https://example.com/shards/",
+                fetch_shard,
+            )
+            self.addCleanup(index.close)
+            mock_get_cache.return_value = index
+
+            batches = []
+            prefetch = index.prefetch
+
+            def tracking_prefetch(names):
+                fetched = mock_fetch.call_count
+                prefetch(names)
+                batches.append((names, mock_fetch.call_count - fetched))
+
+            with patch.object(
+                index, "_fetch_shard", wraps=fetch_shard
+            ) as mock_fetch, patch.object(index, "prefetch", side_effect=tracking_prefetch):
+                results = self.util.resolve_many(["numpy", "scipy>=1.0", "numpy"])
+
+        self.assertEqual([r["Version"] for r in results], ["1.0", "1.0", "1.0"])
+        # Both shards come from the first batch; the lookups after it fetch nothing
+        self.assertEqual(batches[0], (["numpy", "scipy", "numpy"], 2))
+        self.assertEqual(sum(count for _, count in batches), 2)
+
+    def test_resolve_many_evicts_each_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            channels = {}
+            for channel, package in (("first", "numpy"), ("second", "scipy")):
+                for platform in ("noarch", "linux-64"):
+                    path = Path(tmpdir, channel, platform)
+                    path.mkdir(parents=True)
+                    record = {"name": package, "version": "1.0", "license": "MIT"}
+                    (path / "repodata.json").write_text(
+                        json.dumps({"packages": {f"{package}-1.0-0.tar.bz2": record}})
+                    )
+                channels[channel] = str(Path(tmpdir, channel))
+
+            cache = CondaCache(cache_dir=Path(tmpdir, "cache"), channel_urls=channels)
+            cache._channels = ["first", "second"]
+            cache.platforms = "linux-64"
+            util = CondaPackageUtil(cache)
+
+            loaded = []
+            get_cache = cache.get_cache
+
+            def tracking_get_cache(channel, platform):
+                index = get_cache(channel, platform)
+                loaded.append(sum(len(platforms) for platforms in cache.caches.values()))
+                return index
+
+            with patch.object(cache, "get_cache", side_effect=tracking_get_cache), patch(
+                "superbom.utils.packageindexes.conda.condadependencies.licenseutils.checklicense",
+                return_value=(True, "MIT"),
+            ):
+                results = util.resolve_many(["scipy", "numpy"], evict=True)
+
+            self.assertEqual([r["Source"] for r in results], ["second:noarch", "first:noarch"])
+            # Never more than one index in memory, and none left afterwards
+            self.assertEqual(max(loaded), 1)
+            self.assertEqual(sum(len(platforms) for platforms in cache.caches.values()), 0)
+
 
 if __name__ == "__main__":
     unittest.main()
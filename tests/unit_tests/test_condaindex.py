@@ -0,0 +1,191 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+import zlib
+
+from superbom.utils.packageindexes.conda.condaindex import (
+    RECORD_FIELDS,
+    CondaIndex,
+    iter_repodata_records,
+    project_records,
+)
+
+REPODATA = {
+    "info": {"subdir": "noarch", "base_url": "https://conda.anaconda.org/conda-forge"},
+    "packages": {
+        "numpy-1.0-0.tar.bz2": {"name": "numpy", "version": "1.0", "license": "BSD-3-Clause"},
+        "scipy-1.2-0.tar.bz2": {"name": "scipy", "version": "1.2", "depends": ["numpy >=1.0"]},
+    },
+    "packages.conda": {
+        "numpy-1.1-0.conda": {"name": "numpy", "version": "1.1", "license": "BSD-3-Clause"},
+    },
+    "removed": ["old-1.0-0.tar.bz2"],
+    "repodata_version": 1,
+}
+
+
+class TestIterRepodataRecords(unittest.TestCase):
+    def test_iter_records(self):
+        for text in (json.dumps(REPODATA), json.dumps(REPODATA, indent=4)):
+            # A tiny chunk size forces every token to straddle a buffer boundary
+            records = list(iter_repodata_records(io.StringIO(text), chunk_size=3))
+            self.assertEqual(
+                records,
+                [
+                    *REPODATA["packages"].items(),
+                    *REPODATA["packages.conda"].items(),
+                ],
+            )
+
+    def test_iter_records_escaped_strings(self):
+        repodata = {"packages": {'we"ird\\u00e9.tar.bz2': {"name": "café", "version": "1"}}}
+        records = list(iter_repodata_records(io.StringIO(json.dumps(repodata)), chunk_size=2))
+        self.assertEqual(records, list(repodata["packages"].items()))
+
+    def test_iter_records_empty(self):
+        self.assertEqual(list(iter_repodata_records(io.StringIO("{}"))), [])
+        self.assertEqual(list(iter_repodata_records(io.StringIO('{"packages": {}}'))), [])
+
+    def test_iter_records_truncated(self):
+        text = json.dumps(REPODATA)[:-20]
+        with self.assertRaises(ValueError):
+            list(iter_repodata_records(io.StringIO(text), chunk_size=16))
+
+
+class TestProjectRecords(unittest.TestCase):
+    def test_project_records(self):
+        records = [
+            (
+                "numpy-1.0-0.tar.bz2",
+                {
+                    "license": "BSD",
+                    "name": "numpy",
+                    "depends": ["python"],
+                    "md5": "00",
+                    "version": "1.0",
+                },
+            )
+        ]
+        ((_, record),) = project_records(records, RECORD_FIELDS)
+        self.assertEqual(record, {"name": "numpy", "version": "1.0", "license": "BSD"})
+        # Fields keep the configured order, so "license" is found before "license_family"
+        self.assertEqual(list(record), ["name", "version", "license"])
+
+        self.assertEqual(list(project_records(records, None)), records)
+
+
+class TestCondaIndex(unittest.TestCase):
+    def test_from_repodata_lookup(self):
+        index = CondaIndex.from_repodata(REPODATA)
+        # Newest version first, across both package sections
+        self.assertEqual(
+            index.lookup("numpy"),
+            (
+                ("numpy-1.1-0.conda", REPODATA["packages.conda"]["numpy-1.1-0.conda"]),
+                ("numpy-1.0-0.tar.bz2", REPODATA["packages"]["numpy-1.0-0.tar.bz2"]),
+            ),
+        )
+        self.assertEqual(index.lookup("missing"), ())
+        index.close()
+
+    def test_lookup_is_built_once(self):
+        index = CondaIndex.from_repodata(REPODATA)
+        first = index.lookup("numpy")
+        self.assertIs(index.lookup("numpy"), first)
+        index.close()
+
+    def test_lookup_memo_is_bounded(self):
+        index = CondaIndex.from_repodata(REPODATA, memo_size=1)
+        numpy = index.lookup("numpy")
+        self.assertIs(index.lookup("numpy"), numpy)
+
+        # Looking up another name evicts the least recently used one
+        index.lookup("scipy")
+        self.assertEqual(list(index._by_name), ["scipy"])
+        self.assertIsNot(index.lookup("numpy"), numpy)
+        self.assertEqual(index.lookup("numpy"), numpy)
+        index.close()
+
+    def test_lookup_without_memo(self):
+        index = CondaIndex.from_repodata(REPODATA, memo_size=0)
+        first = index.lookup("numpy")
+        self.assertIsNot(index.lookup("numpy"), first)
+        self.assertEqual(index.lookup("numpy"), first)
+        self.assertEqual(index._by_name, {})
+        index.close()
+
+    def test_open_is_memory_mapped(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "index.sqlite")
+            CondaIndex.build(path, []).close()
+
+            index = CondaIndex.open(path)
+            (mmap_size,) = index._connection.execute("PRAGMA mmap_size").fetchone()
+            self.assertEqual(mmap_size, CondaIndex.MMAP_SIZE)
+            index.close()
+
+    def test_lookup_interns_strings(self):
+        index = CondaIndex.from_repodata(REPODATA)
+        (_, old), (_, new) = index.lookup("numpy")[::-1]
+        self.assertIs(old["license"], new["license"])
+        self.assertIs(old["name"], new["name"])
+        index.close()
+
+    def test_records_are_compressed(self):
+        index = CondaIndex.from_repodata(REPODATA)
+        (record,) = index._connection.execute(
+            "SELECT record FROM packages WHERE filename = 'scipy-1.2-0.tar.bz2'"
+        ).fetchone()
+        self.assertIsInstance(record, bytes)
+        self.assertEqual(
+            json.loads(zlib.decompress(record)), REPODATA["packages"]["scipy-1.2-0.tar.bz2"]
+        )
+        index.close()
+
+    def test_build_and_open(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "index.sqlite")
+            records = iter_repodata_records(io.StringIO(json.dumps(REPODATA)))
+            CondaIndex.build(path, records).close()
+            self.assertEqual(os.listdir(tmpdir), ["index.sqlite"])
+
+            index = CondaIndex.open(path)
+            self.assertEqual(
+                index.lookup("scipy"),
+                (("scipy-1.2-0.tar.bz2", REPODATA["packages"]["scipy-1.2-0.tar.bz2"]),),
+            )
+            index.close()
+
+    def test_build_failure_leaves_no_index(self):
+        def records():
+            yield "numpy-1.0-0.tar.bz2", {"name": "numpy"}
+            raise ValueError("broken stream")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "index.sqlite")
+            with self.assertRaises(ValueError):
+                CondaIndex.build(path, records())
+            self.assertEqual(os.listdir(tmpdir), [])
+
+    def test_open_rejects_other_schema(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "index.sqlite")
+            CondaIndex.build(path, []).close()
+
+            connection = sqlite3.connect(path)
+            connection.execute("PRAGMA user_version = 0")
+            connection.commit()
+            connection.close()
+
+            with self.assertRaises(ValueError):
+                CondaIndex.open(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import random
+import unittest
+
+from superbom.utils.packageindexes.conda.condaversion import VersionOrder, VersionSpec
+
+# In ascending conda version order
+ORDERED_VERSIONS = [
+    "0.4",
+    "0.4.post1",
+    "0.4.1.rc",
+    "0.4.1",
+    "0.5a1",
+    "0.5b3",
+    "0.5c1",
+    "0.5",
+    "0.9.6",
+    "0.960923",
+    "1.0dev1",
+    "1.0a1",
+    "1.0",
+    "1.0post1",
+    "1.1dev1",
+    "1.1_",
+    "1.1a1",
+    "1.1",
+    "1.1.post1",
+    "1.2",
+    "1.2.1",
+    "1.10",
+    "9.0",
+    "10.0",
+    "11.2.0",
+    "1!0.1",
+]
+
+
+class TestVersionOrder(unittest.TestCase):
+    def test_ordering(self):
+        versions = ORDERED_VERSIONS[:]
+        random.Random(0).shuffle(versions)
+        self.assertEqual(sorted(versions, key=VersionOrder), ORDERED_VERSIONS)
+
+    def test_equality(self):
+        self.assertEqual(VersionOrder("1.0"), VersionOrder("1.0.0"))
+        self.assertEqual(hash(VersionOrder("1.0")), hash(VersionOrder("1.0.0")))
+        self.assertEqual(VersionOrder("1.0-1"), VersionOrder("1.0_1"))
+        self.assertNotEqual(VersionOrder("1.0"), VersionOrder("1.0a"))
+        self.assertEqual(VersionOrder("1.1.post1"), VersionOrder("1.1.0post1"))
+        self.assertEqual(hash(VersionOrder("1.1.post1")), hash(VersionOrder("1.1.0post1")))
+        self.assertLess(VersionOrder("0.4.post1"), VersionOrder("0.4.1"))
+        self.assertLess(VersionOrder("2.0.post1"), VersionOrder("2.0.10"))
+        self.assertEqual(VersionOrder("1.0.1_"), VersionOrder("1.0_1_"))
+        self.assertNotEqual(VersionOrder("1.0.1_"), VersionOrder("1.0.1"))
+
+    def test_startswith(self):
+        self.assertTrue(VersionOrder("1.2.5").startswith(VersionOrder("1.2")))
+        self.assertTrue(VersionOrder("1.2").startswith(VersionOrder("1.2")))
+        self.assertFalse(VersionOrder("1.20").startswith(VersionOrder("1.2")))
+        self.assertFalse(VersionOrder("11.2.0").startswith(VersionOrder("1.2")))
+
+
+class TestVersionSpec(unittest.TestCase):
+    def setUp(self):
+        self.keys = [VersionOrder(v) for v in ORDERED_VERSIONS]
+
+    def select(self, spec):
+        return [self.keys[i].source for i in VersionSpec(spec).select(self.keys)]
+
+    def test_exact(self):
+        self.assertEqual(self.select("1.2"), ["1.2"])
+        self.assertEqual(self.select("==1.0.0"), ["1.0"])
+
+    def test_prefix(self):
+        self.assertEqual(self.select("=1.2"), ["1.2", "1.2.1"])
+        self.assertEqual(self.select("1.2.*"), ["1.2", "1.2.1"])
+        self.assertEqual(self.select("1.1*"), ["1.1dev1", "1.1_", "1.1a1", "1.1", "1.1.post1"])
+
+    def test_ranges(self):
+        self.assertEqual(self.select(">=10"), ["10.0", "11.2.0", "1!0.1"])
+        self.assertEqual(self.select(">1.2,<9"), ["1.2.1", "1.10"])
+        self.assertEqual(self.select("<=0.4.1"), ["0.4", "0.4.post1", "0.4.1.rc", "0.4.1"])
+        self.assertEqual(self.select("~=1.0.0"), ["1.0", "1.0post1"])
+
+    def test_not_equal_and_or(self):
+        self.assertNotIn("1.2", self.select("!=1.2"))
+        self.assertEqual(len(self.select("!=1.2")), len(ORDERED_VERSIONS) - 1)
+        self.assertEqual(self.select("1.0|10.0"), ["1.0", "10.0"])
+        self.assertEqual(self.select("*"), ORDERED_VERSIONS)
+
+    def test_select_matches_linear_scan(self):
+        for spec in ("=1", ">=0.5,<1.1", "0.5|>=10", "!=1.*", "1.0*,>1.0"):
+            version_spec = VersionSpec(spec)
+            expected = [k.source for k in self.keys if version_spec.match(k)]
+            self.assertEqual(self.select(spec), expected, spec)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from superbom.utils.filelock import FileLock, part_path
+
+
+class TestFileLock(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.lock_file = os.path.join(tmpdir.name, "entry.lock")
+
+    def test_acquire_and_release(self):
+        with FileLock(self.lock_file) as lock:
+            self.assertFalse(lock.waited)
+            with open(self.lock_file) as f:
+                self.assertEqual(f.read(), str(os.getpid()))
+        self.assertFalse(os.path.exists(self.lock_file))
+
+    def test_waits_for_holder(self):
+        holder = FileLock(self.lock_file).acquire()
+        threading.Timer(0.2, holder.release).start()
+
+        start = time.monotonic()
+        with FileLock(self.lock_file) as lock:
+            self.assertTrue(lock.waited)
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_timeout(self):
+        with FileLock(self.lock_file):
+            with self.assertRaises(TimeoutError):
+                FileLock(self.lock_file, timeout=0.2).acquire()
+
+    def test_breaks_stale_lock(self):
+        with open(self.lock_file, "w") as f:
+            f.write("99999")
+        old = time.time() - 3600
+        os.utime(self.lock_file, (old, old))
+
+        with FileLock(self.lock_file, stale=60, timeout=1) as lock:
+            self.assertTrue(lock.waited)
+            with open(self.lock_file) as f:
+                self.assertEqual(f.read(), str(os.getpid()))
+
+    def test_part_path_is_unique_per_thread(self):
+        paths = {part_path("cache.sqlite")}
+        thread = threading.Thread(target=lambda: paths.add(part_path("cache.sqlite")))
+        thread.start()
+        thread.join()
+        self.assertEqual(len(paths), 2)
+        self.assertTrue(
+            all(path.startswith("cache.sqlite.") and path.endswith(".part") for path in paths)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from helpers import CacheTestCase, response
+
+from superbom.utils import githubcache, githubutils, negativecache
+from superbom.utils.githubcache import LICENSE, REPOSITORY, GitHubCache
+from superbom.utils.negativecache import NegativeCache
+
+
+def _search_results(*names):
+    return {
+        "items": [{"name": name, "html_url": f"https://github.com/owner/{name}"} for name in names]
+    }
+
+
+class GitHubCacheTestCase(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = self.open_store(GitHubCache(cache_dir=self.cache_dir))
+        self.enterContext(githubcache.using(self.cache))
+        self.enterContext(negativecache.using(self.open_store(NegativeCache(self.cache_dir))))
+
+    def _expire(self, kind):
+        # Everything fetched so far is past its TTL
+        return patch(
+            "superbom.utils.githubcache.time.time",
+            return_value=time.time() + self.cache.ttls[kind] + 1,
+        )
+
+
+class TestGitHubCache(GitHubCacheTestCase):
+    def test_fresh_entry_is_served_locally(self):
+        fetch = MagicMock()
+        self.assertEqual(self.cache.get(REPOSITORY, "pkg", fetch), (False, None))
+
+        self.cache.put(REPOSITORY, "pkg", "https://github.com/owner/pkg")
+        self.assertEqual(
+            self.cache.get(REPOSITORY, "pkg", fetch), (True, "https://github.com/owner/pkg")
+        )
+        self.assertEqual(self.cache.get(LICENSE, "pkg", fetch), (False, None))
+        fetch.assert_not_called()
+
+    def test_persists_across_runs(self):
+        self.cache.put(LICENSE, "owner/repo", "MIT")
+
+        other = self.open_store(GitHubCache(cache_dir=self.cache_dir))
+        self.assertEqual(other.get(LICENSE, "owner/repo", MagicMock()), (True, "MIT"))
+
+        refreshed = self.open_store(GitHubCache(cache_dir=self.cache_dir, refresh=True))
+        self.assertEqual(refreshed.get(LICENSE, "owner/repo", MagicMock()), (False, None))
+
+    def test_stale_entry_is_refreshed_in_the_background(self):
+        self.cache.put(LICENSE, "owner/repo", "MIT")
+        fetch = MagicMock(return_value=(True, "Apache-2.0", None))
+
+        with self._expire(LICENSE):
+            self.assertEqual(self.cache.get(LICENSE, "owner/repo", fetch), (True, "MIT"))
+        self.cache.wait()
+
+        fetch.assert_called_once_with("owner/repo", None)
+        self.assertEqual(self.cache.get(LICENSE, "owner/repo", fetch), (True, "Apache-2.0"))
+        self.assertTrue(self.cache.is_fresh(LICENSE, "owner/repo"))
+
+    def test_failed_refresh_keeps_the_entry(self):
+        self.cache.put(LICENSE, "owner/repo", "MIT")
+
+        with self._expire(LICENSE):
+            self.cache.get(LICENSE, "owner/repo", MagicMock(return_value=(False, None, None)))
+            self.cache.get(LICENSE, "owner/repo", MagicMock(side_effect=RuntimeError("offline")))
+            self.cache.wait()
+            self.assertEqual(self.cache.get(LICENSE, "owner/repo", MagicMock()), (True, "MIT"))
+        self.cache.wait()
+
+    def test_definite_miss_deletes_the_entry(self):
+        self.cache.put(REPOSITORY, "pkg", "https://github.com/owner/pkg")
+
+        with self._expire(REPOSITORY):
+            self.cache.get(REPOSITORY, "pkg", MagicMock(return_value=(True, None, None)))
+        self.cache.wait()
+
+        self.assertEqual(self.cache.get(REPOSITORY, "pkg", MagicMock()), (False, None))
+
+    def test_stale_entry_is_revalidated_with_its_etag(self):
+        self.cache.put(LICENSE, "owner/repo", "MIT", '"abc"')
+        fetch = MagicMock(return_value=(True, githubcache.NOT_MODIFIED, None))
+
+        with self._expire(LICENSE):
+            self.assertEqual(self.cache.get(LICENSE, "owner/repo", fetch), (True, "MIT"))
+        self.cache.wait()
+
+        fetch.assert_called_once_with("owner/repo", '"abc"')
+        self.assertTrue(self.cache.is_fresh(LICENSE, "owner/repo"))
+        self.assertEqual(self.cache.get(LICENSE, "owner/repo", fetch), (True, "MIT"))
+
+        # A refresh still sends the ETag of the entry it ignores
+        refreshed = self.open_store(GitHubCache(cache_dir=self.cache_dir, refresh=True))
+        self.assertEqual(refreshed.revalidate(LICENSE, "owner/repo", fetch), (True, "MIT"))
+        self.assertEqual(fetch.call_args_list[-1].args, ("owner/repo", '"abc"'))
+
+    def test_ttl_per_kind(self):
+        self.cache.put(REPOSITORY, "pkg", "https://github.com/owner/pkg")
+        self.cache.put(LICENSE, "owner/pkg", "MIT")
+
+        with self._expire(LICENSE):
+            self.assertTrue(self.cache.is_fresh(REPOSITORY, "pkg"))
+            self.assertFalse(self.cache.is_fresh(LICENSE, "owner/pkg"))
+
+
+class TestGitHubUtilsCache(GitHubCacheTestCase):
+    @patch("superbom.utils.httpclient.get")
+    def test_search_is_cached(self, mock_get):
+        mock_get.return_value = response(200, _search_results("cached-pkg"))
+
+        self.assertEqual(githubutils._search("cached-pkg"), "https://github.com/owner/cached-pkg")
+        self.assertEqual(githubutils._search("cached-pkg"), "https://github.com/owner/cached-pkg")
+        mock_get.assert_called_once()
+
+        other = self.open_store(GitHubCache(cache_dir=self.cache_dir))
+        with githubcache.using(other):
+            self.assertEqual(
+                githubutils._search("cached-pkg"), "https://github.com/owner/cached-pkg"
+            )
+        mock_get.assert_called_once()
+
+    @patch("superbom.utils.httpclient.get")
+    def test_search_without_match_is_not_cached(self, mock_get):
+        mock_get.return_value = response(200, _search_results("other"))
+
+        self.assertIsNone(githubutils._search("unknown-pkg"))
+        self.assertEqual(self.cache.get(REPOSITORY, "unknown-pkg", MagicMock()), (False, None))
+
+    @patch("superbom.utils.httpclient.get")
+    @patch("superbom.utils.githubutils.checklicense", side_effect=lambda license: (True, license))
+    def test_license_is_cached(self, _, mock_get):
+        mock_get.return_value = response(200, {"license": {"spdx_id": "MIT"}})
+
+        with patch.dict(githubutils._licenses, clear=True):
+            self.assertEqual(
+                githubutils._lookuplicense("https://github.com/Owner/Repo"), (True, "MIT")
+            )
+            self.assertEqual(
+                githubutils._lookuplicense("https://github.com/owner/repo"), (True, "MIT")
+            )
+        mock_get.assert_called_once()
+        self.assertTrue(self.cache.is_fresh(LICENSE, "owner/repo"))
+
+    @patch("superbom.utils.httpclient.get")
+    @patch("superbom.utils.githubutils.checklicense", side_effect=lambda license: (True, license))
+    def test_stale_license_is_refreshed_in_the_background(self, _, mock_get):
+        self.cache.put(LICENSE, "owner/repo", "MIT")
+        mock_get.return_value = response(200, {"license": {"spdx_id": "Apache-2.0"}})
+
+        with patch.dict(githubutils._licenses, clear=True), self._expire(LICENSE):
+            self.assertEqual(
+                githubutils._lookuplicense("https://github.com/owner/repo"), (True, "MIT")
+            )
+        self.cache.wait()
+
+        self.assertEqual(self.cache.get(LICENSE, "owner/repo", MagicMock()), (True, "Apache-2.0"))
+
+    @patch("superbom.utils.httpclient.get")
+    @patch("superbom.utils.githubutils.checklicense", side_effect=lambda license: (True, license))
+    def test_stale_license_is_revalidated_with_its_etag(self, _, mock_get):
+        mock_get.return_value = response(200, {"license": {"spdx_id": "MIT"}}, ETag='"abc"')
+
+        with patch.dict(githubutils._licenses, clear=True):
+            githubutils._lookuplicense("https://github.com/owner/repo")
+            mock_get.return_value = response(304)
+            with self._expire(LICENSE):
+                self.assertEqual(
+                    githubutils._lookuplicense("https://github.com/owner/repo"), (True, "MIT")
+                )
+            self.cache.wait()
+
+        self.assertEqual(mock_get.call_args.kwargs["headers"]["If-None-Match"], '"abc"')
+        self.assertTrue(self.cache.is_fresh(LICENSE, "owner/repo"))
+        self.assertEqual(self.cache.get(LICENSE, "owner/repo", MagicMock()), (True, "MIT"))
+
+    def test_fresh_licenses_are_not_prefetched(self):
+        self.cache.put(LICENSE, "owner/repo", "MIT")
+        client = MagicMock(token="token")
+
+        with patch("superbom.utils.githubclient._client", client), patch.dict(
+            githubutils._licenses, clear=True
+        ):
+            self.assertEqual(githubutils.prefetch_licenses(["https://github.com/owner/repo"]), 0)
+        client.graphql.assert_not_called()
+
+    def test_prefetched_licenses_are_cached(self):
+        client = MagicMock(token="token")
+        client.graphql.return_value = (
+            200,
+            {
+                "data": {"r0": {"licenseInfo": {"spdxId": "MIT"}}, "r1": None},
+                "errors": [{"type": "NOT_FOUND", "path": ["r1"]}],
+            },
+        )
+        self.cache.put(LICENSE, "owner/gone", "MIT")
+
+        with self._expire(LICENSE), patch(
+            "superbom.utils.githubclient._client", client
+        ), patch.dict(githubutils._licenses, clear=True):
+            urls = ["https://github.com/owner/repo", "https://github.com/owner/gone"]
+            self.assertEqual(githubutils.prefetch_licenses(urls), 2)
+
+        self.assertEqual(self.cache.get(LICENSE, "owner/repo", MagicMock()), (True, "MIT"))
+        self.assertEqual(self.cache.get(LICENSE, "owner/gone", MagicMock()), (False, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import time
+import unittest
+from unittest.mock import patch
+
+from helpers import response
+
+from superbom.utils.githubclient import API_URL, GitHubClient
+
+
+def _quota(remaining, reset_in=60, resource=None):
+    headers = {
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(int(time.time() + reset_in)),
+    }
+    if resource:
+        headers["X-RateLimit-Resource"] = resource
+    return headers
+
+
+@patch("superbom.utils.githubclient.time.sleep")
+@patch("superbom.utils.httpclient.get")
+class TestGitHubClient(unittest.TestCase):
+    def test_token_from_environment(self, mock_get, mock_sleep):
+        mock_get.return_value = response(200, {})
+        with patch.dict("os.environ", {"GITHUB_TOKEN": "", "GH_TOKEN": "secret"}):
+            client = GitHubClient()
+        client.get_json("/repos/owner/repo/license")
+
+        url = mock_get.call_args.args[0]
+        headers = mock_get.call_args.kwargs["headers"]
+        self.assertEqual(url, f"{API_URL}/repos/owner/repo/license")
+        self.assertEqual(headers["Authorization"], "Bearer secret")
+
+        with patch.dict("os.environ", {"GITHUB_TOKEN": "", "GH_TOKEN": ""}):
+            self.assertNotIn("Authorization", GitHubClient().headers)
+
+    def test_waits_for_reset_when_quota_is_used_up(self, mock_get, mock_sleep):
+        client = GitHubClient(token="")
+        mock_get.return_value = response(200, {}, **_quota(2, reset_in=30))
+        client.get_json("/repos/a/b/license")
+        self.assertEqual(client.remaining("core"), 2)
+
+        # The remaining quota is reserved locally before every call
+        mock_get.return_value = response(200, {})
+        client.get_json("/repos/a/c/license")
+        client.get_json("/repos/a/d/license")
+        mock_sleep.assert_not_called()
+        self.assertEqual(client.remaining("core"), 0)
+
+        def reset(seconds):
+            client._quotas["core"] = (0, time.time() - 1)
+
+        mock_sleep.side_effect = reset
+        client.get_json("/repos/a/e/license")
+        mock_sleep.assert_called_once()
+        self.assertAlmostEqual(mock_sleep.call_args.args[0], 31, delta=2)
+        self.assertEqual(mock_get.call_count, 4)
+
+    def test_resources_are_tracked_separately(self, mock_get, mock_sleep):
+        client = GitHubClient(token="")
+        mock_get.return_value = response(200, {"items": []}, **_quota(0, resource="search"))
+        client.get_json("/search/repositories?q=foo")
+
+        mock_get.return_value = response(200, {})
+        client.get_json("/repos/a/b/license")
+        mock_sleep.assert_not_called()
+        self.assertEqual(client.remaining("search"), 0)
+
+    def test_retries_primary_rate_limit(self, mock_get, mock_sleep):
+        client = GitHubClient(token="")
+        mock_get.side_effect = [
+            response(403, **_quota(0, reset_in=10)),
+            response(200, {"ok": 1}),
+        ]
+        mock_sleep.side_effect = lambda seconds: client._quotas.clear()
+
+        self.assertEqual(client.get_json("/repos/a/b/license"), (200, {"ok": 1}))
+        mock_sleep.assert_called_once()
+
+    def test_retries_secondary_rate_limit(self, mock_get, mock_sleep):
+        client = GitHubClient(token="")
+        mock_get.side_effect = [response(403, **{"Retry-After": "3"}), response(200, {"ok": 1})]
+
+        self.assertEqual(client.get_json("/repos/a/b/license"), (200, {"ok": 1}))
+        mock_sleep.assert_called_once_with(3)
+
+    def test_other_errors_are_returned(self, mock_get, mock_sleep):
+        client = GitHubClient(token="")
+        mock_get.return_value = response(403)
+        self.assertEqual(client.get_json("/repos/a/b/license"), (403, None))
+        mock_get.return_value = response(404)
+        self.assertEqual(client.get_json("/repos/a/b/license"), (404, None))
+        self.assertEqual(mock_get.call_count, 2)
+
+    def test_gives_up_beyond_max_wait(self, mock_get, mock_sleep):
+        client = GitHubClient(token="", max_wait=60)
+        client._quotas["core"] = (0, time.time() + 3600)
+
+        self.assertEqual(client.get_json("/repos/a/b/license"), (429, None))
+        mock_get.assert_not_called()
+        mock_sleep.assert_not_called()
+
+    def test_conditional_requests(self, mock_get, mock_sleep):
+        client = GitHubClient(token="")
+        mock_get.return_value = response(200, {"license": None}, ETag='"abc"')
+        client.get_json("/repos/a/b/license")
+
+        mock_get.return_value = response(304, **_quota(10))
+        self.assertEqual(client.get_json("/repos/a/b/license"), (200, {"license": None}))
+        self.assertEqual(mock_get.call_args.kwargs["headers"]["If-None-Match"], '"abc"')
+
+    def test_caller_cached_conditional_requests(self, mock_get, mock_sleep):
+        client = GitHubClient(token="")
+        mock_get.return_value = response(200, {"license": None}, ETag='"abc"')
+        self.assertEqual(
+            client.get_json_conditional("/repos/a/b/license"), (200, {"license": None}, '"abc"')
+        )
+        self.assertNotIn("If-None-Match", mock_get.call_args.kwargs["headers"])
+
+        mock_get.return_value = response(304)
+        self.assertEqual(
+            client.get_json_conditional("/repos/a/b/license", '"abc"'), (304, None, None)
+        )
+        self.assertEqual(mock_get.call_args.kwargs["headers"]["If-None-Match"], '"abc"')
+        # The response is left to the caller
+        self.assertEqual(len(client._etags), 0)
+
+    def test_etag_cache_is_bounded(self, mock_get, mock_sleep):
+        client = GitHubClient(token="")
+        client.MAX_ETAGS = 2
+        for repo in "abc":
+            mock_get.return_value = response(200, {}, ETag=repo)
+            client.get_json(f"/repos/a/{repo}/license")
+        self.assertEqual(
+            list(client._etags), [f"{API_URL}/repos/a/b/license", f"{API_URL}/repos/a/c/license"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
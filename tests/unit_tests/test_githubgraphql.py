@@ -0,0 +1,168 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import json
+import re
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from superbom.utils import githubclient, githubutils
+from superbom.utils.githubclient import GitHubClient
+from superbom.utils.packageindexes.pypi.pipdependencies import PyPIPackageUtil
+from superbom.utils.parsers import Dependency
+
+_REPOSITORY = re.compile(r'(r\d+): repository\(owner: "([^"]*)", name: "([^"]*)"\)')
+
+
+class _GraphQLHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server.requests.append((self.path, self.headers.get("Authorization"), body["query"]))
+
+        data, errors = {}, []
+        for alias, owner, name in _REPOSITORY.findall(body["query"]):
+            key = f"{owner}/{name}"
+            if key not in server.repositories:
+                data[alias] = None
+                errors.append({"type": "NOT_FOUND", "path": [alias], "message": "Not found"})
+            else:
+                spdx_id = server.repositories[key]
+                data[alias] = {"licenseInfo": {"spdxId": spdx_id} if spdx_id else None}
+
+        payload = json.dumps(
+            {"data": data, "errors": errors} if errors else {"data": data}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestGraphQLLicenses(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _GraphQLHandler)
+        self.server.requests = []
+        self.server.repositories = {f"org/repo{i}": "MIT" for i in range(120)}
+        self.server.repositories["org/unlicensed"] = None
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.client = GitHubClient(
+            token="secret", api_url=f"http://127.0.0.1:{self.server.server_port}"
+        )
+        for context in (
+            patch.object(githubclient, "_client", self.client),
+            patch.dict(githubutils._licenses, clear=True),
+            patch(
+                "superbom.utils.githubutils.checklicense", side_effect=lambda spdx: (True, spdx)
+            ),
+        ):
+            context.start()
+            self.addCleanup(context.stop)
+
+    def test_batches_repositories(self):
+        urls = [f"https://github.com/org/repo{i}" for i in range(120)]
+        # Duplicates are only looked up once
+        self.assertEqual(githubutils.prefetch_licenses(urls + urls[:10]), 120)
+
+        self.assertEqual(len(self.server.requests), 3)
+        path, authorization, query = self.server.requests[0]
+        self.assertEqual(path, "/graphql")
+        self.assertEqual(authorization, "Bearer secret")
+        self.assertEqual(len(_REPOSITORY.findall(query)), githubutils.BATCH_SIZE)
+
+        with patch("superbom.utils.httpclient.get") as mock_get:
+            self.assertEqual(
+                githubutils._lookuplicense("https://github.com/Org/Repo7"), (True, "MIT")
+            )
+            mock_get.assert_not_called()
+
+        # Resolved repositories are not queried again
+        githubutils.prefetch_licenses(urls)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_missing_repositories_and_licenses(self):
+        githubutils.prefetch_licenses(
+            [
+                "https://github.com/org/unlicensed",
+                "https://github.com/org/missing",
+                "https://pypi.org/x",
+            ]
+        )
+        self.assertEqual(githubutils._licenses, {"org/unlicensed": None, "org/missing": None})
+
+        with patch("superbom.utils.httpclient.get") as mock_get:
+            self.assertEqual(
+                githubutils._lookuplicense("https://github.com/org/missing"), (False, None)
+            )
+            mock_get.assert_not_called()
+
+    def test_failed_batch_falls_back_to_rest(self):
+        with patch(
+            "superbom.utils.httpclient.post", return_value=MagicMock(status_code=502, headers={})
+        ):
+            self.assertEqual(githubutils.prefetch_licenses(["https://github.com/org/repo1"]), 0)
+        self.assertEqual(githubutils._licenses, {})
+        self.assertEqual(self.server.requests, [])
+
+    def test_connection_error_falls_back_to_rest(self):
+        with patch(
+            "superbom.utils.httpclient.post", side_effect=requests.ConnectionError("timed out")
+        ):
+            self.assertEqual(githubutils.prefetch_licenses(["https://github.com/org/repo1"]), 0)
+        self.assertEqual(githubutils._licenses, {})
+
+    def test_requires_token(self):
+        self.client.token = None
+        self.assertEqual(githubutils.prefetch_licenses(["https://github.com/org/repo1"]), 0)
+        self.assertEqual(self.server.requests, [])
+
+
+class TestResolverBatchesGitHubLookups(unittest.TestCase):
+    @patch("superbom.utils.packageindexes.pypi.pipdependencies.githubutils.prefetch_licenses")
+    def test_collects_every_pending_repository(self, mock_prefetch):
+        licensed = {"name": "a", "version": "1", "license": "MIT"}
+        unlicensed = {
+            "name": "b",
+            "version": "1",
+            "project_urls": {"Source": "https://github.com/org/b/"},
+        }
+        cache = MagicMock()
+        cache.get.side_effect = lambda name, version=None: licensed if name == "a" else unlicensed
+
+        util = PyPIPackageUtil(cache)
+        with patch(
+            "superbom.utils.packageindexes.pypi.pypiutils.checklicense", return_value=(True, "MIT")
+        ), patch(
+            "superbom.utils.packageindexes.pypi.pypiutils.githubutils.get_license",
+            return_value=(True, "Apache-2.0"),
+        ) as mock_get_license:
+            results = util.get_pip_packages_data(
+                [
+                    Dependency.create_dependency("a", "==1"),
+                    Dependency.create_dependency("b", "==1"),
+                ]
+            )
+
+        self.assertEqual(list(mock_prefetch.call_args.args[0]), ["https://github.com/org/b"])
+        self.assertEqual([row["Package"] for row in results], ["a", "b"])
+        # Metadata is looked up once per package
+        self.assertEqual(cache.get.call_count, 2)
+        mock_get_license.assert_called_once_with("https://github.com/org/b")
+
+
+if __name__ == "__main__":
+    unittest.main()
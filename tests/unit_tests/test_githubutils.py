@@ -1,15 +1,14 @@
 import unittest
 from unittest.mock import patch
+
 from superbom.utils.githubutils import _search, get_license
 
-class TestGithubUtils(unittest.TestCase):
 
-    @patch('superbom.utils.githubutils.requests.get')
+class TestGithubUtils(unittest.TestCase):
+    @patch("superbom.utils.httpclient.get")
     def test_search_valid_repo(self, mock_get):
         mock_response = {
-            "items": [
-                {"name": "testrepo", "html_url": "https://github.com/testuser/testrepo"}
-            ]
+            "items": [{"name": "testrepo", "html_url": "https://github.com/testuser/testrepo"}]
         }
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.return_value = mock_response
@@ -17,7 +16,7 @@ class TestGithubUtils(unittest.TestCase):
         result = _search("testrepo")
         self.assertEqual(result, "https://github.com/testuser/testrepo")
 
-    @patch('superbom.utils.githubutils.requests.get')
+    @patch("superbom.utils.httpclient.get")
     def test_search_invalid_repo(self, mock_get):
         mock_response = {"items": []}
         mock_get.return_value.status_code = 200
@@ -26,23 +25,21 @@ class TestGithubUtils(unittest.TestCase):
         result = _search("nonexistentrepo")
         self.assertIsNone(result)
 
-    @patch('superbom.utils.githubutils.requests.get')
+    @patch("superbom.utils.httpclient.get")
     def test_search_python_repo(self, mock_get):
         result = _search("python")
         self.assertIsNone(result)
 
-    @patch('superbom.utils.githubutils.requests.get')
+    @patch("superbom.utils.httpclient.get")
     def test_search_api_failure(self, mock_get):
         mock_get.return_value.status_code = 500
 
         result = _search("testrepo")
         self.assertIsNone(result)
 
-    @patch('superbom.utils.githubutils.requests.get')
+    @patch("superbom.utils.httpclient.get")
     def test_get_license_valid_repo(self, mock_get):
-        mock_response = {
-            "license": {"spdx_id": "Apache-2.0"}
-        }
+        mock_response = {"license": {"spdx_id": "Apache-2.0"}}
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.return_value = mock_response
 
@@ -50,7 +47,7 @@ class TestGithubUtils(unittest.TestCase):
         self.assertTrue(result)
         self.assertEqual(license, "Apache-2.0")
 
-    @patch('superbom.utils.githubutils.requests.get')
+    @patch("superbom.utils.httpclient.get")
     def test_get_license_invalid_repo(self, mock_get):
         # mock_response = {
         #     "license": {"spdx_id": "Apache-2.0"}
@@ -62,5 +59,6 @@ class TestGithubUtils(unittest.TestCase):
         self.assertFalse(result)
         self.assertIsNone(license)
 
-if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+
+if __name__ == "__main__":
+    unittest.main()
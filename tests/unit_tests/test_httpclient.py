@@ -0,0 +1,93 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from superbom.utils import httpclient
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.clients.append(self.client_address)
+        status, headers = server.responses.pop(0) if server.responses else (200, {})
+
+        body = b"ok" if status == 200 else b""
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.responses = []
+        self.server.clients = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        # No real waiting between retries in tests
+        with patch.object(httpclient, "BACKOFF_FACTOR", 0), patch.object(
+            httpclient, "BACKOFF_JITTER", 0
+        ):
+            self.session = httpclient.create_session()
+        self.addCleanup(self.session.close)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def test_retries_server_errors(self):
+        self.server.responses = [(503, {"Retry-After": "0"}), (502, {}), (200, {})]
+        response = self.session.get(self.url, timeout=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.clients), 3)
+
+    def test_honors_retry_after(self):
+        self.server.responses = [(429, {"Retry-After": "1"}), (200, {})]
+        with patch("urllib3.util.retry.time.sleep") as mock_sleep:
+            response = self.session.get(self.url, timeout=5)
+        self.assertEqual(response.status_code, 200)
+        mock_sleep.assert_any_call(1.0)
+
+    def test_returns_last_response_when_retries_run_out(self):
+        self.server.responses = [(500, {})] * (httpclient.MAX_RETRIES + 1)
+        with patch("urllib3.util.retry.time.sleep"):
+            response = self.session.get(self.url, timeout=5)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(len(self.server.clients), httpclient.MAX_RETRIES + 1)
+
+    def test_does_not_retry_client_errors(self):
+        self.server.responses = [(404, {})]
+        self.assertEqual(self.session.get(self.url, timeout=5).status_code, 404)
+        self.assertEqual(len(self.server.clients), 1)
+
+    def test_reuses_connections(self):
+        self.session.get(self.url, timeout=5)
+        self.session.get(self.url, timeout=5)
+        self.assertEqual(self.server.clients[0], self.server.clients[1])
+
+    def test_get_uses_shared_session_and_default_timeout(self):
+        with patch.object(httpclient, "_session", None), patch.object(
+            httpclient.requests.Session, "get"
+        ) as mock_get:
+            httpclient.get(self.url)
+            httpclient.get(self.url, timeout=1)
+            self.assertIs(httpclient.session(), httpclient.session())
+
+        self.assertEqual(mock_get.call_args_list[0].kwargs["timeout"], httpclient.DEFAULT_TIMEOUT)
+        self.assertEqual(mock_get.call_args_list[1].kwargs["timeout"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
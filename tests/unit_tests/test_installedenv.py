@@ -0,0 +1,147 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from superbom.utils.packageindexes.pypi.installedenv import (
+    InstalledEnvironment,
+    site_packages,
+)
+from superbom.utils.packageindexes.pypi.pipdependencies import PyPIPackageUtil
+from superbom.utils.parsers import Dependency
+
+
+def _install(site, name, version, *headers):
+    dist_info = Path(site, f"{name}-{version}.dist-info")
+    dist_info.mkdir(parents=True)
+    lines = ["Metadata-Version: 2.4", f"Name: {name}", f"Version: {version}", *headers]
+    dist_info.joinpath("METADATA").write_text("\n".join(lines) + "\n")
+
+
+class TestInstalledEnvironment(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.venv = Path(tmp.name, "venv")
+        self.site = self.venv / "lib" / "python3.11" / "site-packages"
+        _install(
+            self.site,
+            "Foo_Bar",
+            "1.2.0",
+            "License-Expression: MIT",
+            "Classifier: License :: OSI Approved :: MIT License",
+            "Project-URL: Source, https://github.com/example/foo",
+            "Home-page: https://example.com",
+        )
+        _install(self.site, "legacy", "0.1", "License: BSD")
+
+    def test_site_packages(self):
+        self.assertEqual(site_packages(self.venv), [str(self.site)])
+        self.assertEqual(site_packages(self.site), [str(self.site)])
+
+    def test_get(self):
+        environment = InstalledEnvironment(self.venv)
+        self.assertEqual(
+            environment.get("foo-bar"),
+            {
+                "name": "Foo_Bar",
+                "version": "1.2.0",
+                "license_expression": "MIT",
+                "license": None,
+                "classifiers": ["License :: OSI Approved :: MIT License"],
+                "project_urls": {
+                    "Source": "https://github.com/example/foo",
+                    "Homepage": "https://example.com",
+                },
+            },
+        )
+        self.assertEqual(environment.get("Legacy")["license"], "BSD")
+        self.assertIsNone(environment.get("missing"))
+
+    def test_packages(self):
+        packages = InstalledEnvironment(self.venv).packages()
+        self.assertEqual([package.name for package in packages], ["Foo_Bar", "legacy"])
+        self.assertEqual(str(packages[0].constraint), "==1.2.0")
+
+    def test_packages_with_non_standard_versions(self):
+        _install(self.site, "snapshot", "1.2.3-SNAPSHOT")
+        packages = InstalledEnvironment(self.venv).packages()
+        self.assertEqual([package.name for package in packages], ["Foo_Bar", "legacy", "snapshot"])
+        self.assertEqual(str(packages[2].constraint), "===1.2.3-SNAPSHOT")
+
+    def test_first_distribution_on_path_wins(self):
+        _install(self.venv / "Lib" / "site-packages", "legacy", "9.9")
+        with patch(
+            "superbom.utils.packageindexes.pypi.installedenv.site_packages",
+            return_value=[str(self.site), str(self.venv / "Lib" / "site-packages")],
+        ):
+            self.assertEqual(InstalledEnvironment(self.venv).get("legacy")["version"], "0.1")
+
+    def test_name(self):
+        self.assertEqual(InstalledEnvironment(self.venv).name, "venv")
+
+
+class TestPyPIPackageUtilEnvironment(unittest.TestCase):
+    @patch("superbom.utils.httpclient.get")
+    @patch("superbom.utils.packageindexes.pypi.pipdependencies.pypiutils.get_license")
+    def test_installed_packages_skip_the_network(self, mock_get_license, mock_get):
+        mock_get_license.return_value = (True, "MIT")
+        environment = MagicMock()
+        environment.get.return_value = {"name": "foo", "version": "1.0"}
+
+        util = PyPIPackageUtil(environment=environment)
+        result = util.get_pip_package_data(Dependency.create_dependency("foo", ">=0.5"))
+
+        self.assertEqual(
+            result,
+            {
+                "Package": "foo",
+                "Version": "1.0",
+                "License": "MIT",
+                "Validated": True,
+                "Source": "installed",
+            },
+        )
+        mock_get.assert_not_called()
+
+    @patch("superbom.utils.packageindexes.pypi.pipdependencies.pypiutils.get_license")
+    def test_missing_packages_fall_back_to_pypi(self, mock_get_license):
+        mock_get_license.return_value = (True, "MIT")
+        environment = MagicMock()
+        environment.get.return_value = None
+        cache = MagicMock()
+        cache.get.return_value = {"name": "foo", "version": "2.0"}
+
+        util = PyPIPackageUtil(cache, environment=environment)
+        result = util.get_pip_package_data(Dependency.create_dependency("foo", "==2.0"))
+
+        self.assertEqual(result["Source"], "pypi")
+        cache.get.assert_called_once_with("foo", "2.0")
+
+    @patch("superbom.utils.packageindexes.pypi.pipdependencies.pypiutils.get_license")
+    def test_installed_version_outside_the_constraint_falls_back_to_pypi(self, mock_get_license):
+        mock_get_license.return_value = (True, "MIT")
+        environment = MagicMock()
+        environment.get.return_value = {"name": "foo", "version": "1.0"}
+        cache = MagicMock()
+        cache.get.return_value = {"name": "foo", "version": "2.0"}
+
+        util = PyPIPackageUtil(cache, environment=environment)
+        result = util.get_pip_package_data(Dependency.create_dependency("foo", "==2.0"))
+
+        self.assertEqual(result["Source"], "pypi")
+        self.assertEqual(result["Version"], "2.0")
+        cache.get.assert_called_once_with("foo", "2.0")
+
+        # Installed pre-releases and unconstrained packages still use the environment
+        environment.get.return_value = {"name": "foo", "version": "2.1rc1"}
+        for constraint in (">=2.0", ""):
+            result = util.get_pip_package_data(Dependency.create_dependency("foo", constraint))
+            self.assertEqual(result["Source"], "installed")
+
+
+if __name__ == "__main__":
+    unittest.main()
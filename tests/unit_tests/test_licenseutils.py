@@ -1,34 +1,43 @@
 import unittest
-from superbom.utils.licenseutils import checklicense
 from unittest.mock import patch
 
+from superbom.utils.licenseutils import checklicense
+
+
 class TestLicenseUtils(unittest.TestCase):
+    def setUp(self):
+        # Every test starts without a license database or memoized results
+        checklicense.cache_clear()
+        self.addCleanup(checklicense.cache_clear)
+        patcher = patch("superbom.utils.licenseutils._foss_licenses", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
-    @patch('superbom.utils.licenseutils.FossLicenses')
+    @patch("superbom.utils.licenseutils.FossLicenses")
     def test_checklicense_supported(self, MockFossLicenses):
         mock_instance = MockFossLicenses.return_value
         mock_instance.license_complete.return_value = {"spdxid": "MIT"}
         mock_instance.expression_compatibility_as.return_value = {
             "compat_support": {"supported": True},
-            "compat_license": "MIT"
+            "compat_license": "MIT",
         }
 
         result = checklicense("MIT")
         self.assertEqual(result, (True, "MIT"))
 
-    @patch('superbom.utils.licenseutils.FossLicenses')
+    @patch("superbom.utils.licenseutils.FossLicenses")
     def test_checklicense_not_supported(self, MockFossLicenses):
         mock_instance = MockFossLicenses.return_value
         mock_instance.license_complete.return_value = {"spdxid": "Unknown"}
         mock_instance.expression_compatibility_as.return_value = {
             "compat_support": {"supported": False},
-            "compat_license": "Unknown"
+            "compat_license": "Unknown",
         }
 
         result = checklicense("Unknown")
         self.assertEqual(result, (False, "Unknown"))
 
-    @patch('superbom.utils.licenseutils.FossLicenses')
+    @patch("superbom.utils.licenseutils.FossLicenses")
     def test_checklicense_exception(self, MockFossLicenses):
         mock_instance = MockFossLicenses.return_value
         mock_instance.license_complete.side_effect = Exception("Error")
@@ -36,5 +45,28 @@ class TestLicenseUtils(unittest.TestCase):
         result = checklicense("InvalidLicense")
         self.assertEqual(result, (False, "InvalidLicense"))
 
-if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    @patch("superbom.utils.licenseutils.FossLicenses")
+    def test_checklicense_is_memoized(self, MockFossLicenses):
+        mock_instance = MockFossLicenses.return_value
+        mock_instance.license_complete.return_value = {"spdxid": "Apache-2.0"}
+        mock_instance.expression_compatibility_as.return_value = {
+            "compat_support": {"supported": True},
+            "compat_license": "Apache-2.0",
+        }
+
+        for _ in range(3):
+            self.assertEqual(checklicense("Apache 2.0"), (True, "Apache-2.0"))
+            self.assertEqual(checklicense("Apache-2.0"), (True, "Apache-2.0"))
+
+        MockFossLicenses.assert_called_once()
+        self.assertEqual(mock_instance.license_complete.call_count, 2)
+        self.assertEqual(checklicense.cache_info().hits, 4)
+
+    @patch("superbom.utils.licenseutils.FossLicenses")
+    def test_checklicense_unhashable(self, MockFossLicenses):
+        result = checklicense(["MIT", "BSD"])
+        self.assertEqual(result, (False, ["MIT", "BSD"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
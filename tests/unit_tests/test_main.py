@@ -2,16 +2,21 @@
 # SPDX-License-Identifier: Apache 2.0
 
 import argparse
+import json
 import os
 import shutil
+import tempfile
 import unittest
 from io import StringIO
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, call, patch
 
 import pandas as pd
 
-from superbom.main import filter_by_extensions, generatebom, main, save_results
+from superbom.main import filter_by_extensions, generatebom, main, save_results, size
+from superbom.utils.packageindexes.conda.condacache import CondaCache
+from superbom.utils.packageindexes.pypi.pypicache import PyPICache
+from superbom.utils.packageindexes.pypi.pypisnapshot import PyPISnapshot
 
 
 class TestMain(unittest.TestCase):
@@ -65,6 +70,7 @@ class TestMain(unittest.TestCase):
             save_results(results, output_path, format)
             mock_to_json.assert_called_once_with("result-dependencies.csv", orient="records")
 
+    @patch("superbom.main.PyPISnapshot.open_default", new=MagicMock(return_value=None))
     @patch("superbom.main.parse_conda_env")
     @patch("superbom.main.parse_requirements")
     @patch("superbom.main.parse_poetry_toml")
@@ -79,9 +85,22 @@ class TestMain(unittest.TestCase):
         mock_parse_conda,
     ):
         mock_args = argparse.Namespace(
-            path="test_path", verbose=True, platform=None, output="output.json", format="json"
+            path="test_path",
+            verbose=True,
+            platform=None,
+            output="output.json",
+            format="json",
+            refresh=False,
+            max_age=CondaCache.DEFAULT_MAX_AGE,
+            jobs=1,
+            channel_alias=CondaCache.CHANNEL_ALIAS,
+            channel_url=None,
+            max_cache_size=None,
+            max_memory=False,
+            from_env=None,
+            negative_ttl=None,
         )
-        mock_conda_util.return_value.retrieve_conda_package_info.return_value = []
+        mock_conda_util.return_value.resolve_many.return_value = []
         mock_pip_util.return_value.get_pip_packages_data.return_value = []
         mock_parse_conda.return_value = [], [], []
 
@@ -97,11 +116,310 @@ class TestMain(unittest.TestCase):
             mock_parse_requirements.assert_called_once_with(Path("requirements.txt"))
             mock_parse_poetry.assert_called_once_with(Path("pyproject.toml"))
 
+    @patch("superbom.main.PyPISnapshot.open_default", new=MagicMock(return_value=None))
+    @patch("superbom.main.parse_conda_env")
+    @patch("superbom.main.CondaPackageUtil")
+    @patch("superbom.main.PyPIPackageUtil")
+    def test_generatebom_prefetches_all_conda_files(
+        self, mock_pip_util, mock_conda_util, mock_parse_conda
+    ):
+        mock_args = argparse.Namespace(
+            path="test_path",
+            verbose=False,
+            platform="linux-64",
+            output="output.json",
+            format="json",
+            refresh=False,
+            max_age=CondaCache.DEFAULT_MAX_AGE,
+            jobs=3,
+            channel_alias=CondaCache.CHANNEL_ALIAS,
+            channel_url=None,
+            max_cache_size=None,
+            max_memory=False,
+            from_env=None,
+            negative_ttl=None,
+        )
+        mock_parse_conda.side_effect = [
+            (["conda-forge"], ["numpy"], ["requests"]),
+            (["pytorch"], ["pytorch"], ["tqdm"]),
+        ]
+        packageutil = mock_conda_util.return_value
+        packageutil.channel_platforms.return_value = [("conda-forge", "noarch")]
+        packageutil.resolve_many.return_value = [{}, None]
+        mock_pip_util.return_value.get_pip_packages_data.return_value = [{}]
+
+        with patch("superbom.main.filter_by_extensions") as mock_filter, patch(
+            "superbom.main.save_results"
+        ):
+            mock_filter.return_value = [Path("a/environment.yml"), Path("b/environment.yml")]
+            generatebom(mock_args)
+
+        # One prefetch covering the packages of every environment file, before any lookup
+        packageutil.channel_platforms.assert_called_once_with(["numpy", "pytorch"])
+        packageutil._cache.prefetch.assert_called_once_with([("conda-forge", "noarch")], 3)
+        mock_pip_util.return_value.get_pip_packages_data.assert_any_call(["requests"], 3)
+
+        # Each environment is resolved in one batch
+        self.assertEqual(
+            packageutil.resolve_many.call_args_list,
+            [call(["numpy"], evict=False), call(["pytorch"], evict=False)],
+        )
+
+    @patch("superbom.main.generatebom")
+    def test_main_channel_options(self, mock_generatebom):
+        main(
+            [
+                "environment.yml",
+                "--channel-alias",
+                "file:///srv/conda",
+                "--channel-url",
+                "conda-forge=https://mirror.example.com/conda-forge",
+                "--channel-url",
+                "internal=/shared/channels/internal",
+            ]
+        )
+        args = mock_generatebom.call_args[0][0]
+        self.assertEqual(args.channel_alias, "file:///srv/conda")
+        self.assertEqual(
+            args.channel_url,
+            [
+                ("conda-forge", "https://mirror.example.com/conda-forge"),
+                ("internal", "/shared/channels/internal"),
+            ],
+        )
+
+        with patch("sys.stderr", new_callable=StringIO), self.assertRaises(SystemExit):
+            main(["environment.yml", "--channel-url", "conda-forge"])
+
+    @patch("superbom.main.generatebom")
+    def test_main_from_env(self, mock_generatebom):
+        main(["--from-env"])
+        self.assertEqual(mock_generatebom.call_args[0][0].from_env, "")
+        self.assertIsNone(mock_generatebom.call_args[0][0].path)
+
+        main(["environment.yml", "--from-env", "/opt/venv"])
+        self.assertEqual(mock_generatebom.call_args[0][0].from_env, "/opt/venv")
+
+        with patch("sys.stderr", new_callable=StringIO), self.assertRaises(SystemExit):
+            main([])
+
+    @patch("superbom.main.PyPISnapshot.open_default", new=MagicMock(return_value=None))
+    @patch("superbom.main.parse_requirements", new=MagicMock(return_value=["requests"]))
+    @patch("superbom.main.PyPIPackageUtil")
+    @patch("superbom.main.PyPICache")
+    @patch("superbom.main.NegativeCache")
+    @patch("superbom.main.GitHubCache")
+    def test_generatebom_closes_the_caches(
+        self, mock_github_cache, mock_negative_cache, mock_pypi_cache, mock_pip_util
+    ):
+        github_cache = mock_github_cache.return_value
+        github_cache.wait.side_effect = lambda: github_cache.close.assert_not_called()
+        mock_pip_util.return_value.get_pip_packages_data.side_effect = RuntimeError("offline")
+
+        with patch(
+            "superbom.main.filter_by_extensions", return_value=[Path("requirements.txt")]
+        ), self.assertRaises(RuntimeError):
+            generatebom(
+                argparse.Namespace(
+                    path="test_path",
+                    verbose=False,
+                    platform=None,
+                    output="output.json",
+                    format="json",
+                    refresh=False,
+                    max_age=CondaCache.DEFAULT_MAX_AGE,
+                    jobs=1,
+                    channel_alias=CondaCache.CHANNEL_ALIAS,
+                    channel_url=None,
+                    max_cache_size=None,
+                    max_memory=False,
+                    from_env=None,
+                    negative_ttl=None,
+                )
+            )
+
+        # The background refreshes finish before the stores are closed
+        github_cache.wait.assert_called_once()
+        github_cache.close.assert_called_once()
+        mock_negative_cache.return_value.close.assert_called_once()
+        mock_pypi_cache.return_value.close.assert_called_once()
+
+    @patch("superbom.main.PyPISnapshot.open_default", new=MagicMock(return_value=None))
+    @patch("superbom.main.save_results")
+    @patch("superbom.main.InstalledEnvironment")
+    @patch("superbom.main.PyPIPackageUtil")
+    def test_generatebom_from_env_without_path(
+        self, mock_pip_util, mock_environment, mock_save_results
+    ):
+        environment = mock_environment.return_value
+        environment.name = "venv"
+        environment.packages.return_value = ["requests"]
+        mock_pip_util.return_value.get_pip_packages_data.return_value = [{"Package": "requests"}]
+
+        generatebom(
+            argparse.Namespace(
+                path=None,
+                verbose=False,
+                platform=None,
+                output="output.json",
+                format="json",
+                refresh=False,
+                max_age=CondaCache.DEFAULT_MAX_AGE,
+                jobs=1,
+                channel_alias=CondaCache.CHANNEL_ALIAS,
+                channel_url=None,
+                max_cache_size=None,
+                max_memory=False,
+                from_env="/opt/venv",
+                negative_ttl=None,
+            )
+        )
+
+        mock_environment.assert_called_once_with("/opt/venv")
+        self.assertIs(mock_pip_util.call_args.kwargs["environment"], environment)
+        mock_pip_util.return_value.get_pip_packages_data.assert_called_once_with(["requests"], 1)
+        results = mock_save_results.call_args[0][0]
+        self.assertEqual(list(results), ["venv"])
+
+    def test_size(self):
+        self.assertEqual(size("1024"), 1024)
+        self.assertEqual(size("500M"), 500 * 1024**2)
+        self.assertEqual(size("1.5g"), int(1.5 * 1024**3))
+        self.assertEqual(size("2GiB"), 2 * 1024**3)
+        with self.assertRaises(argparse.ArgumentTypeError):
+            size("lots")
+
+    @patch("superbom.main.generatebom")
+    def test_main_max_cache_size(self, mock_generatebom):
+        main(["environment.yml", "--max-cache-size", "2G"])
+        self.assertEqual(mock_generatebom.call_args[0][0].max_cache_size, 2 * 1024**3)
+
+    def run_cache_command(self, *argv):
+        with patch("superbom.main.CondaCache", self.cache_class), patch(
+            "sys.stdout", new_callable=StringIO
+        ) as stdout:
+            code = main(["cache", *argv])
+        return code, stdout.getvalue()
+
+    def setup_cache(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        cache_dir = Path(tmpdir.name)
+
+        class TmpCondaCache(CondaCache):
+            def __init__(self, **kwargs):
+                super().__init__(cache_dir=cache_dir, **kwargs)
+
+        self.cache_class = TmpCondaCache
+        for name, last_used in (("conda-forge_noarch", 20), ("pytorch_noarch", 10)):
+            (cache_dir / f"{name}.sqlite").write_bytes(b"x" * 2048)
+            os.utime(cache_dir / f"{name}.sqlite", (last_used, last_used))
+            (cache_dir / f"{name}.meta.json").write_text(
+                json.dumps({"format": "zst", "fetched_at": 0})
+            )
+        return cache_dir
+
+    def test_cache_stats(self):
+        self.setup_cache()
+        code, output = self.run_cache_command("stats")
+        self.assertEqual(code, 0)
+        lines = output.splitlines()
+        # Most recently used first
+        self.assertTrue(lines[0].startswith("conda-forge_noarch"))
+        self.assertIn("zst", lines[0])
+        self.assertTrue(lines[1].startswith("pytorch_noarch"))
+        self.assertIn("2 entries", lines[2])
+
+    def test_cache_prune(self):
+        cache_dir = self.setup_cache()
+        code, output = self.run_cache_command("prune", "--max-size", "3K")
+        self.assertEqual(code, 0)
+        self.assertIn("Evicted 1 entries", output)
+        self.assertFalse((cache_dir / "pytorch_noarch.sqlite").exists())
+        self.assertTrue((cache_dir / "conda-forge_noarch.sqlite").exists())
+
+    def test_cache_clear(self):
+        cache_dir = self.setup_cache()
+        code, output = self.run_cache_command("clear")
+        self.assertEqual(code, 0)
+        self.assertIn("Removed 2 entries", output)
+        self.assertEqual(list(cache_dir.iterdir()), [])
+
+    def test_cache_warm(self):
+        self.setup_cache()
+        with patch.object(CondaCache, "prefetch", return_value=[]) as mock_prefetch:
+            code, _ = self.run_cache_command(
+                "warm", "-c", "conda-forge", "-c", "pytorch", "-p", "linux-64", "-j", "2"
+            )
+        self.assertEqual(code, 0)
+        mock_prefetch.assert_called_once_with(
+            [("conda-forge", "linux-64"), ("pytorch", "linux-64")], 2
+        )
+
+        with patch.object(CondaCache, "prefetch", return_value=[("conda-forge", "noarch")]):
+            code, _ = self.run_cache_command("warm")
+        self.assertEqual(code, 1)
+
+    def setup_pypi_cache(self, *argv):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        cache_dir = self.snapshot_dir = Path(tmpdir.name)
+
+        class TmpPyPICache(PyPICache):
+            def __init__(self, **kwargs):
+                super().__init__(cache_dir=cache_dir, **kwargs)
+
+        return TmpPyPICache
+
+    def test_snapshot_build_and_import(self):
+        cache_class = self.setup_pypi_cache()
+        tmp = self.snapshot_dir
+        dump = tmp / "dump.jsonl"
+        dump.write_text(
+            json.dumps({"info": {"name": "foo", "version": "1.0", "license": "MIT"}}) + "\n"
+        )
+        built = tmp / "built.snapshot"
+        installed = tmp / "installed" / "snapshot.bin"
+
+        with patch("superbom.main.PyPICache", cache_class), patch(
+            "superbom.main.PyPISnapshot.default_path", return_value=installed
+        ), patch("sys.stdout", new_callable=StringIO) as stdout:
+            self.assertEqual(main(["snapshot", "build", "-o", str(built), "--dump", str(dump)]), 0)
+            self.assertEqual(main(["snapshot", "import", str(built)]), 0)
+            with patch("superbom.main.logger.error"):
+                self.assertEqual(main(["snapshot", "import", str(dump)]), 1)
+
+        self.assertIn("Wrote 1 releases", stdout.getvalue())
+        with PyPISnapshot(installed) as snapshot:
+            self.assertEqual(snapshot.get("foo", "1.0")["license"], "MIT")
+
+    def test_snapshot_build_from_cache(self):
+        cache_class = self.setup_pypi_cache()
+        built = self.snapshot_dir / "built.snapshot"
+        cache = cache_class()
+        cache._write("foo", "1.0", None, None, {"name": "foo", "version": "1.0", "license": "MIT"})
+        cache._write("foo", "/versions", None, None, ["1.0"])
+        cache.close()
+
+        with patch("superbom.main.PyPICache", cache_class), patch(
+            "sys.stdout", new_callable=StringIO
+        ):
+            self.assertEqual(main(["snapshot", "build", "-o", str(built)]), 0)
+
+        with PyPISnapshot(built) as snapshot:
+            self.assertEqual(snapshot.versions("foo"), ["1.0"])
+
     @patch("argparse.ArgumentParser.parse_args")
     @patch("superbom.main.generatebom")
     def test_main(self, mock_generatebom, mock_parse_args):
         mock_parse_args.return_value = argparse.Namespace(
-            path="test_path", verbose=True, platform=None, output="output.xlsx", format="excel"
+            path="test_path",
+            verbose=True,
+            platform=None,
+            output="output.xlsx",
+            format="excel",
+            from_env=None,
+            negative_ttl=None,
         )
         with patch("sys.stdout", new_callable=StringIO):
             main()
@@ -0,0 +1,132 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import time
+import unittest
+from unittest.mock import patch
+
+from helpers import CacheTestCase, response
+
+from superbom.utils import githubutils, negativecache
+from superbom.utils.negativecache import (
+    NO_GITHUB_REPO,
+    NO_LICENSE,
+    NOT_ON_PYPI,
+    NegativeCache,
+)
+from superbom.utils.packageindexes.pypi.pipdependencies import PyPIPackageUtil
+from superbom.utils.packageindexes.pypi.pypicache import PyPICache
+from superbom.utils.parsers import Dependency
+
+
+class NegativeCacheTestCase(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = self.open_store(NegativeCache(cache_dir=self.cache_dir))
+        self.enterContext(negativecache.using(self.cache))
+
+
+class TestNegativeCache(NegativeCacheTestCase):
+    def test_add_and_contains(self):
+        self.assertFalse(self.cache.contains(NOT_ON_PYPI, "internal-pkg"))
+        self.cache.add(NOT_ON_PYPI, "internal-pkg")
+        self.assertTrue(self.cache.contains(NOT_ON_PYPI, "internal-pkg"))
+        self.assertFalse(self.cache.contains(NO_GITHUB_REPO, "internal-pkg"))
+
+    def test_persists_across_runs(self):
+        self.cache.add(NO_LICENSE, "owner/repo")
+
+        other = self.open_store(NegativeCache(cache_dir=self.cache_dir))
+        self.assertTrue(other.contains(NO_LICENSE, "owner/repo"))
+
+        refreshed = self.open_store(NegativeCache(cache_dir=self.cache_dir, refresh=True))
+        self.assertFalse(refreshed.contains(NO_LICENSE, "owner/repo"))
+        refreshed.add(NO_LICENSE, "owner/repo")
+        self.assertTrue(refreshed.contains(NO_LICENSE, "owner/repo"))
+
+    def test_ttl_per_kind(self):
+        self.cache.add(NOT_ON_PYPI, "internal-pkg")
+        self.cache.add(NO_LICENSE, "owner/repo")
+
+        later = time.time() + 2 * 24 * 60 * 60
+        with patch("superbom.utils.negativecache.time.time", return_value=later):
+            self.assertTrue(self.cache.contains(NOT_ON_PYPI, "internal-pkg"))
+            self.assertFalse(self.cache.contains(NO_LICENSE, "owner/repo"))
+
+        cache = self.open_store(NegativeCache(cache_dir=self.cache_dir, ttls={NOT_ON_PYPI: 0}))
+        self.assertFalse(cache.contains(NOT_ON_PYPI, "internal-pkg"))
+
+    def test_disabled_without_cache(self):
+        with negativecache.using(None):
+            negativecache.record_missing(NOT_ON_PYPI, "internal-pkg")
+            self.assertFalse(negativecache.is_missing(NOT_ON_PYPI, "internal-pkg"))
+        self.assertFalse(self.cache.contains(NOT_ON_PYPI, "internal-pkg"))
+
+
+class TestGithubNegativeCache(NegativeCacheTestCase):
+    @patch("superbom.utils.httpclient.get")
+    def test_search_without_match(self, mock_get):
+        mock_get.return_value = response(200, {"items": [{"name": "other", "html_url": "x"}]})
+
+        self.assertIsNone(githubutils._search("internal-pkg"))
+        self.assertIsNone(githubutils._search("internal-pkg"))
+        mock_get.assert_called_once()
+
+    @patch("superbom.utils.httpclient.get")
+    def test_rate_limited_search_is_not_remembered(self, mock_get):
+        mock_get.return_value = response(403)
+        githubutils._search("internal-pkg")
+        githubutils._search("internal-pkg")
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch("superbom.utils.httpclient.get")
+    def test_repository_without_license(self, mock_get):
+        mock_get.return_value = response(404)
+
+        self.assertEqual(
+            githubutils._lookuplicense("https://github.com/Owner/Repo"), (False, None)
+        )
+        self.assertEqual(
+            githubutils._lookuplicense("https://github.com/owner/repo"), (False, None)
+        )
+        mock_get.assert_called_once()
+
+        mock_get.return_value = response(502)
+        githubutils._lookuplicense("https://github.com/owner/other")
+        githubutils._lookuplicense("https://github.com/owner/other")
+        self.assertEqual(mock_get.call_count, 3)
+
+
+class TestPyPINegativeCache(NegativeCacheTestCase):
+    @patch("superbom.utils.httpclient.get")
+    def test_missing_package_is_not_looked_up_again(self, mock_get):
+        mock_get.return_value = response(404)
+        util = PyPIPackageUtil()
+
+        self.assertIsNone(util._getpypimetadata(Dependency.create_dependency("Internal_Pkg")))
+        calls = mock_get.call_count
+        self.assertIsNone(
+            util._getpypimetadata(Dependency.create_dependency("internal-pkg", "==1.0"))
+        )
+        self.assertEqual(mock_get.call_count, calls)
+
+    @patch("superbom.utils.httpclient.get")
+    def test_missing_release_is_not_a_missing_package(self, mock_get):
+        cache = self.open_store(PyPICache(cache_dir=self.cache_dir))
+        mock_get.return_value = response(404)
+
+        cache.get("requests", "0.0.1")
+        self.assertFalse(self.cache.contains(NOT_ON_PYPI, "requests"))
+
+        cache.versions("Internal_Pkg")
+        self.assertTrue(self.cache.contains(NOT_ON_PYPI, "internal-pkg"))
+
+    @patch("superbom.utils.httpclient.get")
+    def test_server_errors_are_not_remembered(self, mock_get):
+        mock_get.return_value = response(503)
+        PyPIPackageUtil()._getpypimetadata(Dependency.create_dependency("requests"))
+        self.assertFalse(self.cache.contains(NOT_ON_PYPI, "requests"))
+
+
+if __name__ == "__main__":
+    unittest.main()
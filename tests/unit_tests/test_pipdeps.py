@@ -1,6 +1,8 @@
 # Copyright (C) 2024 Intel Corporation
 # SPDX-License-Identifier: Apache 2.0
 
+import threading
+import time
 import unittest
 from unittest.mock import MagicMock, patch
 
@@ -8,7 +10,7 @@ from superbom.utils.packageindexes.pypi.pipdependencies import PyPIPackageUtil
 
 
 class TestPyPIPackageUtil(unittest.TestCase):
-    @patch("superbom.utils.packageindexes.pypi.pipdependencies.requests.get")
+    @patch("superbom.utils.httpclient.get")
     @patch("superbom.utils.packageindexes.pypi.pipdependencies.pypiutils.get_license")
     def test_get_pip_packages_data_pypi(self, mock_get_license, mock_requests_get):
         mock_package = MagicMock()
@@ -35,7 +37,7 @@ class TestPyPIPackageUtil(unittest.TestCase):
 
         self.assertEqual(result, expected_result)
 
-    @patch("superbom.utils.packageindexes.pypi.pipdependencies.requests.get")
+    @patch("superbom.utils.httpclient.get")
     @patch("superbom.utils.packageindexes.pypi.pipdependencies.githubutils.get_license")
     def test_get_pip_packages_data_github(self, mock_get_license, mock_requests_get):
         mock_package = MagicMock()
@@ -59,7 +61,7 @@ class TestPyPIPackageUtil(unittest.TestCase):
 
         self.assertEqual(result, expected_result)
 
-    @patch("superbom.utils.packageindexes.pypi.pipdependencies.requests.get")
+    @patch("superbom.utils.httpclient.get")
     def test_get_pip_packages_data_python(self, mock_requests_get):
         mock_package = MagicMock()
         mock_package.name = "python"
@@ -69,6 +71,35 @@ class TestPyPIPackageUtil(unittest.TestCase):
 
         self.assertEqual(result, {})
 
+    def test_get_pip_packages_data_keeps_order_and_bounds_concurrency(self):
+        lock = threading.Lock()
+        state = {"running": 0, "peak": 0}
+
+        def get_pip_package_data(package):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            # Later packages finish first
+            time.sleep(0.01 * (10 - package))
+            with lock:
+                state["running"] -= 1
+            if package == 3:
+                raise ValueError("broken metadata")
+            return {"Package": str(package)}
+
+        util = PyPIPackageUtil()
+        with patch.object(util, "get_pip_package_data", side_effect=get_pip_package_data):
+            results = util.get_pip_packages_data(range(10), jobs=4)
+
+        expected = [{"Package": str(i)} for i in range(10)]
+        expected[3] = None
+        self.assertEqual(results, expected)
+        self.assertLessEqual(state["peak"], 4)
+        self.assertGreater(state["peak"], 1)
+
+    def test_get_pip_packages_data_empty(self):
+        self.assertEqual(PyPIPackageUtil().get_pip_packages_data([]), [])
+
 
 if __name__ == "__main__":
     unittest.main()
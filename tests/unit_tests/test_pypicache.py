@@ -0,0 +1,216 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from helpers import CacheTestCase, response
+from packaging.specifiers import SpecifierSet
+
+from superbom.utils.packageindexes.pypi.pipdependencies import PyPIPackageUtil
+from superbom.utils.packageindexes.pypi.pypicache import PyPICache, normalize_name
+from superbom.utils.packageindexes.pypi.pypiutils import best_version, pinned_version
+from superbom.utils.parsers import Dependency
+
+
+class TestPyPICache(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = self.open_store(PyPICache(cache_dir=self.cache_dir))
+
+    @patch("superbom.utils.httpclient.get")
+    def test_pinned_release_is_reused_indefinitely(self, mock_get):
+        mock_get.return_value = response(200, {"info": {"name": "requests", "version": "2.31.0"}})
+
+        self.assertEqual(self.cache.get("requests", "2.31.0")["version"], "2.31.0")
+        with patch(
+            "superbom.utils.packageindexes.pypi.pypicache.time.time",
+            return_value=time.time() + 10**9,
+        ):
+            self.assertEqual(self.cache.get("Requests", "2.31.0")["version"], "2.31.0")
+
+        mock_get.assert_called_once_with("https://pypi.org/pypi/requests/2.31.0/json", headers={})
+
+    @patch("superbom.utils.httpclient.get")
+    def test_unpinned_lookup_is_fresh_within_max_age(self, mock_get):
+        mock_get.return_value = response(200, {"info": {"name": "requests", "version": "2.32.0"}})
+
+        self.cache.get("requests")
+        self.cache.get("requests")
+
+        mock_get.assert_called_once_with("https://pypi.org/pypi/requests/json", headers={})
+
+    @patch("superbom.utils.httpclient.get")
+    def test_stale_unpinned_lookup_is_revalidated(self, mock_get):
+        self.cache.max_age = 0
+        mock_get.return_value = response(
+            200,
+            {"info": {"name": "requests", "version": "2.32.0"}},
+            **{"ETag": '"abc"', "Last-Modified": "Mon"},
+        )
+        self.cache.get("requests")
+
+        mock_get.return_value = response(304)
+        self.assertEqual(self.cache.get("requests")["version"], "2.32.0")
+        self.assertEqual(
+            mock_get.call_args.kwargs["headers"],
+            {"If-None-Match": '"abc"', "If-Modified-Since": "Mon"},
+        )
+
+        mock_get.return_value = response(200, {"info": {"name": "requests", "version": "2.33.0"}})
+        self.assertEqual(self.cache.get("requests")["version"], "2.33.0")
+
+    @patch("superbom.utils.httpclient.get")
+    def test_serves_stale_metadata_on_server_error(self, mock_get):
+        self.cache.max_age = 0
+        mock_get.return_value = response(200, {"info": {"name": "requests", "version": "2.32.0"}})
+        self.cache.get("requests")
+
+        mock_get.return_value = response(503)
+        self.assertEqual(self.cache.get("requests")["version"], "2.32.0")
+
+    @patch("superbom.utils.httpclient.get")
+    def test_missing_project(self, mock_get):
+        mock_get.return_value = response(404)
+        self.assertIsNone(self.cache.get("does-not-exist"))
+        self.assertIsNone(self.cache.get("does-not-exist", "1.0"))
+
+    @patch("superbom.utils.httpclient.get")
+    def test_refresh_downloads_once_per_process(self, mock_get):
+        mock_get.return_value = response(200, {"info": {"name": "requests", "version": "2.31.0"}})
+        self.cache.get("requests", "2.31.0")
+
+        self.cache.refresh = True
+        self.cache.get("requests", "2.31.0")
+        self.cache.get("requests", "2.31.0")
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(mock_get.call_args.kwargs["headers"], {})
+
+    @patch("superbom.utils.httpclient.get")
+    def test_persists_across_instances(self, mock_get):
+        mock_get.return_value = response(200, {"info": {"name": "requests", "version": "2.31.0"}})
+        self.cache.get("requests", "2.31.0")
+
+        other = self.open_store(PyPICache(cache_dir=self.cache_dir))
+        self.assertEqual(other.get("requests", "2.31.0")["version"], "2.31.0")
+        mock_get.assert_called_once()
+
+    @patch("superbom.utils.httpclient.get")
+    def test_versions_are_revalidated(self, mock_get):
+        mock_get.return_value = response(200, {"versions": ["1.0", "1.1"]}, ETag='"v1"')
+
+        self.assertEqual(self.cache.versions("Foo_Bar"), ["1.0", "1.1"])
+        self.assertEqual(self.cache.versions("foo-bar"), ["1.0", "1.1"])
+        mock_get.assert_called_once_with(
+            "https://pypi.org/simple/foo-bar/", headers={"Accept": PyPICache.SIMPLE_ACCEPT}
+        )
+
+        self.cache.max_age = 0
+        mock_get.return_value = response(304)
+        self.assertEqual(self.cache.versions("foo-bar"), ["1.0", "1.1"])
+        self.assertEqual(
+            mock_get.call_args.kwargs["headers"],
+            {"Accept": PyPICache.SIMPLE_ACCEPT, "If-None-Match": '"v1"'},
+        )
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name("Foo_Bar.baz"), "foo-bar-baz")
+
+
+class TestPinnedVersion(unittest.TestCase):
+    def test_exact_pins(self):
+        self.assertEqual(pinned_version(SpecifierSet("==1.2.3")), "1.2.3")
+        self.assertEqual(pinned_version(SpecifierSet("===1.2.3")), "1.2.3")
+
+    def test_not_pinned(self):
+        for constraint in ["", ">=1.0", "==1.2.*", "==1.0,!=1.1", "~=1.2"]:
+            self.assertIsNone(pinned_version(SpecifierSet(constraint)), constraint)
+        self.assertIsNone(pinned_version("==1.0"))
+        self.assertIsNone(pinned_version(None))
+
+
+class TestBestVersion(unittest.TestCase):
+    VERSIONS = ["1.0", "1.10", "1.9", "2.0b1", "not-a-version", "1.2.post1"]
+
+    def test_newest_matching_release(self):
+        self.assertEqual(best_version(self.VERSIONS, SpecifierSet()), "1.10")
+        self.assertEqual(best_version(self.VERSIONS, SpecifierSet("<1.5")), "1.2.post1")
+        self.assertEqual(best_version(self.VERSIONS, SpecifierSet("~=1.0")), "1.10")
+        self.assertEqual(best_version(self.VERSIONS, None), "1.10")
+
+    def test_prereleases(self):
+        self.assertEqual(best_version(self.VERSIONS, SpecifierSet(">=2.0b1")), "2.0b1")
+        self.assertEqual(best_version(self.VERSIONS, SpecifierSet(">=2")), None)
+        self.assertEqual(best_version(["3.0a1"], SpecifierSet()), "3.0a1")
+
+    def test_no_versions(self):
+        self.assertIsNone(best_version(None, SpecifierSet()))
+        self.assertIsNone(best_version([], SpecifierSet(">=1")))
+
+
+class TestPyPIPackageUtilCache(unittest.TestCase):
+    @patch("superbom.utils.packageindexes.pypi.pipdependencies.pypiutils.get_license")
+    def test_pinned_package_uses_release_metadata(self, mock_get_license):
+        mock_get_license.return_value = (True, "MIT")
+        cache = MagicMock()
+        cache.get.return_value = {"name": "numpy", "version": "1.26.4"}
+
+        util = PyPIPackageUtil(cache)
+        result = util.get_pip_package_data(Dependency.create_dependency("numpy", "==1.26.4"))
+
+        cache.get.assert_called_once_with("numpy", "1.26.4")
+        self.assertEqual(result["Version"], "1.26.4")
+
+    def test_unknown_pin_falls_back_to_latest(self):
+        cache = MagicMock()
+        cache.get.side_effect = [None, {"name": "numpy", "version": "2.0.0"}]
+
+        util = PyPIPackageUtil(cache)
+        metadata = util._getpypimetadata(Dependency.create_dependency("numpy", "==0.0.1"))
+
+        self.assertEqual(metadata["version"], "2.0.0")
+        self.assertEqual(cache.get.call_args_list[1].args, ("numpy", None))
+        cache.versions.assert_not_called()
+
+    def test_constrained_package_uses_best_release(self):
+        cache = MagicMock()
+        cache.versions.return_value = ["1.0", "1.5", "2.0", "2.1rc1"]
+        util = PyPIPackageUtil(cache)
+
+        util._getpypimetadata(Dependency.create_dependency("numpy", "<2"))
+        cache.get.assert_called_once_with("numpy", "1.5")
+
+        cache.get.reset_mock()
+        util._getpypimetadata(Dependency.create_dependency("numpy"))
+        cache.get.assert_called_once_with("numpy", "2.0")
+
+    def test_unsatisfiable_constraint_falls_back_to_latest(self):
+        cache = MagicMock()
+        cache.versions.return_value = ["1.0"]
+        util = PyPIPackageUtil(cache)
+        util._getpypimetadata(Dependency.create_dependency("numpy", ">=3"))
+        cache.get.assert_called_once_with("numpy", None)
+
+    @patch("superbom.utils.httpclient.get")
+    def test_uncached_lookup_uses_simple_api_and_release_json(self, mock_get):
+        mock_get.side_effect = [
+            response(200, {"versions": ["1.26.4", "2.0.0"]}),
+            response(200, {"info": {"name": "numpy", "version": "1.26.4"}}),
+        ]
+
+        metadata = PyPIPackageUtil()._getpypimetadata(Dependency.create_dependency("NumPy", "<2"))
+
+        self.assertEqual(metadata["version"], "1.26.4")
+        self.assertEqual(mock_get.call_args_list[0].args, ("https://pypi.org/simple/numpy/",))
+        self.assertEqual(
+            mock_get.call_args_list[0].kwargs["headers"], {"Accept": PyPICache.SIMPLE_ACCEPT}
+        )
+        self.assertEqual(
+            mock_get.call_args_list[1].args, ("https://pypi.org/pypi/NumPy/1.26.4/json",)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
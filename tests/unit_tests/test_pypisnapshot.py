@@ -0,0 +1,166 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from packaging.specifiers import SpecifierSet
+
+from superbom.utils.packageindexes.pypi.pipdependencies import PyPIPackageUtil
+from superbom.utils.packageindexes.pypi.pypicache import PyPICache
+from superbom.utils.packageindexes.pypi.pypisnapshot import (
+    PyPISnapshot,
+    read_dump,
+    snapshot_info,
+    write_snapshot,
+)
+from superbom.utils.parsers import Dependency
+
+
+def _info(name, version, license="MIT", **extra):
+    return {"name": name, "version": version, "license": license, **extra}
+
+
+INFOS = [
+    _info("requests", "2.31.0", "Apache 2.0"),
+    _info("requests", "2.32.0", "Apache-2.0"),
+    _info("requests", "3.0.0b1", "Apache-2.0"),
+    _info("Foo_Bar", "1.0"),
+    _info("foo", "0.1"),
+    _info("zope.interface", "6.0", "ZPL"),
+]
+
+
+class TestPyPISnapshot(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.path = self.tmp / "pypi.snapshot"
+        self.count = write_snapshot(self.path, INFOS)
+        self.snapshot = PyPISnapshot(self.path)
+        self.addCleanup(self.snapshot.close)
+
+    def test_get_release(self):
+        self.assertEqual(self.count, 6)
+        self.assertEqual(self.snapshot.get("requests", "2.31.0")["license"], "Apache 2.0")
+        self.assertEqual(self.snapshot.get("Zope_Interface", "6.0")["license"], "ZPL")
+        self.assertEqual(self.snapshot.get("foo-bar", "1.0")["name"], "Foo_Bar")
+        self.assertIsNone(self.snapshot.get("requests", "1.0"))
+        self.assertIsNone(self.snapshot.get("missing"))
+        self.assertIsNone(self.snapshot.get("zzz"))
+
+    def test_latest_release(self):
+        self.assertEqual(self.snapshot.get("requests")["version"], "2.32.0")
+        self.assertEqual(self.snapshot.get("foo")["version"], "0.1")
+
+    def test_versions(self):
+        self.assertEqual(self.snapshot.versions("requests"), ["2.31.0", "2.32.0", "3.0.0b1"])
+        # "foo" must not pick up "foo-bar"
+        self.assertEqual(self.snapshot.versions("foo"), ["0.1"])
+        self.assertIsNone(self.snapshot.versions("fo"))
+
+    def test_resolve(self):
+        self.assertEqual(
+            self.snapshot.resolve("requests", SpecifierSet("<2.32"))["version"], "2.31.0"
+        )
+        self.assertEqual(
+            self.snapshot.resolve("requests", SpecifierSet("==2.32.0"))["version"], "2.32.0"
+        )
+        self.assertEqual(
+            self.snapshot.resolve("requests", SpecifierSet(">=3.0.0b1"))["version"], "3.0.0b1"
+        )
+        self.assertIsNone(self.snapshot.resolve("requests", SpecifierSet(">=4")))
+        self.assertIsNone(self.snapshot.resolve("missing", SpecifierSet()))
+
+    def test_rejects_other_files(self):
+        other = self.tmp / "other"
+        other.write_bytes(b"not a snapshot")
+        with self.assertRaises(ValueError):
+            PyPISnapshot(other)
+
+    def test_empty_snapshot(self):
+        write_snapshot(self.path, [])
+        with PyPISnapshot(self.path) as snapshot:
+            self.assertEqual(len(snapshot), 0)
+            self.assertIsNone(snapshot.get("requests"))
+
+    def test_open_default(self):
+        self.assertIsNone(PyPISnapshot.open_default(self.tmp))
+        write_snapshot(PyPISnapshot.default_path(self.tmp), INFOS)
+        snapshot = PyPISnapshot.open_default(self.tmp)
+        self.addCleanup(snapshot.close)
+        self.assertEqual(snapshot.get("foo")["version"], "0.1")
+
+    def test_snapshot_info_keeps_license_fields(self):
+        info = snapshot_info(
+            _info(
+                "foo",
+                "1.0",
+                summary="Foo",
+                classifiers=["License :: OSI Approved :: MIT License", "Topic :: Utilities"],
+                project_urls={
+                    "Source Code": "https://github.com/foo/foo",
+                    "Docs": "https://foo.dev",
+                },
+            )
+        )
+        self.assertNotIn("summary", info)
+        self.assertEqual(info["classifiers"], ["License :: OSI Approved :: MIT License"])
+        self.assertEqual(info["project_urls"], {"Source Code": "https://github.com/foo/foo"})
+
+    def test_read_dump(self):
+        dump = self.tmp / "dump.jsonl"
+        dump.write_text(
+            json.dumps({"info": _info("a", "1")}) + "\n\n" + json.dumps(_info("b", "2")) + "\n"
+        )
+        self.assertEqual([info["name"] for info in read_dump(dump)], ["a", "b"])
+
+    @patch("superbom.utils.httpclient.get")
+    def test_build_from_cache(self, mock_get):
+        response = MagicMock(status_code=200, headers={})
+        response.json.return_value = {"info": _info("requests", "2.31.0")}
+        mock_get.return_value = response
+        cache = PyPICache(cache_dir=self.tmp)
+        self.addCleanup(cache.close)
+        cache.get("requests", "2.31.0")
+
+        write_snapshot(self.path, cache.items())
+        with PyPISnapshot(self.path) as snapshot:
+            self.assertEqual(snapshot.get("requests", "2.31.0")["license"], "MIT")
+
+
+class TestPyPIPackageUtilSnapshot(unittest.TestCase):
+    @patch("superbom.utils.httpclient.get")
+    @patch("superbom.utils.packageindexes.pypi.pipdependencies.pypiutils.get_license")
+    def test_snapshot_is_used_before_the_network(self, mock_get_license, mock_get):
+        mock_get_license.return_value = (True, "MIT")
+        snapshot = MagicMock()
+        snapshot.resolve.return_value = _info("foo", "1.0")
+
+        result = PyPIPackageUtil(snapshot=snapshot).get_pip_package_data(
+            Dependency.create_dependency("foo", "<2")
+        )
+
+        self.assertEqual(result["Version"], "1.0")
+        snapshot.resolve.assert_called_once_with("foo", SpecifierSet("<2"))
+        mock_get.assert_not_called()
+
+    def test_missing_from_snapshot_falls_back_to_pypi(self):
+        snapshot = MagicMock()
+        snapshot.resolve.return_value = None
+        cache = MagicMock()
+        cache.get.return_value = _info("foo", "1.0")
+
+        metadata = PyPIPackageUtil(cache, snapshot=snapshot)._getpypimetadata(
+            Dependency.create_dependency("foo", "==1.0")
+        )
+        self.assertEqual(metadata["version"], "1.0")
+        cache.get.assert_called_once_with("foo", "1.0")
+
+
+if __name__ == "__main__":
+    unittest.main()
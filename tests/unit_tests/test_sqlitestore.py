@@ -0,0 +1,45 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache 2.0
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from superbom.utils.sqlitestore import SQLiteStore, cache_root
+
+_SCHEMA = "CREATE TABLE IF NOT EXISTS items (key TEXT PRIMARY KEY, value TEXT)"
+
+
+class TestSQLiteStore(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name, "store", "store.sqlite")
+
+    def test_cache_root(self):
+        self.assertEqual(cache_root("/tmp/cache"), Path("/tmp/cache"))
+        self.assertEqual(cache_root(), Path.home() / ".cbomcache")
+
+    def test_created_on_first_use(self):
+        store = SQLiteStore(self.path, _SCHEMA)
+        self.addCleanup(store.close)
+        self.assertFalse(self.path.exists())
+
+        self.assertIsNone(store._fetchone("SELECT value FROM items WHERE key = ?", ("a",)))
+        self.assertTrue(self.path.exists())
+        self.assertEqual(store._fetchone("PRAGMA journal_mode"), ("wal",))
+
+    def test_shared_across_instances(self):
+        store = SQLiteStore(self.path, _SCHEMA)
+        store._execute("INSERT INTO items VALUES (?, ?)", ("a", "1"))
+        store.close()
+        # Closing twice is harmless
+        store.close()
+
+        other = SQLiteStore(self.path, _SCHEMA)
+        self.addCleanup(other.close)
+        self.assertEqual(other._fetchall("SELECT key, value FROM items"), [("a", "1")])
+
+
+if __name__ == "__main__":
+    unittest.main()